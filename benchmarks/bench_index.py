@@ -0,0 +1,87 @@
+"""
+Fleet index benchmark: indexed queries versus full scans at fleet scale
+
+Registers a fleet of CompactGumballMachines (one million by default) with a FleetIndex,
+drives random traffic through them, then times balance range, top-k and no-sales
+queries against scanning every machine. Also reports the per-operation cost the index
+adds.
+
+Run from the repository root:
+    python -m benchmarks.bench_index [--machines N] [--operations N]
+"""
+
+import argparse
+import heapq
+import random
+import time
+
+from gumball_index import FleetIndex
+from gumball_machine import CompactGumballMachine
+
+
+def timed(function, *args):
+    """(result, seconds) of one call."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def drive(machines, operations: int, rng: random.Random):
+    """Random coin, lever and change traffic over the fleet."""
+    coins = ("nickel", "dime", "quarter")
+    colors = ("red", "yellow")
+    size = len(machines)
+    for _ in range(operations):
+        machine = machines[rng.randrange(size)]
+        action = rng.random()
+        if action < 0.55:
+            machine.insert_coin(coins[rng.randrange(3)])
+        elif action < 0.95:
+            machine.dispense(colors[rng.randrange(2)])
+        else:
+            machine.return_change()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--machines", type=int, default=1_000_000)
+    parser.add_argument("--operations", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    machines = [CompactGumballMachine() for _ in range(args.machines)]
+    clock = [0.0]
+    index = FleetIndex(clock=lambda: clock[0])
+    _, seconds = timed(lambda: [index.add(key, machine) for key, machine in enumerate(machines)])
+    print(f"indexed {args.machines:,} machines in {seconds:.2f} s")
+
+    plain = [CompactGumballMachine() for _ in range(min(args.machines, 100_000))]
+    _, bare = timed(drive, plain, args.operations, random.Random(args.seed))
+    # Traffic in two halves so the second "hour" has fewer active machines
+    _, first = timed(drive, machines, args.operations // 2, random.Random(args.seed))
+    clock[0] = 3600.0
+    _, second = timed(drive, machines, args.operations - args.operations // 2, random.Random(args.seed + 1))
+    indexed = first + second
+    print(f"{args.operations:,} operations: {bare / args.operations * 1e6:.2f} us unindexed, "
+          f"{indexed / args.operations * 1e6:.2f} us indexed")
+
+    queries = (
+        ("balance > $1.00",
+         lambda: index.balance_range(101),
+         lambda: [key for key, machine in enumerate(machines) if machine.balance > 100]),
+        ("top 10 balances",
+         lambda: index.top_balances(10),
+         lambda: heapq.nlargest(10, ((machine.balance, key) for key, machine in enumerate(machines)))),
+        ("no sales in last hour",
+         lambda: index.no_sales_since(3600.0),
+         None), # A scan cannot answer this: machines keep no sale times
+    )
+    print(f"{'query':<24}{'results':>10}{'indexed ms':>12}{'scan ms':>10}")
+    for name, query, scan in queries:
+        result, fast = timed(query)
+        slow = timed(scan)[1] * 1000 if scan else float("nan")
+        print(f"{name:<24}{len(result):>10,}{fast * 1000:>12.3f}{slow:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
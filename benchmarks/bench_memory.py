@@ -0,0 +1,90 @@
+"""
+Memory benchmark: per-instance and per-result footprint
+
+Compares GumballMachine (has a __dict__) with CompactGumballMachine (slotted), and the
+compact result tuples with the plain dictionaries the machine used to return.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory [--count N]
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from gumball_machine import CompactGumballMachine, GumballMachine
+
+
+def _legacy_insert(machine: GumballMachine) -> dict:
+    """Build the dictionary insert_coin() used to return."""
+    return machine.insert_coin("dime").to_dict()
+
+
+def _legacy_dispense(machine: GumballMachine) -> dict:
+    """Build the dictionary dispense() used to return."""
+    return machine.dispense("red").to_dict()
+
+
+def _legacy_change(machine: GumballMachine) -> dict:
+    """Build the dictionary return_change() used to return."""
+    return machine.return_change().to_dict()
+
+
+def measure(factory, count: int) -> float:
+    """
+    Average bytes allocated per object when building count objects with factory.
+    :param factory: zero-argument callable
+    :param count: integer
+    :return: float
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # Subtract the list holding the objects
+    allocated -= objects.__sizeof__()
+    return allocated / count
+
+
+def run(count: int) -> list:
+    """
+    Measure every pair of (legacy, compact) objects.
+    :param count: integer, objects built per measurement
+    :return: list of (label, legacy bytes, compact bytes)
+    """
+    machine = GumballMachine()
+    machine.insert_coin("quarter")
+
+    def insert():
+        return machine.insert_coin("dime")
+
+    def dispense():
+        return machine.dispense("red")
+
+    def change():
+        return machine.return_change()
+
+    return [
+        ("machine", measure(GumballMachine, count), measure(CompactGumballMachine, count)),
+        ("insert result", measure(lambda: _legacy_insert(machine), count), measure(insert, count)),
+        ("dispense result", measure(lambda: _legacy_dispense(machine), count), measure(dispense, count)),
+        ("change result", measure(lambda: _legacy_change(machine), count), measure(change, count)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=100_000, help="objects per measurement")
+    args = parser.parse_args()
+
+    print(f"{'object':<18}{'legacy B':>10}{'compact B':>11}{'saved':>8}")
+    for label, legacy, compact in run(args.count):
+        saved = 1 - compact / legacy if legacy else 0.0
+        print(f"{label:<18}{legacy:>10.1f}{compact:>11.1f}{saved:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Sharding benchmark: fleet simulation throughput versus worker processes
+
+Runs the same seeded traffic with 1, 2, 4, ... workers up to the CPU count and reports
+events per second and speedup over one worker.
+
+Run from the repository root:
+    python -m benchmarks.bench_sharding [--machines N] [--events N] [--max-workers N]
+"""
+
+import argparse
+import os
+import time
+
+from gumball_sharding import simulate
+
+
+def worker_counts(limit: int) -> list:
+    """1, 2, 4, ... up to limit, always including limit itself."""
+    counts = []
+    workers = 1
+    while workers < limit:
+        counts.append(workers)
+        workers *= 2
+    counts.append(limit)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--machines", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=1_000, help="events per machine")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    total_events = args.machines * args.events
+    baseline = None
+    print(f"{args.machines:,} machines x {args.events:,} events = {total_events:,} events")
+    print(f"{'workers':>8}{'seconds':>10}{'events/s':>14}{'speedup':>9}")
+    for workers in worker_counts(args.max_workers):
+        start = time.perf_counter()
+        result = simulate(args.machines, args.events, workers=workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{total_events / elapsed:>14,.0f}{baseline / elapsed:>9.2f}x")
+    print(f"fleet balance {result['balance']}¢, dispensed {result['counts']['dispensed']:,}")
+
+
+if __name__ == "__main__":
+    main()
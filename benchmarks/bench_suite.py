@@ -0,0 +1,213 @@
+"""
+Benchmark suite: ops/sec and bytes per call for every GumballMachine operation
+
+Cases cover insert_coin (valid, invalid, needs normalization), dispense (success,
+insufficient, unknown color), return_change (empty, a typical 85¢, past the change table,
+paid from a coin inventory), a full customer session, batch replay and fleet memory.
+
+Speed is also measured relative to a fixed reference workload timed alongside every
+case, which cancels most of the load on the host. Results can be written as JSON and
+compared with a stored baseline; the run fails if any case's relative speed (or memory) is
+worse than the baseline by more than the tolerance. Raw ops/sec is reported but never
+compared. Baselines are per host and not committed: record one on a clean tree first.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--json out.json] [--baseline FILE] [--tolerance 0.25]
+    python -m benchmarks.bench_suite --update-baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+from gumball_machine import (
+    CHANGE_MAKER,
+    EVENT_CHANGE,
+    EVENT_COIN,
+    EVENT_DISPENSE,
+    CompactGumballMachine,
+    GumballMachine,
+)
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+FLEET_SIZE = 100_000
+
+TYPICAL_CHANGE = 85 # cents: quarters, a dime and a nickel
+LARGE_CHANGE = CHANGE_MAKER.max_amount * 5 # cents, past the precomputed change table
+
+_SESSION = [(EVENT_COIN, "quarter"), (EVENT_DISPENSE, "red"), (EVENT_DISPENSE, "red"), (EVENT_CHANGE, None)]
+
+
+def _rich_machine() -> GumballMachine:
+    """Machine with enough balance that dispensing never runs dry during a benchmark."""
+    machine = GumballMachine()
+    machine.balance = 10 ** 15
+    return machine
+
+
+def _return(machine, cents: int):
+    """Credit cents, then pull the change lever."""
+    machine.balance = cents
+    return machine.return_change()
+
+
+def _session(machine):
+    """The spec scenario: quarter, two reds, return change."""
+    machine.insert_coin("quarter")
+    machine.dispense("red")
+    machine.dispense("red")
+    return machine.return_change()
+
+
+def cases() -> dict:
+    """
+    Benchmark cases: name -> zero-argument callable doing one operation.
+    :return: dictionary
+    """
+    machine = GumballMachine()
+    rich = _rich_machine()
+    broke = GumballMachine()
+    session = GumballMachine()
+    changer = GumballMachine()
+    stocked = GumballMachine(coin_inventory={"nickel": 10 ** 12, "dime": 10 ** 12, "quarter": 10 ** 12})
+    batch = GumballMachine()
+    events = _SESSION * 250
+    return {
+        "insert_coin.valid": lambda: machine.insert_coin("dime"),
+        "insert_coin.invalid": lambda: machine.insert_coin("penny"),
+        "insert_coin.normalize": lambda: machine.insert_coin("  DiMe "),
+        "insert_coin_code.valid": lambda: machine.insert_coin_code(1),
+        "dispense.success": lambda: rich.dispense("red"),
+        "dispense.insufficient": lambda: broke.dispense("yellow"),
+        "dispense.unknown": lambda: broke.dispense("blue"),
+        "return_change.empty": lambda: session.return_change(),
+        "return_change.typical": lambda: _return(changer, TYPICAL_CHANGE),
+        "return_change.large": lambda: _return(changer, LARGE_CHANGE),
+        "return_change.inventory": lambda: _return(stocked, TYPICAL_CHANGE),
+        "session": lambda: _session(session),
+        "apply_events.1000": lambda: batch.apply_events(events),
+    }
+
+
+def _reference():
+    """Fixed interpreter work, no gumball code: one call building a small dict, like a result."""
+    return {"accepted": True, "coin": "dime", "value": 10, "balance": 0}
+
+
+def speed(operation, repeat: int = 5) -> tuple:
+    """
+    Best-of-repeat calls per second, and the same relative to the reference workload.
+    The reference is timed next to each repeat, so a slower or busier host scales both.
+    :return: (calls per second, calls per reference call)
+    """
+    timer = timeit.Timer(operation)
+    reference = timeit.Timer(_reference)
+    number, _ = timer.autorange()
+    reference_number, _ = reference.autorange()
+    best = reference_best = float("inf")
+    for _ in range(repeat):
+        reference_best = min(reference_best, reference.timeit(reference_number))
+        best = min(best, timer.timeit(number))
+    ops = number / best
+    return ops, ops / (reference_number / reference_best)
+
+
+def bytes_per_call(operation, calls: int = 10_000) -> float:
+    """Bytes kept alive per call when every result is retained."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [operation() for _ in range(calls)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before - kept.__sizeof__()) / calls
+
+
+def fleet_bytes(factory, size: int = FLEET_SIZE) -> float:
+    """Bytes per machine for a fleet of size machines."""
+    return bytes_per_call(factory, size)
+
+
+def run() -> dict:
+    """
+    Run every case.
+    :return: dictionary of case -> {"ops_per_sec", "relative", "bytes_per_call"}
+    """
+    results = {}
+    for name, operation in cases().items():
+        ops, relative = speed(operation)
+        results[name] = {
+            "ops_per_sec": ops,
+            "relative": relative,
+            "bytes_per_call": bytes_per_call(operation),
+        }
+    for name, factory in (("fleet.GumballMachine", GumballMachine),
+                          ("fleet.CompactGumballMachine", CompactGumballMachine)):
+        results[name] = {"bytes_per_machine": fleet_bytes(factory)}
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Cases that got slower (relative to the reference) or bigger than the baseline by more
+    than tolerance. Raw ops/sec depends on the host and is not compared.
+    :return: list of (case, metric, baseline value, current value)
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if old is None or metric == "ops_per_sec":
+                continue
+            if metric == "relative":
+                worse = value < old * (1 - tolerance)
+            else:
+                worse = value > old * (1 + tolerance) + 8 # Allow one pointer of noise
+            if worse:
+                regressions.append((name, metric, old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown fraction")
+    parser.add_argument("--update-baseline", action="store_true", help="store results as the baseline")
+    args = parser.parse_args()
+
+    results = run()
+    print(f"{'case':<30}{'ops/s':>14}{'relative':>10}{'bytes':>10}")
+    for name, metrics in results.items():
+        ops = metrics.get("ops_per_sec")
+        relative = metrics.get("relative")
+        size = metrics.get("bytes_per_call", metrics.get("bytes_per_machine"))
+        print(f"{name:<30}{f'{ops:,.0f}' if ops else '-':>14}"
+              f"{f'{relative:.3g}' if relative else '-':>10}{size:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: baseline {old:,.3g}, now {new:,.3g}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
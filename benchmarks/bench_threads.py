@@ -0,0 +1,114 @@
+"""
+Thread stress benchmark: no lost or duplicated cents under contention
+
+Worker threads share one machine and hammer it with a fixed mix of coin inserts, lever
+pulls and change returns. Each worker tallies the cents it put in, spent and got back;
+afterwards  inserted == spent + returned + final balance  must hold exactly.
+
+Run from the repository root:
+    python -m benchmarks.bench_threads [--ops N] [--workers N] [--unsafe]
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gumball_machine import (
+    REJECTED_COIN,
+    GumballMachine,
+    ThreadSafeGumballMachine,
+    coin_code,
+    color_code,
+)
+
+QUARTER = coin_code("quarter")
+DIME = coin_code("dime")
+NICKEL = coin_code("nickel")
+RED = color_code("red")
+YELLOW = color_code("yellow")
+
+# One round of the operation mix: (kind, code)
+_MIX = (
+    ("coin", QUARTER),
+    ("lever", RED),
+    ("coin", DIME),
+    ("lever", YELLOW),
+    ("coin", REJECTED_COIN),
+    ("lever", YELLOW),
+    ("coin", NICKEL),
+    ("change", None),
+)
+
+
+def worker(machine, ops: int) -> tuple:
+    """
+    Run ops operations from the mix against the shared machine.
+    :return: (inserted, spent, returned) in cents
+    """
+    inserted = spent = returned = 0
+    insert_coin_code = machine.insert_coin_code
+    dispense_code = machine.dispense_code
+    return_change = machine.return_change
+    mix = _MIX
+    size = len(mix)
+    for i in range(ops):
+        kind, code = mix[i % size]
+        if kind == "coin":
+            result = insert_coin_code(code)
+            if result.accepted:
+                inserted += result.value
+        elif kind == "lever":
+            result = dispense_code(code)
+            if result.dispensed:
+                spent += result.price
+        else:
+            returned += return_change().returned
+    return inserted, spent, returned
+
+
+def run(machine, ops: int, workers: int) -> dict:
+    """
+    Split ops across a thread pool and check the cent ledger.
+    :return: dictionary
+    """
+    per_worker = ops // workers
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        tallies = list(pool.map(worker, [machine] * workers, [per_worker] * workers))
+    elapsed = time.perf_counter() - start
+    inserted = sum(t[0] for t in tallies)
+    spent = sum(t[1] for t in tallies)
+    returned = sum(t[2] for t in tallies)
+    return {
+        "ops": per_worker * workers,
+        "seconds": elapsed,
+        "inserted": inserted,
+        "spent": spent,
+        "returned": returned,
+        "balance": machine.balance,
+        "discrepancy": inserted - spent - returned - machine.balance,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=10_000_000, help="total operations")
+    parser.add_argument("--workers", type=int, default=8, help="threads sharing the machine")
+    parser.add_argument("--unsafe", action="store_true", help="use the unlocked GumballMachine")
+    args = parser.parse_args()
+
+    machine = GumballMachine() if args.unsafe else ThreadSafeGumballMachine()
+    # Switch threads as often as possible to provoke races
+    sys.setswitchinterval(1e-6)
+    stats = run(machine, args.ops, args.workers)
+    print(f"{type(machine).__name__}: {stats['ops']:,} ops on {args.workers} threads "
+          f"in {stats['seconds']:.2f}s ({stats['ops'] / stats['seconds']:,.0f} ops/s)")
+    print(f"  inserted {stats['inserted']}¢ = spent {stats['spent']}¢ + returned {stats['returned']}¢ "
+          f"+ balance {stats['balance']}¢ ; discrepancy {stats['discrepancy']}¢")
+    if stats["discrepancy"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
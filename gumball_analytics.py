@@ -0,0 +1,281 @@
+"""
+Gumball Sales Analytics
+
+- Streams machine results (result objects, dicts or a JSON-lines file of them) or journal
+  records through a generator pipeline, in chunks, in constant memory
+- Running aggregates: revenue and sales per color, rejected-coin rate, average change
+  returned (the balance at change return), and a sliding-window sales rate
+- Aggregates from separate worker processes merge into one report
+
+Usage:
+    python gumball_analytics.py results.jsonl [more.jsonl ...] [--workers N]
+"""
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from gumball_journal import JournalReader
+from gumball_machine import (
+    COLOR_NAMES,
+    COLOR_PRICES,
+    OUTCOME_ACCEPTED,
+    OUTCOME_DISPENSED,
+    OUTCOME_REJECTED,
+    OUTCOME_RETURNED,
+    color_code,
+)
+
+CHUNK_SIZE = 65536 # Results handled per chunk
+CHUNK_BYTES = 1 << 22 # Bytes of JSON lines read per chunk
+
+
+def _purchase_lines(filled: dict, total: int) -> list:
+    """
+    (color code, gumballs, cents) per color of a purchase result. The result only carries
+    the order total, so it is shared out in proportion to list prices: exact at list
+    prices, and always adding up to the total charged.
+    """
+    lines = [(color_code(color), count) for color, count in filled.items()]
+    list_total = sum(COLOR_PRICES[code] * count for code, count in lines)
+    shares = []
+    left = total
+    for index, (code, count) in enumerate(lines):
+        if index == len(lines) - 1:
+            cents = left
+        else:
+            cents = total * COLOR_PRICES[code] * count // list_total if list_total else 0
+        shares.append((code, count, cents))
+        left -= cents
+    return shares
+
+
+class SalesAggregate:
+    """Constant-memory running totals; add events, add results, or merge another aggregate."""
+    __slots__ = (
+        "revenue", "sales", "coins_accepted", "coins_rejected", "returns", "returned_total",
+        "window_seconds", "_window_sales", "_window_second",
+    )
+
+    def __init__(self, window_seconds: int = 60):
+        """
+        Start empty aggregates.
+        :param window_seconds: integer, length of the sliding sales-rate window
+        """
+        self.revenue = [0] * len(COLOR_NAMES) # cents, by color code
+        self.sales = [0] * len(COLOR_NAMES) # gumballs, by color code
+        self.coins_accepted = 0
+        self.coins_rejected = 0
+        self.returns = 0
+        self.returned_total = 0 # cents
+        self.window_seconds = window_seconds
+        # Ring of one-second buckets: sales in that second, and which second it holds
+        self._window_sales = [0] * window_seconds
+        self._window_second = [-1] * window_seconds
+
+    def add_event(self, outcome: int, code: int, amount: int, timestamp: float = None):
+        """
+        Count one operation; same arguments as a machine observer or a journal record.
+        :param outcome: integer, OUTCOME_* code
+        :param code: integer, coin or color code
+        :param amount: integer, cents moved
+        :param timestamp: float seconds, places sales in the sliding window
+        """
+        if outcome == OUTCOME_DISPENSED:
+            self.sales[code] += 1
+            self.revenue[code] += amount
+            if timestamp is not None:
+                self._count_sale(int(timestamp), 1)
+        elif outcome == OUTCOME_ACCEPTED:
+            self.coins_accepted += 1
+        elif outcome == OUTCOME_REJECTED:
+            self.coins_rejected += 1
+        elif outcome == OUTCOME_RETURNED:
+            self.returns += 1
+            self.returned_total += amount
+
+    def observe(self, machine, outcome: int, code: int, amount: int):
+        """Machine observer (see GumballMachine.add_observer); no timestamps."""
+        self.add_event(outcome, code, amount)
+
+    def add_result(self, result, timestamp: float = None):
+        """
+        Count one insert_coin / dispense / purchase / return_change result (object or dict).
+        :param result: result object or dictionary
+        :param timestamp: float seconds, defaults to the result's "ts" field if present
+        """
+        if timestamp is None:
+            timestamp = result.get("ts")
+        if "dispensed" in result:
+            if result["dispensed"]:
+                self.add_event(OUTCOME_DISPENSED, color_code(result["color"]), result["price"], timestamp)
+        elif "filled" in result:
+            for code, count, cents in _purchase_lines(result["filled"], result["total"]):
+                self.sales[code] += count
+                self.revenue[code] += cents
+                if timestamp is not None:
+                    self._count_sale(int(timestamp), count)
+        elif "accepted" in result:
+            self.add_event(OUTCOME_ACCEPTED if result["accepted"] else OUTCOME_REJECTED, -1, 0)
+        elif "returned" in result:
+            self.add_event(OUTCOME_RETURNED, -1, result["returned"])
+
+    def add_results(self, results):
+        """
+        Count a chunk of results.
+        :param results: iterable of result objects or dictionaries
+        """
+        add_result = self.add_result
+        for result in results:
+            add_result(result)
+
+    def _count_sale(self, second: int, count: int):
+        """Add sales to the window bucket for an absolute second."""
+        slot = second % self.window_seconds
+        if self._window_second[slot] != second:
+            if self._window_second[slot] > second:
+                return # Older than the window already holds
+            self._window_second[slot] = second
+            self._window_sales[slot] = 0
+        self._window_sales[slot] += count
+
+    def sales_rate(self, now: float) -> float:
+        """
+        Gumballs sold per second over the window ending at now.
+        :param now: float seconds, same clock as the timestamps
+        :return: float
+        """
+        newest = int(now)
+        oldest = newest - self.window_seconds
+        total = 0
+        for second, sales in zip(self._window_second, self._window_sales):
+            if oldest < second <= newest:
+                total += sales
+        return total / self.window_seconds
+
+    def merge(self, other: "SalesAggregate") -> "SalesAggregate":
+        """
+        Fold another aggregate (e.g. from a worker process) into this one.
+        :param other: SalesAggregate with the same window length
+        :return: self
+        """
+        if other.window_seconds != self.window_seconds:
+            raise ValueError("Cannot merge aggregates with different window lengths")
+        for code in range(len(COLOR_NAMES)):
+            self.revenue[code] += other.revenue[code]
+            self.sales[code] += other.sales[code]
+        self.coins_accepted += other.coins_accepted
+        self.coins_rejected += other.coins_rejected
+        self.returns += other.returns
+        self.returned_total += other.returned_total
+        for second, sales in zip(other._window_second, other._window_sales):
+            if second >= 0:
+                self._count_sale(second, sales)
+        return self
+
+    def report(self) -> dict:
+        """
+        Summary of the aggregates.
+        :return: dictionary
+        """
+        coins = self.coins_accepted + self.coins_rejected
+        return {
+            "revenue": dict(zip(COLOR_NAMES, self.revenue)),
+            "sales": dict(zip(COLOR_NAMES, self.sales)),
+            "rejected_coin_rate": self.coins_rejected / coins if coins else 0.0,
+            "average_change_returned": self.returned_total / self.returns if self.returns else 0.0,
+        }
+
+
+def chunked(iterable, size: int = CHUNK_SIZE):
+    """
+    Yield lists of up to size items.
+    :param iterable: any iterable
+    :param size: integer
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_results(path: str, chunk_bytes: int = CHUNK_BYTES):
+    """
+    Yield chunks (lists of dicts) from a JSON-lines file of results.
+    :param path: string
+    :param chunk_bytes: integer, bytes read per chunk
+    """
+    loads = json.loads
+    with open(path, encoding="utf-8") as file:
+        while True:
+            lines = file.readlines(chunk_bytes)
+            if not lines:
+                return
+            yield [loads(line) for line in lines if line.strip()]
+
+
+def aggregate_results(results, window_seconds: int = 60) -> SalesAggregate:
+    """
+    Aggregate a stream of results chunk by chunk.
+    :param results: iterable of result objects or dictionaries
+    :return: SalesAggregate
+    """
+    aggregate = SalesAggregate(window_seconds)
+    for chunk in chunked(results):
+        aggregate.add_results(chunk)
+    return aggregate
+
+
+def aggregate_file(path: str, window_seconds: int = 60) -> SalesAggregate:
+    """
+    Aggregate one JSON-lines file of results.
+    :param path: string
+    :return: SalesAggregate
+    """
+    aggregate = SalesAggregate(window_seconds)
+    for chunk in read_results(path):
+        aggregate.add_results(chunk)
+    return aggregate
+
+
+def aggregate_journal(path: str, window_seconds: int = 60) -> SalesAggregate:
+    """
+    Aggregate the records of a gumball_journal file (journals carry no timestamps).
+    :param path: string
+    :return: SalesAggregate
+    """
+    aggregate = SalesAggregate(window_seconds)
+    add_event = aggregate.add_event
+    with JournalReader(path) as reader:
+        for outcome, code, amount in reader.records():
+            add_event(outcome, code, amount)
+    return aggregate
+
+
+def aggregate_files(paths, workers: int = None, window_seconds: int = 60) -> SalesAggregate:
+    """
+    Aggregate many files in worker processes and merge the partial aggregates.
+    :param paths: list of JSON-lines file paths
+    :param workers: integer, processes (default: one per CPU)
+    :return: SalesAggregate
+    """
+    total = SalesAggregate(window_seconds)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(aggregate_file, paths, [window_seconds] * len(paths)):
+            total.merge(partial)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate gumball machine results")
+    parser.add_argument("paths", nargs="+", help="JSON-lines result files")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(aggregate_files(args.paths, args.workers).report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
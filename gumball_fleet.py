@@ -0,0 +1,90 @@
+"""
+Vectorized Gumball Fleet Simulator
+
+- Keeps the balances of N machines in one NumPy array
+- Applies one tick of coin inserts, lever pulls and change returns to every machine at once
+- Coins and colors are passed as the interned codes from gumball_machine (coin_code / color_code)
+- Within a tick each machine handles its coin first, then its lever, then its change lever
+- Behaves event for event like N independent GumballMachine objects
+"""
+
+import numpy as np
+
+from gumball_machine import COIN_VALUES, COLOR_PRICES, REJECTED_COIN, UNKNOWN_COLOR
+
+NO_EVENT = -1  # Machine does nothing on this slot of the tick
+
+# Lookup vectors; the trailing slot is hit by every out-of-table code
+_COIN_VALUES = np.array([*COIN_VALUES, 0], dtype=np.int64)
+_COLOR_PRICES = np.array([*COLOR_PRICES, 0], dtype=np.int64)
+
+COUNTER_NAMES = ("accepted", "rejected", "dispensed", "insufficient", "unknown", "returned")
+
+
+def _lookup(codes, table_size: int):
+    """Return (present, valid, index) masks for an array of event codes."""
+    present = codes != NO_EVENT
+    valid = (codes >= 0) & (codes < table_size)
+    index = np.where(valid, codes, table_size)
+    return present, valid, index
+
+
+class GumballFleet:
+
+    def __init__(self, size: int):
+        """
+        Initialize a fleet of machines, all with balance = 0
+        :param size: integer, number of machines
+        """
+        self.size = size
+        self.balance = np.zeros(size, dtype=np.int64)  # cents, one slot per machine
+        # Running totals per machine, see COUNTER_NAMES ("returned" is in cents)
+        self.counters = {name: np.zeros(size, dtype=np.int64) for name in COUNTER_NAMES}
+
+    def _events(self, codes):
+        """Validate one column of tick events and return it as an int array."""
+        if codes is None:
+            return None
+        codes = np.asarray(codes, dtype=np.int64)
+        if codes.shape != (self.size,):
+            raise ValueError(f"Expected {self.size} events, got shape {codes.shape}")
+        return codes
+
+    def tick(self, coins=None, levers=None, change=None) -> dict:
+        """
+        Apply one tick of events to every machine.
+        :param coins: array of coin codes per machine, NO_EVENT for no insert
+        :param levers: array of color codes per machine, NO_EVENT for no pull
+        :param change: boolean array, True pulls the 'Return My Change' lever
+        :return: dictionary of per-machine arrays for this tick
+        """
+        coins = self._events(coins)
+        levers = self._events(levers)
+        tick = {name: np.zeros(self.size, dtype=np.int64) for name in COUNTER_NAMES}
+
+        if coins is not None:
+            present, valid, index = _lookup(coins, REJECTED_COIN)
+            self.balance += _COIN_VALUES[index]
+            tick["accepted"] = valid.astype(np.int64)
+            tick["rejected"] = (present & ~valid).astype(np.int64)
+
+        if levers is not None:
+            present, valid, index = _lookup(levers, UNKNOWN_COLOR)
+            price = _COLOR_PRICES[index]
+            affordable = self.balance >= price
+            dispensed = valid & affordable
+            self.balance -= np.where(dispensed, price, 0)
+            tick["dispensed"] = dispensed.astype(np.int64)
+            tick["insufficient"] = (valid & ~affordable).astype(np.int64)
+            tick["unknown"] = (present & ~valid).astype(np.int64)
+
+        if change is not None:
+            change = np.asarray(change, dtype=bool)
+            if change.shape != (self.size,):
+                raise ValueError(f"Expected {self.size} events, got shape {change.shape}")
+            tick["returned"] = np.where(change, self.balance, 0)
+            self.balance[change] = 0
+
+        for name in COUNTER_NAMES:
+            self.counters[name] += tick[name]
+        return tick
@@ -0,0 +1,244 @@
+"""
+Differential Fuzzer
+
+- Generates long random sequences of coin inserts (valid coins in odd spellings and junk
+  strings), lever pulls (real and junk colors), multi-gumball purchases under both fill
+  policies and change returns
+- Replays each sequence against the reference GumballMachine and every registered
+  implementation, under several machine configurations (unlimited, limited stock,
+  limited change)
+- The reference runs each sequence once; every implementation must match its results
+  (every field, including change breakdowns) and balances step by step, and its coin
+  inventory and stock at the end
+- Failing sequences are shrunk to a minimal reproduction
+
+Usage:
+    python gumball_fuzz.py [--steps 1000000] [--length 1000] [--seed 0]
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import namedtuple
+
+from gumball_machine import (
+    COIN_NAMES,
+    COLOR_NAMES,
+    EVENT_CHANGE,
+    EVENT_COIN,
+    EVENT_DISPENSE,
+    ORDER_ALL_OR_NOTHING,
+    ORDER_BEST_EFFORT,
+    CompactGumballMachine,
+    GumballMachine,
+    ThreadSafeGumballMachine,
+)
+from gumball_metrics import InstrumentedGumballMachine, MachineMetrics
+
+SEQUENCE_LENGTH = 1000 # Steps per generated sequence
+STEP_PURCHASE = 3 # Step kind after the EVENT_* kinds; its token is (order, policy)
+
+# Machine configurations every sequence may run under (constructor keyword arguments)
+CONFIGS = (
+    {},
+    {"stock": {"red": 4, "yellow": 3}},
+    {"coin_inventory": {"nickel": 1, "dime": 2, "quarter": 0}},
+    {"coin_inventory": {"nickel": 3}, "stock": {"red": 2}},
+)
+
+# Implementations checked against GumballMachine: name -> factory(**config)
+IMPLEMENTATIONS = {
+    "compact": CompactGumballMachine,
+    "thread_safe": ThreadSafeGumballMachine,
+    "instrumented": lambda **config: InstrumentedGumballMachine(MachineMetrics(), **config),
+}
+
+Failure = namedtuple("Failure", "implementation config steps index expected actual")
+
+
+def register(name: str, factory):
+    """
+    Check another implementation on every fuzz run.
+    :param name: string
+    :param factory: callable taking the CONFIGS keyword arguments, returning a machine
+    """
+    IMPLEMENTATIONS[name] = factory
+
+
+def unregister(name: str):
+    """Stop checking an implementation."""
+    IMPLEMENTATIONS.pop(name, None)
+
+
+def _variants(name: str) -> list:
+    """A valid name spelled the ways customers type it."""
+    return [name, name.upper(), name.title(), f"  {name} ", f"\t{name.title()}\n"]
+
+
+_JUNK = ["", " ", "penny", "dollar", "quarters", "nick el", "🍬", "None", "0"]
+
+# Orders that fill, fall short on balance, stock or change, or name junk colors and counts
+_ORDERS = [
+    {"red": 1, "yellow": 1},
+    {"red": 3},
+    {"yellow": 2, "red": 2},
+    {" RED ": 1, "red": 1},
+    {"Yellow": 1, "blue": 1},
+    {"red": 0},
+    {"red": -1},
+]
+
+# Weighted step pool; sampling from it is the whole generator
+_STEPS = (
+    [(EVENT_COIN, token) for name in COIN_NAMES for token in _variants(name) for _ in range(2)]
+    + [(EVENT_COIN, token) for token in _JUNK + list(COLOR_NAMES)]
+    + [(EVENT_DISPENSE, token) for name in COLOR_NAMES for token in _variants(name) for _ in range(2)]
+    + [(EVENT_DISPENSE, token) for token in _JUNK + list(COIN_NAMES)]
+    + [(EVENT_CHANGE, None)] * 4
+    + [(STEP_PURCHASE, (order, policy)) for order in _ORDERS for policy in (ORDER_ALL_OR_NOTHING, ORDER_BEST_EFFORT)]
+)
+
+
+def generate(length: int, rng: random.Random) -> list:
+    """
+    Random sequence of (kind, token) steps.
+    :param length: integer
+    :param rng: random.Random
+    :return: list
+    """
+    return rng.choices(_STEPS, k=length)
+
+
+def _apply(machine, kind: int, token):
+    """One step; exceptions become comparable values so they can be diffed too."""
+    try:
+        if kind == EVENT_COIN:
+            return machine.insert_coin(token)
+        if kind == EVENT_DISPENSE:
+            return machine.dispense(token)
+        if kind == STEP_PURCHASE:
+            return machine.purchase(*token)
+        return machine.return_change()
+    except Exception as error:
+        return ("error", type(error).__name__, str(error))
+
+
+def _state(machine) -> tuple:
+    """Balance, coins on hand and stock."""
+    return machine.balance, machine.coins and list(machine.coins), machine.stock and list(machine.stock)
+
+
+def trace(steps, machine) -> tuple:
+    """
+    Replay steps on a machine.
+    :param steps: list of (kind, token)
+    :param machine: fresh machine
+    :return: (list of (result, balance) per step, final state)
+    """
+    results = []
+    for kind, token in steps:
+        results.append((_apply(machine, kind, token), machine.balance))
+    return results, _state(machine)
+
+
+def first_mismatch(steps, factory, config: dict, expected: tuple = None):
+    """
+    Replay steps on one implementation and compare with the reference.
+    :param steps: list of (kind, token)
+    :param factory: implementation factory
+    :param config: dictionary of constructor keyword arguments
+    :param expected: the reference trace() of steps, if already computed
+    :return: (index, expected, actual) for the first difference, or None
+    """
+    if expected is None:
+        expected = trace(steps, GumballMachine(**config))
+    results, state = expected
+    machine = factory(**config)
+    for index, (kind, token) in enumerate(steps):
+        actual = (_apply(machine, kind, token), machine.balance)
+        if actual != results[index]:
+            return index, results[index], actual
+    if _state(machine) != state:
+        return len(steps), state, _state(machine)
+    return None
+
+
+def shrink(steps: list, fails) -> list:
+    """
+    Smallest sequence found (by removing ever smaller chunks) that still fails.
+    :param steps: list, a failing sequence
+    :param fails: callable(list) -> bool
+    :return: list
+    """
+    chunk = max(len(steps) // 2, 1)
+    while True:
+        index = 0
+        while index < len(steps):
+            candidate = steps[:index] + steps[index + chunk:]
+            if fails(candidate):
+                steps = candidate
+            else:
+                index += chunk
+        if chunk == 1:
+            return steps
+        chunk //= 2
+
+
+def fuzz(total_steps: int = 1_000_000, length: int = SEQUENCE_LENGTH, seed: int = 0,
+         implementations: dict = None) -> list:
+    """
+    Run random sequences against every implementation until total_steps have been checked
+    per implementation.
+    :param total_steps: integer
+    :param length: integer, steps per sequence
+    :param seed: integer, makes the run reproducible
+    :param implementations: dictionary name -> factory (default: IMPLEMENTATIONS)
+    :return: list of Failure, shrunk, at most one per implementation
+    """
+    rng = random.Random(seed)
+    remaining = dict(IMPLEMENTATIONS if implementations is None else implementations)
+    failures = []
+    done = 0
+    while done < total_steps and remaining:
+        steps = generate(min(length, total_steps - done), rng)
+        config = CONFIGS[rng.randrange(len(CONFIGS))]
+        expected = trace(steps, GumballMachine(**config))
+        for name, factory in list(remaining.items()):
+            mismatch = first_mismatch(steps, factory, config, expected)
+            if mismatch is None:
+                continue
+            # Only the prefix up to the first difference matters
+            fails = lambda candidate: first_mismatch(candidate, factory, config) is not None
+            minimal = shrink(steps[:mismatch[0] + 1], fails)
+            index, wanted, actual = first_mismatch(minimal, factory, config)
+            failures.append(Failure(name, config, minimal, index, wanted, actual))
+            del remaining[name] # One minimal report per implementation is enough
+        done += len(steps)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential fuzzing against the reference GumballMachine")
+    parser.add_argument("--steps", type=int, default=1_000_000, help="steps per implementation")
+    parser.add_argument("--length", type=int, default=SEQUENCE_LENGTH, help="steps per sequence")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    failures = fuzz(args.steps, args.length, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{args.steps:,} steps x {len(IMPLEMENTATIONS)} implementations in {elapsed:.1f} s")
+    for failure in failures:
+        print(f"MISMATCH {failure.implementation} config={failure.config} at step {failure.index}")
+        for kind, token in failure.steps:
+            print(f"  {kind} {token!r}")
+        print(f"  expected {failure.expected!r}")
+        print(f"  actual   {failure.actual!r}")
+    if failures:
+        sys.exit(1)
+    print("No mismatches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Fleet Index
+
+- Registry of machines with indexes kept up to date through the machine observer hook,
+  so questions about the fleet never scan every machine
+- Balance buckets: machines grouped by balance, with the distinct balances kept sorted
+  (a fleet holds few distinct amounts), for range and top-k queries in O(log B + k)
+- Last-sale and last-activity orderings: array-backed linked lists in recency order,
+  O(1) to update and O(k) to list the k stalest machines
+- Updates cost one observer call per operation; a balance changed behind the observers'
+  back (restore(), direct assignment) is picked up with refresh()
+"""
+
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+from gumball_machine import OUTCOME_DISPENSED
+
+_NONE = -1 # End of a recency list
+
+
+class _Recency:
+    """Ids ordered by their last touch, oldest first, as a doubly linked list in arrays."""
+    __slots__ = ("previous", "following", "touched", "head", "tail")
+
+    def __init__(self):
+        self.previous = array("q")
+        self.following = array("q")
+        self.touched = array("d") # clock time of the last touch, by id
+        self.head = _NONE # Oldest
+        self.tail = _NONE # Newest
+
+    def grow(self, size: int):
+        """Make room for ids below size."""
+        missing = size - len(self.touched)
+        if missing > 0:
+            self.previous.extend([_NONE] * missing)
+            self.following.extend([_NONE] * missing)
+            self.touched.extend([0.0] * missing)
+
+    def push(self, ident: int, now: float):
+        """Link an id as the newest."""
+        self.touched[ident] = now
+        self.previous[ident] = self.tail
+        self.following[ident] = _NONE
+        if self.tail == _NONE:
+            self.head = ident
+        else:
+            self.following[self.tail] = ident
+        self.tail = ident
+
+    def unlink(self, ident: int):
+        before, after = self.previous[ident], self.following[ident]
+        if before == _NONE:
+            self.head = after
+        else:
+            self.following[before] = after
+        if after == _NONE:
+            self.tail = before
+        else:
+            self.previous[after] = before
+
+    def touch(self, ident: int, now: float):
+        """Mark an id as the newest."""
+        if ident != self.tail:
+            self.unlink(ident)
+            self.push(ident, now)
+        else:
+            self.touched[ident] = now
+
+    def oldest(self, limit: int = None, before: float = None):
+        """Yield ids oldest first, stopping at limit ids or the first touched at/after before."""
+        ident = self.head
+        following, touched = self.following, self.touched
+        while ident != _NONE and limit != 0:
+            if before is not None and touched[ident] >= before:
+                return
+            yield ident
+            ident = following[ident]
+            if limit is not None:
+                limit -= 1
+
+
+class FleetIndex:
+
+    def __init__(self, clock=time.time):
+        """
+        Empty index.
+        :param clock: callable returning seconds, used to time sales and activity
+        """
+        self._clock = clock
+        self._keys = [] # id -> key (None for a freed id)
+        self._machines = [] # id -> machine
+        self._ids = {} # key -> id
+        self._machine_ids = {} # machine -> id
+        self._free = [] # Ids of removed machines, reused first
+        self._balances = array("q") # id -> indexed balance
+        self._buckets = {} # balance -> set of ids
+        self._levels = [] # Sorted distinct balances
+        self._sales = _Recency()
+        self._activity = _Recency()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key) -> bool:
+        return key in self._ids
+
+    def add(self, key, machine):
+        """
+        Register a machine and start indexing it. A machine with no sales yet counts as
+        having sold when it was added.
+        :param key: hashable machine id
+        :param machine: GumballMachine (or any variant)
+        :return: machine
+        """
+        if key in self._ids:
+            raise ValueError(f"Machine already indexed: {key!r}")
+        if machine in self._machine_ids:
+            existing = self._keys[self._machine_ids[machine]]
+            raise ValueError(f"Machine already indexed as {existing!r}, cannot add it as {key!r}")
+        if self._free:
+            ident = self._free.pop()
+            self._keys[ident] = key
+            self._machines[ident] = machine
+        else:
+            ident = len(self._keys)
+            self._keys.append(key)
+            self._machines.append(machine)
+            self._balances.append(0)
+            self._sales.grow(ident + 1)
+            self._activity.grow(ident + 1)
+        self._ids[key] = ident
+        self._machine_ids[machine] = ident
+        self._balances[ident] = machine.balance
+        self._bucket_add(ident, machine.balance)
+        now = self._clock()
+        self._sales.push(ident, now)
+        self._activity.push(ident, now)
+        machine.add_observer(self._observe)
+        return machine
+
+    def remove(self, key):
+        """Stop indexing a machine."""
+        ident = self._ids.pop(key)
+        machine = self._machines[ident]
+        machine.remove_observer(self._observe)
+        del self._machine_ids[machine]
+        self._bucket_discard(ident, self._balances[ident])
+        self._sales.unlink(ident)
+        self._activity.unlink(ident)
+        self._keys[ident] = None
+        self._machines[ident] = None
+        self._free.append(ident)
+
+    def refresh(self, key):
+        """Re-read a machine's balance after it changed without an operation (e.g. restore())."""
+        ident = self._ids[key]
+        self._rebalance(ident, self._machines[ident].balance)
+
+    def _observe(self, machine, outcome: int, code: int, amount: int):
+        """Machine observer: move the machine between balance buckets and recency slots."""
+        ident = self._machine_ids[machine]
+        if machine.balance != self._balances[ident]:
+            self._rebalance(ident, machine.balance)
+        now = self._clock()
+        self._activity.touch(ident, now)
+        if outcome == OUTCOME_DISPENSED:
+            self._sales.touch(ident, now)
+
+    def _rebalance(self, ident: int, balance: int):
+        self._bucket_discard(ident, self._balances[ident])
+        self._balances[ident] = balance
+        self._bucket_add(ident, balance)
+
+    def _bucket_add(self, ident: int, balance: int):
+        bucket = self._buckets.get(balance)
+        if bucket is None:
+            bucket = self._buckets[balance] = set()
+            insort(self._levels, balance)
+        bucket.add(ident)
+
+    def _bucket_discard(self, ident: int, balance: int):
+        bucket = self._buckets[balance]
+        bucket.discard(ident)
+        if not bucket:
+            del self._buckets[balance]
+            del self._levels[bisect_left(self._levels, balance)]
+
+    def balance_range(self, low: int = 0, high: int = None) -> list:
+        """
+        Machines holding low..high cents (inclusive), lowest balances first.
+        :param low: integer, cents
+        :param high: integer, cents (None for no upper bound)
+        :return: list of keys
+        """
+        levels = self._levels
+        start = bisect_left(levels, low)
+        end = len(levels) if high is None else bisect_right(levels, high)
+        keys = self._keys
+        return [keys[ident] for balance in levels[start:end] for ident in self._buckets[balance]]
+
+    def top_balances(self, count: int) -> list:
+        """
+        The machines holding the most uncollected balance.
+        :param count: integer
+        :return: list of (key, balance), highest first
+        """
+        top = []
+        for balance in reversed(self._levels):
+            for ident in self._buckets[balance]:
+                if len(top) == count:
+                    return top
+                top.append((self._keys[ident], balance))
+        return top
+
+    def no_sales_since(self, since: float) -> list:
+        """
+        Machines with no sale at or after a time, longest without a sale first.
+        :param since: float seconds, same clock as the index
+        :return: list of keys
+        """
+        keys = self._keys
+        return [keys[ident] for ident in self._sales.oldest(before=since)]
+
+    def idle_since(self, since: float) -> list:
+        """
+        Machines with no operation at all at or after a time, idle longest first.
+        :param since: float seconds, same clock as the index
+        :return: list of keys
+        """
+        keys = self._keys
+        return [keys[ident] for ident in self._activity.oldest(before=since)]
+
+    def stalest(self, count: int) -> list:
+        """
+        The machines that have gone longest without a sale.
+        :param count: integer
+        :return: list of (key, last sale time), oldest first
+        """
+        keys, touched = self._keys, self._sales.touched
+        return [(keys[ident], touched[ident]) for ident in self._sales.oldest(limit=count)]
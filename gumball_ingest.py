@@ -0,0 +1,180 @@
+"""
+Coin-Acceptor Ingest Pipeline
+
+- Reads framed events from a file descriptor (acceptor serial line, FIFO, pty, pipe):
+  one byte per event, encoded as in gumball_sharding (kind << 4 | code)
+- A reader thread fills a fixed pool of reusable bytearrays with readinto(); the machine
+  thread replays each filled buffer with apply_events() through a memoryview, so no
+  strings or tuples are built per event
+- Backpressure: the reader can only read into a free buffer. When every buffer is waiting
+  to be dispatched it stops reading, the kernel pipe fills and the acceptor blocks. Memory
+  stays at buffers x buffer_size and no credited coin is ever dropped
+- Bytes that are not events (line noise) are counted and skipped
+- If the machine raises, the reader is stopped and the events it had already read but
+  that were never applied are counted (stats()["unapplied"]) before the error propagates
+
+Usage:
+    python gumball_ingest.py /path/to/fifo [--buffer-size 4096] [--buffers 4]
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import re
+import threading
+
+from gumball_machine import OUTCOME_NAMES, GumballMachine
+from gumball_sharding import INVALID_BYTES, decode_events
+
+BUFFER_SIZE = 4096 # Bytes (events) per read
+BUFFERS = 4 # Buffers in the pool; bounds memory and how far reading runs ahead
+
+_VALID_BYTES = bytes(value for value in range(256) if value not in INVALID_BYTES)
+_NOISE = re.compile(b"[^" + b"".join(re.escape(bytes([value])) for value in _VALID_BYTES) + b"]")
+
+
+def _event_count(buffer: bytearray, length: int) -> int:
+    """Events in the first length bytes of a buffer, line noise excluded."""
+    return length - len(_NOISE.findall(buffer, 0, length))
+
+
+class IngestPipeline:
+
+    def __init__(self, fd: int, machine, buffer_size: int = BUFFER_SIZE, buffers: int = BUFFERS):
+        """
+        Prepare the buffer pool; nothing is read until run().
+        :param fd: integer file descriptor to read events from (left open)
+        :param machine: GumballMachine (or any variant), used only by the thread calling run()
+        :param buffer_size: integer, bytes per buffer
+        :param buffers: integer, buffers in the pool
+        """
+        self.fd = fd
+        self.machine = machine
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(bytearray(buffer_size))
+        self._ready = queue.Queue() # (buffer, length); None at end of input. Never more than buffers + 1
+        self._lock = threading.Lock() # Orders a stop against the reader queueing a buffer
+        self._stopping = False
+        self._error = None
+        self.batches = 0
+        self.events = 0
+        self.junk = 0 # bytes skipped
+        self.returned = 0 # cents
+        self.unapplied = 0 # events read but not applied because dispatch failed
+        self.counts = [0] * len(OUTCOME_NAMES)
+
+    def _read(self):
+        """Reader thread: fill free buffers until end of input."""
+        source = io.FileIO(self.fd, "rb", closefd=False)
+        try:
+            while True:
+                buffer = self._free.get() # Blocks while every buffer awaits dispatch
+                if buffer is None or self._stopping:
+                    return
+                length = source.readinto(buffer)
+                if not length:
+                    self._free.put(buffer)
+                    return
+                with self._lock:
+                    if self._stopping: # Dispatch failed during the read
+                        self.unapplied += _event_count(buffer, length)
+                        return
+                    self._ready.put((buffer, length))
+        except BaseException as error:
+            self._error = error
+        finally:
+            if not self._stopping:
+                self._ready.put(None)
+
+    def _dispatch(self, buffer: bytearray, length: int):
+        """Replay one filled buffer on the machine."""
+        events = memoryview(buffer)[:length]
+        if _NOISE.search(buffer, 0, length) is not None: # One scan, no copy
+            events = events.tobytes().translate(None, INVALID_BYTES) # Rare: strip line noise
+            self.junk += length - len(events)
+        pending = decode_events(events) # Lazy: what is left of it was never applied
+        try:
+            result = self.machine.apply_events(pending)
+        except BaseException:
+            self.unapplied += sum(1 for _ in pending) # Events after the one that failed
+            raise
+        self.batches += 1
+        self.events += len(events)
+        self.returned += result["returned"]
+        for outcome, name in enumerate(OUTCOME_NAMES):
+            self.counts[outcome] += result["counts"][name]
+
+    def run(self) -> dict:
+        """
+        Ingest until end of input. If the machine raises, the reader is stopped (a read
+        already waiting on the source ends when it returns), unapplied events are counted
+        in stats() and the error is re-raised.
+        :return: dictionary of totals (see stats)
+        """
+        reader = threading.Thread(target=self._read, name="gumball-ingest", daemon=True)
+        reader.start()
+        try:
+            while True:
+                item = self._ready.get()
+                if item is None:
+                    break
+                buffer, length = item
+                self._dispatch(buffer, length)
+                self._free.put(buffer)
+        except BaseException:
+            self._abandon()
+            raise
+        reader.join()
+        if self._error is not None:
+            raise self._error
+        return self.stats()
+
+    def _abandon(self):
+        """Stop the reader and count the events queued behind a failed dispatch."""
+        with self._lock:
+            self._stopping = True
+            while True:
+                try:
+                    item = self._ready.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    self.unapplied += _event_count(*item)
+        self._free.put(None) # Wakes a reader waiting for a free buffer
+
+    def stats(self) -> dict:
+        """
+        Totals so far.
+        :return: dictionary
+        """
+        return {
+            "batches": self.batches,
+            "events": self.events,
+            "junk": self.junk,
+            "balance": self.machine.balance,
+            "returned": self.returned,
+            "unapplied": self.unapplied,
+            "counts": dict(zip(OUTCOME_NAMES, self.counts)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feed a coin-acceptor byte stream into a gumball machine")
+    parser.add_argument("path", help="FIFO, pty or device to read ('-' for stdin)")
+    parser.add_argument("--buffer-size", type=int, default=BUFFER_SIZE)
+    parser.add_argument("--buffers", type=int, default=BUFFERS)
+    args = parser.parse_args()
+    fd = 0 if args.path == "-" else os.open(args.path, os.O_RDONLY)
+    try:
+        stats = IngestPipeline(fd, GumballMachine(), args.buffer_size, args.buffers).run()
+    finally:
+        if fd:
+            os.close(fd)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
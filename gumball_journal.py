@@ -0,0 +1,248 @@
+"""
+Gumball Event Journal
+
+- Append-only file of fixed-width 8-byte records, one per machine operation
+- Records are packed into a reusable buffer and written with one fsync per batch
+- A snapshot record holding the full balance is written every snapshot_every records
+- Recovery memory-maps the file, scans back to the last snapshot and applies only the
+  records after it, so it costs O(snapshot_every) however long the journal grows
+- A torn record at the end of the file (crash mid-write) is ignored and trimmed on reopen
+- rebuild() replays the whole journal through a fresh machine for audits
+- A machine restore() is journaled as a restored record followed by a snapshot, so
+  recovery picks up the restored balance
+"""
+
+import mmap
+import os
+import struct
+
+from gumball_machine import (
+    OUTCOME_ACCEPTED,
+    OUTCOME_DISPENSED,
+    OUTCOME_ESCROWED,
+    OUTCOME_RESTORED,
+    OUTCOME_RETURNED,
+)
+
+HEADER = b"GUMJRNL1" # Same width as a record, so records stay aligned
+RECORD = struct.Struct("<Bbxxi") # outcome, coin/color code, padding, amount in cents
+SNAPSHOT = 255 # Outcome byte of a snapshot record; its amount is the balance
+
+# Balance change per outcome byte, multiplied by the record amount during recovery
+_SIGN = [0] * 256
+_SIGN[OUTCOME_ACCEPTED] = 1
+_SIGN[OUTCOME_DISPENSED] = -1
+_SIGN[OUTCOME_RETURNED] = -1
+_SIGN[OUTCOME_ESCROWED] = -1
+
+
+class JournalWriter:
+
+    def __init__(self, path: str, sync_every: int = 4096, snapshot_every: int = 65536):
+        """
+        Open (or create) a journal for appending.
+        :param path: string
+        :param sync_every: integer, records buffered per write + fsync
+        :param snapshot_every: integer, records between balance snapshots
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.snapshot_every = snapshot_every
+        self._file = open(path, "a+b")
+        size = self._file.seek(0, os.SEEK_END)
+        if size == 0:
+            self._file.write(HEADER)
+        else:
+            self._file.seek(0)
+            if self._file.read(len(HEADER)) != HEADER:
+                self._file.close()
+                raise ValueError(f"Not a gumball journal: {path}")
+            torn = (size - len(HEADER)) % RECORD.size
+            if torn:
+                self._file.truncate(size - torn) # Drop a half-written record
+        self._buffer = bytearray(RECORD.size * sync_every)
+        self._pending = 0 # Records waiting in the buffer
+        self._since_snapshot = 0
+
+    def attach(self, machine):
+        """
+        Journal every operation of a machine, starting with a snapshot of its balance.
+        :param machine: GumballMachine (or any variant)
+        """
+        self.snapshot(machine.balance)
+        machine.add_observer(self.record)
+
+    def record(self, machine, outcome: int, code: int, amount: int):
+        """Machine observer: append one operation (see GumballMachine.add_observer)."""
+        self._append(outcome, code, amount)
+        if outcome == OUTCOME_RESTORED: # The balance was replaced, not moved
+            self.snapshot(amount)
+            return
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot(machine.balance)
+
+    def snapshot(self, balance: int):
+        """
+        Append a balance snapshot so recovery can start here.
+        :param balance: integer, cents
+        """
+        self._append(SNAPSHOT, 0, balance)
+        self._since_snapshot = 0
+
+    def _append(self, outcome: int, code: int, amount: int):
+        """Pack one record into the buffer, flushing when it is full."""
+        RECORD.pack_into(self._buffer, self._pending * RECORD.size, outcome, code, amount)
+        self._pending += 1
+        if self._pending == self.sync_every:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records and fsync them to disk."""
+        if self._pending:
+            self._file.write(memoryview(self._buffer)[:self._pending * RECORD.size])
+            self._pending = 0
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Flush and close the journal."""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JournalReader:
+
+    def __init__(self, path: str):
+        """
+        Memory-map a journal for reading.
+        :param path: string
+        """
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(HEADER)] != HEADER:
+            self._map.close()
+            raise ValueError(f"Not a gumball journal: {path}")
+        self._count = (len(self._map) - len(HEADER)) // RECORD.size # Ignores a torn tail
+
+    def __len__(self) -> int:
+        return self._count
+
+    def records(self, start: int = 0):
+        """
+        Iterate (outcome, code, amount) tuples from record index start.
+        :param start: integer
+        :return: iterator of tuples
+        """
+        begin = len(HEADER) + start * RECORD.size
+        end = len(HEADER) + self._count * RECORD.size
+        return RECORD.iter_unpack(memoryview(self._map)[begin:end])
+
+    def last_snapshot(self) -> tuple:
+        """
+        Find the newest snapshot by scanning backwards from the end.
+        :return: (record index, balance), or None if there is no snapshot
+        """
+        data = self._map
+        for index in range(self._count - 1, -1, -1):
+            offset = len(HEADER) + index * RECORD.size
+            if data[offset] == SNAPSHOT:
+                return index, RECORD.unpack_from(data, offset)[2]
+        return None
+
+    def recover_balance(self) -> int:
+        """
+        Balance after the last complete record: last snapshot plus the records after it.
+        :return: integer, cents
+        """
+        found = self.last_snapshot()
+        if found is None:
+            return 0
+        index, balance = found
+        sign = _SIGN
+        for outcome, _, amount in self.records(index + 1):
+            balance += sign[outcome] * amount
+        return balance
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def recover(path: str, machine=None) -> int:
+    """
+    Fast crash recovery of a machine's balance from its journal.
+    :param path: string
+    :param machine: optional machine whose balance is restored
+    :return: integer, recovered balance in cents
+    """
+    with JournalReader(path) as reader:
+        balance = reader.recover_balance()
+    if machine is not None:
+        machine.balance = balance
+    return balance
+
+
+def rebuild(path: str, machine):
+    """
+    Replay a whole journal through a fresh machine, rebuilding inventory and stock as well
+    as the balance. The first snapshot seeds the balance; later ones are checked against it.
+    Records are applied as journaled, at the recorded amounts: prices, change checks and
+    order settlement are not re-run, so a journal spanning a price change replays as it
+    happened. A restore() re-seeds the balance, but the restored inventory and stock are
+    not journaled: rebuilding a machine that tracks them past a restore raises ValueError.
+    :param path: string
+    :param machine: machine configured like the journaled one, without a journal attached
+    :return: the machine
+    """
+    seeded = False
+    with JournalReader(path) as reader:
+        for index, (outcome, code, amount) in enumerate(reader.records()):
+            if outcome == SNAPSHOT:
+                if not seeded:
+                    machine.balance = amount
+                    seeded = True
+                elif machine.balance != amount:
+                    raise ValueError(
+                        f"Journal diverges at record {index}: snapshot {amount}¢, "
+                        f"replayed {machine.balance}¢"
+                    )
+            elif outcome == OUTCOME_ACCEPTED:
+                machine.balance += amount
+                if machine.coins is not None:
+                    machine.coins[code] += 1
+            elif outcome == OUTCOME_DISPENSED:
+                machine.balance -= amount
+                if machine.stock is not None:
+                    machine.stock[code] -= 1
+            elif outcome == OUTCOME_RETURNED:
+                # Which coins were paid is not journaled; the same balance and inventory pay the same
+                returned = machine.return_change().returned
+                if returned != amount:
+                    raise ValueError(
+                        f"Journal diverges at record {index}: returned {amount}¢, "
+                        f"replayed {returned}¢"
+                    )
+            elif outcome == OUTCOME_ESCROWED:
+                machine.balance -= amount
+            elif outcome == OUTCOME_RESTORED:
+                if machine.coins is not None or machine.stock is not None:
+                    raise ValueError(
+                        f"Journal restores a snapshot at record {index}; "
+                        f"its coin inventory and stock cannot be replayed"
+                    )
+                machine.balance = amount
+            # Refused operations did not change any state
+    return machine
@@ -5,11 +5,23 @@ Gumball Vending Machine Simulator
 - Accepts nickels (5¢), dimes (10¢), and quarters (25¢)
 - Invalid coins are rejected immediately
 - Two dispensing levers (Red / Yellow)
-- One gumball dispensed per lever pull
+- One gumball dispensed per lever pull; purchase() settles a multi-gumball order at once
 - "Return My Change" lever returns remaining balance
-- Unlimited gumballs and change assumed
+- Unlimited gumballs, unless the machine is loaded with stock counts
+- Unlimited change, unless the machine is loaded with a coin inventory
+- Machine state snapshots as fixed-size bytes, and cheap forks for what-if runs
 """
 
+import argparse
+import json
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
 VALID_COINS = {
     "nickel": 5,
     "dime": 10,
@@ -21,189 +33,1297 @@ GUMBALL_PRICES = {
     "yellow": 10,
 }
 
+# Interned integer codes, built once from the tables above
+COIN_NAMES = tuple(VALID_COINS)
+COIN_VALUES = tuple(VALID_COINS.values())
+COLOR_NAMES = tuple(GUMBALL_PRICES)
+COLOR_PRICES = tuple(GUMBALL_PRICES.values())
+
+# Codes for anything outside the tables
+REJECTED_COIN = len(COIN_NAMES)
+UNKNOWN_COLOR = len(COLOR_NAMES)
+
+_COIN_CODES = {name: code for code, name in enumerate(COIN_NAMES)}
+_COLOR_CODES = {name: code for code, name in enumerate(COLOR_NAMES)}
+
+
+@lru_cache(maxsize=4096)
+def normalize_token(raw: str) -> str:
+    """
+    Strip and lowercase a raw coin or color string, memoized for repeated hardware input.
+    :param raw: string
+    :return: string
+    """
+    return raw.strip().lower()
+
+
+@lru_cache(maxsize=4096)
+def coin_code(raw: str) -> int:
+    """
+    Map a raw coin string to its code, or REJECTED_COIN if it is not accepted.
+    :param raw: string
+    :return: integer
+    """
+    return _COIN_CODES.get(normalize_token(raw), REJECTED_COIN)
+
+
+@lru_cache(maxsize=4096)
+def color_code(raw: str) -> int:
+    """
+    Map a raw gumball color to its code, or UNKNOWN_COLOR if there is no such lever.
+    :param raw: string
+    :return: integer
+    """
+    return _COLOR_CODES.get(normalize_token(raw), UNKNOWN_COLOR)
+
+
+# Event kinds understood by GumballMachine.apply_events()
+EVENT_COIN = 0
+EVENT_DISPENSE = 1
+EVENT_CHANGE = 2
+
+# Outcome codes reported by GumballMachine.apply_events()
+OUTCOME_ACCEPTED = 0
+OUTCOME_REJECTED = 1
+OUTCOME_DISPENSED = 2
+OUTCOME_INSUFFICIENT = 3
+OUTCOME_UNKNOWN = 4
+OUTCOME_RETURNED = 5
+OUTCOME_NO_CHANGE = 6
+OUTCOME_SOLD_OUT = 7
+OUTCOME_ESCROWED = 8 # Only seen by observers: balance taken off the machine, see escrow_balance()
+OUTCOME_RESTORED = 9 # Only seen by observers: state replaced by restore(), amount is the new balance
+
+OUTCOME_NAMES = (
+    "accepted",
+    "rejected",
+    "dispensed",
+    "insufficient",
+    "unknown",
+    "returned",
+    "no_change",
+    "sold_out",
+    "escrowed",
+    "restored",
+)
+
+# Partial-fill policies for GumballMachine.purchase()
+ORDER_ALL_OR_NOTHING = 0 # Dispense the whole order or nothing
+ORDER_BEST_EFFORT = 1 # Dispense what stock, balance and change allow, in order
+
+
+def _plural(name: str) -> str:
+    """Breakdown key for a coin name: quarter -> quarters, penny -> pennies."""
+    if name.endswith("y") and name[-2:-1] not in "aeiou":
+        return name[:-1] + "ies"
+    return name + "s"
+
+
+@lru_cache(maxsize=4096)
+def _bounded_change(values: tuple, amount: int, available: tuple) -> tuple:
+    """
+    Fewest-coin counts paying the largest amount <= amount from a limited supply of coins.
+    Bounded DP: each coin count is split into 1, 2, 4, ... bundles and solved as 0/1
+    knapsack, so the cost grows with log(count), not count. Cached on the capped supply.
+    """
+    items = [] # (coin index, coins in bundle, bundle value)
+    for index, (value, count) in enumerate(zip(values, available)):
+        bundle = 1
+        while count > 0:
+            size = min(bundle, count)
+            items.append((index, size, size * value))
+            count -= size
+            bundle *= 2
+    unreachable = amount + 1 + sum(available) # More coins than any payout can use
+    fewest = [0] + [unreachable] * amount
+    taken = [] # Per item: amounts where adding the item improved the payout
+    for _, size, total in items:
+        mark = bytearray(amount + 1)
+        for target in range(amount, total - 1, -1):
+            coins = fewest[target - total] + size
+            if coins < fewest[target]:
+                fewest[target] = coins
+                mark[target] = 1
+        taken.append(mark)
+    target = amount
+    while fewest[target] == unreachable: # Amount 0 is always reachable
+        target -= 1
+    counts = [0] * len(values)
+    for (index, size, total), mark in zip(reversed(items), reversed(taken)):
+        if mark[target]:
+            counts[index] += size
+            target -= total
+    return tuple(counts)
+
+
+@lru_cache(maxsize=256)
+def _unbounded_change(values: tuple, amount: int) -> tuple:
+    """
+    Fewest-coin counts for an amount from an unlimited supply (None if unreachable).
+    Keeps only two int arrays and walks back the one path it needs. Ties go to the
+    larger coins, as in ChangeMaker's table.
+    """
+    unreachable = amount + 1 # More coins than any real breakdown needs
+    fewest = array("q", [0]) * (amount + 1)
+    last = array("b", [-1]) * (amount + 1) # Index of the coin added last for each amount
+    for target in range(1, amount + 1):
+        best, coin = unreachable, -1
+        for index, value in enumerate(values):
+            if value <= target and fewest[target - value] + 1 < best:
+                best, coin = fewest[target - value] + 1, index
+        fewest[target], last[target] = best, coin
+    if amount and last[amount] < 0:
+        return None
+    counts = [0] * len(values)
+    while amount:
+        index = last[amount]
+        counts[index] += 1
+        amount -= values[index]
+    return tuple(counts)
 
-class GumballMachine:
-    
-    def __init__(self):
-        """Initialize the gumball machine with balance = 0"""
+
+class ChangeMaker:
+    """
+    Fewest-coin change for any coin system, driven by a {name: value} table like VALID_COINS.
+    Breakdowns up to max_amount are precomputed, so lookups are O(1). Larger amounts are
+    brought into the table by paying multiples of the largest coin first, which is optimal
+    above (largest - 1) x second largest cents; tables too small for that fall back to
+    dynamic programming. Both stay correct for coin systems where greedy fails.
+    Ties go to the larger coins, so canonical systems get the familiar greedy breakdown.
+    """
+    __slots__ = ("names", "keys", "values", "max_amount", "_table", "_breakdowns", "_reducible")
+
+    def __init__(self, coins: dict = VALID_COINS, max_amount: int = 1000):
+        """
+        Precompute the breakdown table.
+        :param coins: dictionary of coin name -> value in cents
+        :param max_amount: integer, largest amount kept in the table
+        """
+        ordered = sorted(coins.items(), key=lambda item: -item[1]) # Largest coin first
+        self.names = tuple(name for name, _ in ordered)
+        self.keys = tuple(_plural(name) for name, _ in ordered)
+        self.values = tuple(value for _, value in ordered)
+        self.max_amount = max_amount
+        self._table = self._solve(max_amount)
+        # Breakdown dicts, copied on lookup so callers may keep and modify them
+        self._breakdowns = [None if counts is None else dict(zip(self.keys, counts)) for counts in self._table]
+        # Past (largest - 1) x second largest, some fewest-coin breakdown uses the largest
+        # coin (any largest-coin's worth of smaller coins can be swapped for fewer large ones)
+        largest = self.values[0]
+        bound = (largest - 1) * self.values[1] if len(self.values) > 1 else 0
+        self._reducible = max_amount - largest >= bound
+
+    def _solve(self, limit: int) -> list:
+        """Fewest-coin counts tuple for every amount 0..limit (None where unreachable)."""
+        values = self.values
+        unreachable = limit + 1 # More coins than any real breakdown needs
+        fewest = [0] + [unreachable] * limit
+        last = [-1] * (limit + 1) # Index of the coin added last for each amount
+        for amount in range(1, limit + 1):
+            for index, value in enumerate(values):
+                if value <= amount and fewest[amount - value] + 1 < fewest[amount]:
+                    fewest[amount] = fewest[amount - value] + 1
+                    last[amount] = index
+        table = [None] * (limit + 1)
+        table[0] = (0,) * len(values)
+        for amount in range(1, limit + 1):
+            index = last[amount]
+            if index >= 0:
+                counts = list(table[amount - values[index]])
+                counts[index] += 1
+                table[amount] = tuple(counts)
+        return table
+
+    def counts(self, amount: int) -> tuple:
+        """
+        Coin counts for an amount, in the order of self.keys (largest coin first).
+        :param amount: integer, cents
+        :return: tuple of integers
+        """
+        if 0 <= amount <= self.max_amount:
+            counts = self._table[amount]
+        elif amount < 0:
+            counts = None
+        elif self._reducible: # Pay largest coins until the rest is in the table: O(1)
+            extra = -(-(amount - self.max_amount) // self.values[0])
+            counts = self._table[amount - extra * self.values[0]]
+            if counts is not None:
+                counts = (counts[0] + extra,) + counts[1:]
+        else:
+            counts = _unbounded_change(self.values, amount)
+        if counts is None:
+            raise ValueError(f"Cannot make change for {amount}¢ with coins {self.values}")
+        return counts
+
+    def counts_from(self, amount: int, available) -> tuple:
+        """
+        Coin counts paying as much of an amount as a limited supply allows (all of it when
+        feasible). Uses the table when its answer fits the supply, else the bounded DP.
+        :param amount: integer, cents
+        :param available: coins on hand, in the order of self.names
+        :return: tuple of integers
+        """
+        if 0 <= amount <= self.max_amount:
+            counts = self._table[amount]
+            if counts is not None and all(map(int.__le__, counts, available)):
+                return counts
+        # Coins beyond amount // value can never be used, so cap them for better cache hits
+        capped = tuple(min(count, amount // value) for value, count in zip(self.values, available))
+        return _bounded_change(self.values, amount, capped)
+
+    def breakdown(self, amount: int) -> dict:
+        """
+        Breakdown dictionary for an amount, e.g. {"quarters": 1, "dimes": 1, "nickels": 1}
+        :param amount: integer, cents
+        :return: dictionary
+        """
+        if 0 <= amount <= self.max_amount:
+            breakdown = self._breakdowns[amount]
+            if breakdown is not None:
+                return breakdown.copy()
+        return dict(zip(self.keys, self.counts(amount)))
+
+
+CHANGE_MAKER = ChangeMaker(VALID_COINS)
+
+
+def _time_of_day(text: str) -> int:
+    """Seconds since midnight for "HH:MM"."""
+    hours, minutes = text.split(":")
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    if not 0 <= seconds <= 86400:
+        raise ValueError(f"Not a time of day: {text}")
+    return seconds
+
+
+class PriceTable:
+    """
+    Hot-swappable gumball prices for one machine, a region or a whole fleet.
+    Base prices and time-of-day promotions compile into a snapshot: a tuple of prices by
+    color code that stays valid until the next promotion starts or ends. Resolving a price
+    is one clock read and a tuple index; rules are only re-evaluated when the snapshot
+    expires or an update bumps the version.
+    """
+
+    def __init__(self, prices: dict = None, clock=time.time, utc_offset: int = None):
+        """
+        Build a price table.
+        :param prices: dictionary of color -> cents; colors left out keep GUMBALL_PRICES
+        :param clock: callable returning epoch seconds
+        :param utc_offset: integer seconds east of UTC for promotion times; None for local time
+        """
+        self._clock = clock
+        self._utc_offset = utc_offset
+        self._lock = threading.Lock() # Serializes writers; readers never wait
+        self._base = list(COLOR_PRICES)
+        self._promotions = [] # (color code, cents, start second of day, end second of day)
+        self.version = 0
+        self._compiled = COLOR_PRICES
+        self._valid_until = float("-inf")
+        if prices:
+            self.update(prices)
+
+    @staticmethod
+    def _code(color: str) -> int:
+        code = color_code(color)
+        if code == UNKNOWN_COLOR:
+            raise ValueError(f"Unknown gumball type: {color}")
+        return code
+
+    @staticmethod
+    def _cents(color: str, cents: int) -> int:
+        """A price must be payable in coins, or balances left after a sale could not be returned."""
+        if cents < 0:
+            raise ValueError(f"Negative price for {color}")
+        try:
+            CHANGE_MAKER.counts(cents)
+        except ValueError:
+            raise ValueError(f"Price for {color} is not payable in coins: {cents}¢") from None
+        return cents
+
+    def update(self, prices: dict):
+        """
+        Change base prices; every machine using this table sees them on its next pull.
+        :param prices: dictionary of color -> cents
+        """
+        with self._lock:
+            checked = [(self._code(color), self._cents(color, cents)) for color, cents in prices.items()]
+            for code, cents in checked: # All or nothing
+                self._base[code] = cents
+            self._invalidate()
+
+    def add_promotion(self, color: str, cents: int, start: str, end: str):
+        """
+        Sell a color at a promotional price between two times of day ("HH:MM", local to
+        utc_offset). Windows may wrap past midnight; the cheapest active price wins.
+        :param color: string
+        :param cents: integer
+        :param start: string "HH:MM"
+        :param end: string "HH:MM"
+        """
+        with self._lock:
+            self._promotions.append((self._code(color), self._cents(color, cents),
+                                     _time_of_day(start), _time_of_day(end)))
+            self._invalidate()
+
+    def clear_promotions(self):
+        """Remove every promotion."""
+        with self._lock:
+            self._promotions.clear()
+            self._invalidate()
+
+    def _invalidate(self):
+        """Drop the compiled snapshot and bump the version."""
+        self.version += 1
+        self._valid_until = float("-inf")
+
+    def _compile(self, now: float):
+        """Evaluate promotions at now and cache the result until the next boundary."""
+        with self._lock:
+            offset = self._utc_offset
+            if offset is None:
+                offset = time.localtime(now).tm_gmtoff
+            day_time = (now + offset) % 86400
+            second = int(day_time)
+            prices = list(self._base)
+            next_boundary = 86400 # Midnight
+            for code, cents, start, end in self._promotions:
+                if start <= end:
+                    active = start <= second < end
+                else: # Wraps past midnight
+                    active = second >= start or second < end
+                if active and cents < prices[code]:
+                    prices[code] = cents
+                for boundary in (start, end):
+                    if second < boundary < next_boundary:
+                        next_boundary = boundary
+            self._compiled = tuple(prices)
+            self._valid_until = now + (next_boundary - day_time)
+
+    def current(self) -> tuple:
+        """
+        Effective prices by color code, right now.
+        :return: tuple of integers, indexed like COLOR_NAMES
+        """
+        now = self._clock()
+        if now >= self._valid_until:
+            self._compile(now)
+        return self._compiled
+
+    def price(self, color: str) -> int:
+        """
+        Effective price of one color, right now.
+        :param color: string
+        :return: integer, cents
+        """
+        return self.current()[self._code(color)]
+
+
+class _ResultView:
+    """
+    Dict-style access for the compact result tuples: result["balance"], "reason" in result.
+    Fields left as None are absent, matching the keys of the original result dictionaries.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            value = getattr(self, key) if key in self._fields else None
+            if value is None:
+                raise KeyError(key)
+            return value
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self._fields else None
+        return default if value is None else value
+
+    def keys(self) -> list:
+        return [name for name, value in zip(self._fields, self) if value is not None]
+
+    def to_dict(self) -> dict:
+        """Return the result as the plain dictionary the machine used to build."""
+        return {name: value for name, value in zip(self._fields, self) if value is not None}
+
+
+# Builds a result without the keyword handling of the namedtuple-generated __new__:
+# _result(InsertResult, (accepted, coin, value, balance)) costs about as much as a dict literal
+_result = tuple.__new__
+
+
+class InsertResult(_ResultView, namedtuple("InsertResult", "accepted coin value balance")):
+    """Result of insert_coin(): accepted, coin, value (accepted coins only), balance"""
+    __slots__ = ()
+
+
+class DispenseResult(_ResultView, namedtuple("DispenseResult", "dispensed color price reason balance")):
+    """Result of dispense(): dispensed, color + price on success or reason on failure, balance"""
+    __slots__ = ()
+
+
+class ChangeResult(_ResultView, namedtuple("ChangeResult", "returned breakdown balance")):
+    """Result of return_change(): returned, breakdown, balance"""
+    __slots__ = ()
+
+    def to_dict(self) -> dict:
+        return {"returned": self.returned, "breakdown": dict(self.breakdown), "balance": self.balance}
+
+
+class PurchaseResult(_ResultView, namedtuple("PurchaseResult", "filled total unfilled reason balance")):
+    """Result of purchase(): filled ({color: count}), total, unfilled + reason when short, balance"""
+    __slots__ = ()
+
+    def to_dict(self) -> dict:
+        result = {"filled": dict(self.filled), "total": self.total}
+        if self.unfilled is not None:
+            result["unfilled"] = dict(self.unfilled)
+            result["reason"] = self.reason
+        result["balance"] = self.balance
+        return result
+
+
+# Machine state as fixed-size bytes: version, flags, balance, coins on hand, stock
+SNAPSHOT_VERSION = 1
+_SNAPSHOT = struct.Struct(f"<BBq{len(COIN_NAMES)}q{len(COLOR_NAMES)}q")
+SNAPSHOT_SIZE = _SNAPSHOT.size
+_HAS_COINS = 1 # Flag: coin inventory tracked (else unlimited change)
+_HAS_STOCK = 2 # Flag: stock tracked (else unlimited gumballs)
+_NO_COINS = (0,) * len(COIN_NAMES)
+_NO_STOCK = (0,) * len(COLOR_NAMES)
+
+
+@lru_cache(maxsize=None)
+def _inventory_codes(change_maker: ChangeMaker) -> tuple:
+    """Coin codes (COIN_NAMES indexes) of a change maker's coins, in its order."""
+    missing = [name for name in change_maker.names if name not in _COIN_CODES]
+    if missing:
+        raise ValueError(f"A coin inventory only holds {', '.join(COIN_NAMES)}; "
+                         f"the change maker pays out {', '.join(missing)}")
+    return tuple(_COIN_CODES[name] for name in change_maker.names)
+
+
+class _MachineCore:
+    """Machine logic shared by GumballMachine and CompactGumballMachine."""
+    __slots__ = ("balance", "coins", "stock", "stock_watchers", "observers", "prices")
+
+    change_maker = CHANGE_MAKER # Override in a subclass to pay out a regional coin set
+
+    def __init__(self, coin_inventory: dict = None, stock: dict = None, prices=None):
+        """
+        Initialize the gumball machine with balance = 0
+        :param coin_inventory: dictionary of coin name -> count on hand; None for unlimited change
+        :param stock: dictionary of color -> gumballs loaded; None for unlimited gumballs
+        :param prices: PriceTable (may be shared by many machines) or dictionary of color -> cents;
+            None for GUMBALL_PRICES
+        """
         self.balance = 0  # cents
+        self.prices = PriceTable(prices) if isinstance(prices, dict) else prices
+        self.coins = None # Coins on hand by coin code, or None for unlimited change
+        self.stock = None # Gumballs left by color code, or None for unlimited gumballs
+        self.stock_watchers = None # (threshold, callback) pairs, see watch_stock()
+        self.observers = None # Callables notified of every operation, see add_observer()
+        if coin_inventory is not None:
+            self.load_coins(coin_inventory)
+        if stock is not None:
+            self.stock = [0] * len(COLOR_NAMES)
+            for color, count in stock.items():
+                self.restock(color, count)
+
+    def restock(self, color: str, count: int):
+        """
+        Load gumballs of one color. Starts tracking stock if it was unlimited.
+        :param color: string
+        :param count: integer, gumballs added
+        """
+        code = color_code(color)
+        if code == UNKNOWN_COLOR or count < 0:
+            raise ValueError(f"Cannot restock {count} x {color}")
+        if self.stock is None:
+            self.stock = [0] * len(COLOR_NAMES)
+        self.stock[code] += count
 
-    def insert_coin(self, coin: str) -> dict:
+    def stock_level(self, code: int) -> int:
+        """
+        Gumballs left for a color code; -1 when stock is unlimited. O(1), allocates nothing.
+        :param code: integer index into COLOR_NAMES
+        :return: integer
+        """
+        stock = self.stock
+        return -1 if stock is None else stock[code]
+
+    def watch_stock(self, callback, threshold: int):
+        """
+        Call callback(machine, color, remaining) when a color's stock drops to threshold.
+        :param callback: callable
+        :param threshold: integer
+        """
+        if self.stock_watchers is None:
+            self.stock_watchers = []
+        self.stock_watchers.append((threshold, callback))
+
+    def _take_gumball(self, code: int):
+        """Remove one gumball from stock and notify watchers whose threshold was reached."""
+        remaining = self.stock[code] - 1
+        self.stock[code] = remaining
+        if self.stock_watchers is not None:
+            for threshold, callback in self.stock_watchers:
+                if remaining == threshold:
+                    callback(self, COLOR_NAMES[code], remaining)
+
+    def load_coins(self, counts: dict):
+        """
+        Add coins to the change inventory (service visit). Starts tracking if it was unlimited.
+        :param counts: dictionary of coin name -> count
+        """
+        if self.coins is None:
+            _inventory_codes(self.change_maker) # Fail here, not on the first payout
+            self.coins = [0] * len(COIN_NAMES)
+        for coin, count in counts.items():
+            code = coin_code(coin)
+            if code == REJECTED_COIN or count < 0:
+                raise ValueError(f"Cannot load {count} x {coin}")
+            self.coins[code] += count
+
+    def coin_inventory(self) -> dict:
+        """
+        Coins on hand, or None when change is unlimited.
+        :return: dictionary
+        """
+        if self.coins is None:
+            return None
+        return dict(zip(COIN_NAMES, self.coins))
+
+    def _payout(self, amount: int) -> tuple:
+        """Coin counts (change_maker order) paying as much of amount as the inventory allows."""
+        coins = self.coins
+        available = [coins[code] for code in _inventory_codes(self.change_maker)]
+        return self.change_maker.counts_from(amount, available)
+
+    def can_make_change(self, amount: int) -> bool:
+        """
+        Check whether the coins on hand can pay out exactly this amount.
+        :param amount: integer, cents
+        :return: boolean
+        """
+        if self.coins is None:
+            return True
+        counts = self._payout(amount)
+        return sum(map(int.__mul__, counts, self.change_maker.values)) == amount
+
+    def snapshot(self) -> bytes:
+        """
+        Balance, coin inventory and stock as SNAPSHOT_SIZE bytes, for restore() here or
+        in another process. Prices, observers and stock watchers are not part of it.
+        :return: bytes
+        """
+        coins, stock = self.coins, self.stock
+        flags = (coins is not None and _HAS_COINS) | (stock is not None and _HAS_STOCK)
+        return _SNAPSHOT.pack(SNAPSHOT_VERSION, flags, self.balance,
+                              *(_NO_COINS if coins is None else coins),
+                              *(_NO_STOCK if stock is None else stock))
+
+    def restore(self, data, offset: int = 0):
+        """
+        Return to a snapshot() state. Observers see OUTCOME_RESTORED with the restored
+        balance, so an attached journal starts over from it.
+        :param data: bytes-like object holding a snapshot (e.g. many packed back to back)
+        :param offset: integer, where the snapshot starts in data
+        """
+        if len(data) - offset < SNAPSHOT_SIZE:
+            raise ValueError("Truncated machine snapshot")
+        values = _SNAPSHOT.unpack_from(data, offset)
+        if values[0] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported machine snapshot version: {values[0]}")
+        flags = values[1]
+        if flags & _HAS_COINS:
+            _inventory_codes(self.change_maker)
+        stock_start = 3 + len(COIN_NAMES)
+        self.balance = values[2]
+        self.coins = list(values[3:stock_start]) if flags & _HAS_COINS else None
+        self.stock = list(values[stock_start:]) if flags & _HAS_STOCK else None
+        if self.observers is not None:
+            self._emit(OUTCOME_RESTORED, -1, self.balance)
+
+    def fork(self):
+        """
+        Independent branch of this machine for what-if runs. The branch shares the
+        price table and change maker (replace, don't mutate, to diverge) but gets its
+        own balance, coins and stock, and no observers or stock watchers: a journal
+        attached here does not follow the branch.
+        :return: machine of the same class
+        """
+        cls = type(self)
+        branch = cls.__new__(cls)
+        state = getattr(self, "__dict__", None)
+        if state: # Subclass attributes, e.g. an instrumented machine's metrics
+            branch.__dict__.update(state)
+        branch.balance = self.balance
+        branch.prices = self.prices
+        branch.coins = None if self.coins is None else self.coins[:]
+        branch.stock = None if self.stock is None else self.stock[:]
+        branch.stock_watchers = None
+        branch.observers = None
+        return branch
+
+    def add_observer(self, observer):
+        """
+        Call observer(machine, outcome, code, amount) after every operation, once the
+        balance is updated. outcome is an OUTCOME_* code, code the coin or color code,
+        amount the cents moved (coin value, price paid, change returned or balance escrowed;
+        0 if refused), or the new balance after restore().
+        :param observer: callable
+        """
+        if self.observers is None:
+            self.observers = []
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        """
+        Stop calling an observer added with add_observer().
+        :param observer: callable
+        """
+        self.observers.remove(observer)
+        if not self.observers:
+            self.observers = None
+
+    def _emit(self, outcome: int, code: int, amount: int):
+        """Report one operation to every observer."""
+        for observer in self.observers:
+            observer(self, outcome, code, amount)
+
+    def insert_coin(self, coin: str) -> InsertResult:
         """
         Insert a coin. Returns result with accepted/rejected status.
         :param coin: string
-        :return: dictionary
+        :return: InsertResult
         """
-        coin = coin.strip().lower() # Remove leading and trailing whitespaces, make lowercase
-        if coin in VALID_COINS: # Check to see if valid coin type
-            self.balance += VALID_COINS[coin]
-            return {
-                "accepted": True,
-                "coin": coin,
-                "value": VALID_COINS[coin],
-                "balance": self.balance,
-            }
-        return {
-            "accepted": False,
-            "coin": coin,
-            "balance": self.balance,
-        }
+        code = coin_code(coin) # Memoized strip + lowercase + table lookup
+        if code != REJECTED_COIN: # Check to see if valid coin type
+            return self.insert_coin_code(code)
+        if self.observers is not None:
+            self._emit(OUTCOME_REJECTED, code, 0)
+        return _result(InsertResult, (False, normalize_token(coin), None, self.balance))
+
+    def insert_coin_code(self, code: int) -> InsertResult:
+        """
+        Insert a coin by its interned code (see coin_code). Skips all string work.
+        :param code: integer index into COIN_NAMES
+        :return: InsertResult
+        """
+        if 0 <= code < REJECTED_COIN:
+            value = COIN_VALUES[code]
+            self.balance += value
+            if self.coins is not None: # Accepted coin drops into the change inventory
+                self.coins[code] += 1
+            if self.observers is not None:
+                self._emit(OUTCOME_ACCEPTED, code, value)
+            return _result(InsertResult, (True, COIN_NAMES[code], value, self.balance))
+        if self.observers is not None:
+            self._emit(OUTCOME_REJECTED, REJECTED_COIN, 0)
+        return _result(InsertResult, (False, None, None, self.balance))
 
-    def dispense(self, color: str) -> dict:
+    def dispense(self, color: str) -> DispenseResult:
         """
         Pull a dispenser lever. Returns result with success/failure.
         :param color: string
-        :return: dictionary
+        :return: DispenseResult
         """
-        color = color.strip().lower() # Remove leading and trailing whitespaces, make lowercase
-        if color not in GUMBALL_PRICES: # Check if valid gumball type
-            return {
-                "dispensed": False,
-                "reason": f"Unknown gumball type: {color}",
-                "balance": self.balance,
-            }
-        price = GUMBALL_PRICES[color]
-        if self.balance < price: # Check if user has sufficient balance
-            return {
-                "dispensed": False,
-                "reason": f"Insufficient balance. Need {price}¢, have {self.balance}¢.",
-                "balance": self.balance,
-            }
-        self.balance -= price
-        return {
-            "dispensed": True,
-            "color": color,
-            "price": price,
-            "balance": self.balance,
-        }
+        code = color_code(color) # Memoized strip + lowercase + table lookup
+        if code == UNKNOWN_COLOR: # Check if valid gumball type
+            if self.observers is not None:
+                self._emit(OUTCOME_UNKNOWN, code, 0)
+            reason = f"Unknown gumball type: {normalize_token(color)}"
+            return _result(DispenseResult, (False, None, None, reason, self.balance))
+        return self.dispense_code(code)
 
-    def return_change(self) -> dict:
+    def dispense_code(self, code: int) -> DispenseResult:
+        """
+        Pull a dispenser lever by its interned code (see color_code). Skips all string work.
+        :param code: integer index into COLOR_NAMES
+        :return: DispenseResult
+        """
+        if not 0 <= code < UNKNOWN_COLOR: # Check if valid gumball type
+            outcome, reason = OUTCOME_UNKNOWN, f"Unknown gumball type: {code}"
+            code = UNKNOWN_COLOR
+        elif self.stock is not None and self.stock[code] <= 0: # Check stock before the balance
+            outcome, reason = OUTCOME_SOLD_OUT, f"Sold out: {COLOR_NAMES[code]}"
+        else:
+            price = (COLOR_PRICES if self.prices is None else self.prices.current())[code]
+            if self.balance < price: # Check if user has sufficient balance
+                outcome = OUTCOME_INSUFFICIENT
+                reason = f"Insufficient balance. Need {price}¢, have {self.balance}¢."
+            elif self.coins is not None and not self.can_make_change(self.balance - price):
+                outcome = OUTCOME_NO_CHANGE
+                reason = f"Cannot make change for {self.balance - price}¢. Exact change only."
+            else:
+                self.balance -= price
+                if self.stock is not None:
+                    self._take_gumball(code)
+                if self.observers is not None:
+                    self._emit(OUTCOME_DISPENSED, code, price)
+                return _result(DispenseResult, (True, COLOR_NAMES[code], price, None, self.balance))
+        if self.observers is not None:
+            self._emit(outcome, code, 0)
+        return _result(DispenseResult, (False, None, None, reason, self.balance))
+
+    def purchase(self, order: dict, policy: int = ORDER_ALL_OR_NOTHING) -> PurchaseResult:
+        """
+        Buy several gumballs at once, e.g. {"red": 3, "yellow": 2}. The order is validated
+        and priced once and settled in one pass. With ORDER_ALL_OR_NOTHING either the whole
+        order is dispensed or nothing is; with ORDER_BEST_EFFORT each color is filled in
+        order as far as stock, balance and change allow.
+        Observers see one dispense per gumball, with the balance left after it, and one
+        failure per short color.
+        :param order: dictionary of color -> count
+        :param policy: ORDER_ALL_OR_NOTHING or ORDER_BEST_EFFORT
+        :return: PurchaseResult
+        """
+        if policy != ORDER_ALL_OR_NOTHING and policy != ORDER_BEST_EFFORT:
+            raise ValueError(f"Unknown order policy: {policy}")
+        items = [] # (code, name, count) in order
+        for color, count in order.items():
+            if count.__class__ is not int or count < 0:
+                raise ValueError(f"Invalid count for {color}: {count}")
+            code = color_code(color)
+            if count:
+                items.append((code, normalize_token(color) if code == UNKNOWN_COLOR else COLOR_NAMES[code], count))
+        prices = COLOR_PRICES if self.prices is None else self.prices.current() # Once per order
+        stock = self.stock
+        balance = self.balance
+        filled = [0] * len(COLOR_NAMES)
+        shortfalls = [] # (code, name, missing, outcome)
+        reason = None # Why the first shortfall happened
+
+        if policy == ORDER_ALL_OR_NOTHING:
+            for code, name, count in items:
+                if code == UNKNOWN_COLOR:
+                    if reason is None:
+                        outcome, reason = OUTCOME_UNKNOWN, f"Unknown gumball type: {name}"
+                else:
+                    filled[code] += count
+            if reason is None and stock is not None:
+                for code, count in enumerate(filled):
+                    if count > stock[code]:
+                        outcome, reason = OUTCOME_SOLD_OUT, f"Sold out: {COLOR_NAMES[code]} ({stock[code]} left)"
+                        break
+            if reason is None:
+                total = sum(map(int.__mul__, filled, prices))
+                if balance < total: # One balance check for the whole order
+                    outcome, reason = OUTCOME_INSUFFICIENT, f"Insufficient balance. Need {total}¢, have {balance}¢."
+                elif self.coins is not None and not self.can_make_change(balance - total):
+                    outcome = OUTCOME_NO_CHANGE
+                    reason = f"Cannot make change for {balance - total}¢. Exact change only."
+            if reason is not None: # Refuse the whole order
+                filled = [0] * len(COLOR_NAMES)
+                shortfalls = [(code, name, count, OUTCOME_UNKNOWN if code == UNKNOWN_COLOR else outcome)
+                              for code, name, count in items]
+        else:
+            remaining = balance
+            for code, name, count in items:
+                if code == UNKNOWN_COLOR:
+                    outcome, take = OUTCOME_UNKNOWN, 0
+                    message = f"Unknown gumball type: {name}"
+                else:
+                    price = prices[code]
+                    take = count
+                    if stock is not None and take > stock[code] - filled[code]:
+                        take = stock[code] - filled[code]
+                        outcome, message = OUTCOME_SOLD_OUT, f"Sold out: {name}"
+                    if price and take > remaining // price:
+                        take = remaining // price
+                        outcome = OUTCOME_INSUFFICIENT
+                        message = f"Insufficient balance. Need {price * count}¢, have {remaining}¢."
+                    if self.coins is not None:
+                        while take and not self.can_make_change(remaining - take * price):
+                            take -= 1
+                            outcome = OUTCOME_NO_CHANGE
+                            message = f"Cannot make change for {remaining - take * price}¢. Exact change only."
+                    filled[code] += take
+                    remaining -= take * price
+                if take < count:
+                    shortfalls.append((code, name, count - take, outcome))
+                    if reason is None:
+                        reason = message
+
+        # Single settlement for everything dispensed
+        total = sum(map(int.__mul__, filled, prices))
+        if stock is None and self.observers is None:
+            self.balance = balance - total
+        else: # Watchers and observers (e.g. a journal) see the balance after each gumball
+            for code, count in enumerate(filled):
+                price = prices[code]
+                for _ in range(count):
+                    balance -= price
+                    self.balance = balance
+                    if stock is not None:
+                        self._take_gumball(code)
+                    if self.observers is not None:
+                        self._emit(OUTCOME_DISPENSED, code, price)
+        if self.observers is not None:
+            for code, _, _, outcome in shortfalls:
+                self._emit(outcome, code, 0)
+        unfilled = None
+        if shortfalls:
+            unfilled = {}
+            for _, name, missing, _ in shortfalls:
+                unfilled[name] = unfilled.get(name, 0) + missing
+        return _result(PurchaseResult, (
+            {COLOR_NAMES[code]: count for code, count in enumerate(filled) if count},
+            total, unfilled, reason, self.balance,
+        ))
+
+    def return_change(self) -> ChangeResult:
         """
         Pull the 'Return My Change' lever.
-        :return: dictionary
+        :return: ChangeResult
+        """
+        if self.coins is not None:
+            result = self._return_from_inventory()
+        else:
+            change = self.balance
+            breakdown = self.change_maker.breakdown(change) # Table lookup, raises if unpayable
+            self.balance = 0
+            result = _result(ChangeResult, (change, breakdown, self.balance))
+        if self.observers is not None:
+            self._emit(OUTCOME_RETURNED, -1, result.returned)
+        return result
+
+    def escrow_balance(self) -> int:
+        """
+        Take the whole balance off the machine without paying out any coins, e.g. when an
+        abandoned session's credit is moved into escrow. Observers see OUTCOME_ESCROWED.
+        :return: integer, cents taken
         """
-        change = self.balance
+        amount = self.balance
         self.balance = 0
-        quarters, remainder = divmod(change, 25)
-        dimes, remainder = divmod(remainder, 10)
-        nickels = remainder // 5
-        return {
-            "returned": change,
-            "breakdown": {
-                "quarters": quarters,
-                "dimes": dimes,
-                "nickels": nickels,
-            },
-            "balance": self.balance,
+        if self.observers is not None:
+            self._emit(OUTCOME_ESCROWED, -1, amount)
+        return amount
+
+    def _return_from_inventory(self) -> ChangeResult:
+        """Pay the balance from the coins on hand; anything unpayable stays credited."""
+        maker = self.change_maker
+        counts = self._payout(self.balance)
+        coins = self.coins
+        paid = 0
+        for code, value, count in zip(_inventory_codes(maker), maker.values, counts):
+            coins[code] -= count
+            paid += value * count
+        self.balance -= paid
+        return _result(ChangeResult, (paid, dict(zip(maker.keys, counts)), self.balance))
+
+    def apply_events(self, events, collect: bool = False) -> dict:
+        """
+        Replay a stream of pre-parsed events without building a result per event.
+        Each event is a (kind, name) pair: (EVENT_COIN, "dime"), (EVENT_DISPENSE, "red")
+        or (EVENT_CHANGE, None). Names must already be stripped and lowercase.
+        Prices are resolved once, when the batch starts.
+        :param events: iterable of (kind, name) tuples
+        :param collect: when True, also return packed per-event outcomes and balances
+        :return: dictionary
+        """
+        coin_codes = _COIN_CODES
+        color_codes = _COLOR_CODES
+        prices = COLOR_PRICES if self.prices is None else self.prices.current() # Once per batch
+        inventory = self.coins is not None
+        stocked = self.stock is not None
+        observed = self.observers is not None
+        counts = [0] * len(OUTCOME_NAMES)
+        outcomes = array("B") if collect else None
+        balances = array("q") if collect else None
+        balance = self.balance
+        returned = 0
+        try:
+            for kind, name in events:
+                amount = 0
+                if kind == EVENT_COIN:
+                    code = coin_codes.get(name, REJECTED_COIN)
+                    if code == REJECTED_COIN:
+                        outcome = OUTCOME_REJECTED
+                    else:
+                        amount = COIN_VALUES[code]
+                        balance += amount
+                        if inventory:
+                            self.coins[code] += 1
+                        outcome = OUTCOME_ACCEPTED
+                elif kind == EVENT_DISPENSE:
+                    code = color_codes.get(name, UNKNOWN_COLOR)
+                    if code == UNKNOWN_COLOR:
+                        outcome = OUTCOME_UNKNOWN
+                    elif stocked and self.stock[code] <= 0:
+                        outcome = OUTCOME_SOLD_OUT
+                    elif balance < prices[code]:
+                        outcome = OUTCOME_INSUFFICIENT
+                    elif inventory and not self.can_make_change(balance - prices[code]):
+                        outcome = OUTCOME_NO_CHANGE
+                    else:
+                        amount = prices[code]
+                        balance -= amount
+                        if stocked:
+                            self.balance = balance # Stock watchers may read the balance
+                            self._take_gumball(code)
+                        outcome = OUTCOME_DISPENSED
+                elif kind == EVENT_CHANGE:
+                    code = -1
+                    if inventory:
+                        self.balance = balance
+                        amount = self._return_from_inventory().returned
+                        balance = self.balance
+                    else:
+                        amount = balance
+                        balance = 0
+                    returned += amount
+                    outcome = OUTCOME_RETURNED
+                else:
+                    raise ValueError(f"Unknown event kind: {kind}")
+                counts[outcome] += 1
+                if observed:
+                    self.balance = balance
+                    self._emit(outcome, code, amount)
+                if collect:
+                    outcomes.append(outcome)
+                    balances.append(balance)
+        finally:
+            self.balance = balance # Keep events applied before a bad one
+        result = {
+            "balance": balance,
+            "returned": returned,
+            "counts": dict(zip(OUTCOME_NAMES, counts)),
         }
+        if collect:
+            result["outcomes"] = outcomes
+            result["balances"] = balances
+        return result
+
+
+def stock_snapshot(machines, out: array = None) -> array:
+    """
+    Stock of many machines in one flat array: len(COLOR_NAMES) slots per machine, in
+    COLOR_NAMES order, -1 where stock is unlimited. Pass the previous array back as out to
+    poll a fleet every second without allocating.
+    :param machines: sequence of machines
+    :param out: array("l") to fill, or None
+    :return: array("l")
+    """
+    width = len(COLOR_NAMES)
+    size = len(machines) * width
+    if out is None or len(out) != size:
+        out = array("l", bytes(size * array("l").itemsize))
+    position = 0
+    for machine in machines:
+        stock = machine.stock
+        for index in range(width):
+            out[position] = -1 if stock is None else stock[index]
+            position += 1
+    return out
+
+
+class GumballMachine(_MachineCore):
+    """Reference gumball machine. Instances keep a __dict__, so callers may attach attributes."""
+
+
+class ThreadSafeGumballMachine(GumballMachine):
+    """
+    GumballMachine that can be shared by a coin thread, a lever thread and readers.
+    Every read-modify-write of the balance runs under one short-held lock, so no cent is
+    lost or spent twice. Reading `balance` needs no lock: it is always a settled value.
+    Observers and stock watchers always run while the lock is held, one call at a time.
+    The lock is reentrant, so they may call back into the machine (restock from a
+    low-stock alert, snapshot from an observer).
+    """
+
+    def __init__(self, coin_inventory: dict = None, stock: dict = None, prices=None):
+        self._lock = threading.RLock()
+        super().__init__(coin_inventory, stock, prices)
+
+    def load_coins(self, counts: dict):
+        with self._lock:
+            super().load_coins(counts)
+
+    def snapshot(self) -> bytes:
+        with self._lock:
+            return super().snapshot()
+
+    def restore(self, data, offset: int = 0):
+        with self._lock:
+            super().restore(data, offset)
+
+    def fork(self):
+        with self._lock:
+            branch = super().fork()
+        branch._lock = threading.RLock()
+        return branch
+
+    def restock(self, color: str, count: int):
+        with self._lock:
+            super().restock(color, count)
+
+    # The string entry points are locked too: refused tokens notify observers without
+    # reaching the *_code methods, and observers must never run concurrently
+    def insert_coin(self, coin: str) -> InsertResult:
+        with self._lock:
+            return super().insert_coin(coin)
+
+    def insert_coin_code(self, code: int) -> InsertResult:
+        with self._lock:
+            return super().insert_coin_code(code)
+
+    def dispense(self, color: str) -> DispenseResult:
+        with self._lock:
+            return super().dispense(color)
+
+    def dispense_code(self, code: int) -> DispenseResult:
+        with self._lock:
+            return super().dispense_code(code)
+
+    def purchase(self, order: dict, policy: int = ORDER_ALL_OR_NOTHING) -> PurchaseResult:
+        with self._lock:
+            return super().purchase(order, policy)
+
+    def return_change(self) -> ChangeResult:
+        with self._lock:
+            return super().return_change()
+
+    def escrow_balance(self) -> int:
+        with self._lock:
+            return super().escrow_balance()
+
+    def apply_events(self, events, collect: bool = False) -> dict:
+        with self._lock:
+            return super().apply_events(events, collect)
+
+
+class CompactGumballMachine(_MachineCore):
+    """Slotted gumball machine with no per-instance __dict__, for holding millions in memory."""
+    __slots__ = ()
+
+
+# ── Command protocol ─────────────────────────────────────────────────
+# One command per line, shared by the socket server and scripted drivers.
+# Menu numbers work too: "1 dime", "2", "3", "4", "5".
+
+COMMANDS = {
+    "1": "coin", "coin": "coin", "insert": "coin",
+    "2": "red", "red": "red",
+    "3": "yellow", "yellow": "yellow",
+    "4": "change", "change": "change",
+    "5": "quit", "quit": "quit",
+}
+
+
+def run_command(machine, line: str) -> dict:
+    """
+    Apply one protocol line to a machine.
+    :param machine: GumballMachine (or any variant)
+    :param line: string such as "coin dime", "red", "change" or "quit"
+    :return: dictionary with "op" plus the result fields, or "op": "error"
+    """
+    words = line.split()
+    op = COMMANDS.get(words[0].lower()) if words else None
+    if op is None:
+        return {"op": "error", "error": f"Unknown command: {line.strip()}"}
+    if op == "coin":
+        if len(words) != 2:
+            return {"op": "error", "error": "Usage: coin <nickel|dime|quarter>"}
+        result = machine.insert_coin(words[1])
+    elif op == "red" or op == "yellow":
+        result = machine.dispense(op)
+    else: # "change" and "quit" both hand back the balance
+        result = machine.return_change()
+    response = result.to_dict()
+    response["op"] = op
+    return response
+
+
+SCRIPT_BUFFER = 4096 # JSON lines gathered per write in script mode
+
+
+def run_script(machine, lines, out, buffer_lines: int = SCRIPT_BUFFER) -> int:
+    """
+    Drive a machine from protocol lines, writing one JSON result per command.
+    Blank lines and "#" comments are skipped; "quit" returns the balance and stops,
+    like the menu's Quit.
+    :param machine: GumballMachine (or any variant)
+    :param lines: iterable of protocol lines (e.g. an open file)
+    :param out: text stream for the JSON lines
+    :param buffer_lines: integer, results gathered before each write
+    :return: integer, commands run
+    """
+    encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+    pending = []
+    count = 0
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped[0] == "#":
+            continue
+        response = run_command(machine, stripped)
+        pending.append(encode(response))
+        count += 1
+        if len(pending) >= buffer_lines:
+            pending.append("")
+            out.write("\n".join(pending))
+            pending.clear()
+        if response["op"] == "quit":
+            break
+    if pending:
+        pending.append("")
+        out.write("\n".join(pending))
+    return count
 
 
 # ── Terminal simulation ──────────────────────────────────────────────
 
+@lru_cache(maxsize=1024)
 def _format_cents(cents: int) -> str:
     """Format cents as a dollar string."""
     return f"${cents / 100:.2f}"
 
 
-def _print_banner():
-    """Print the banner for the machine"""
-    print("=" * 50)
-    print("       GUMBALL VENDING MACHINE")
-    print("=" * 50)
-    print("  Gumballs:  RED = 5¢  |  YELLOW = 10¢")
-    print("  Coins:     nickel (5¢)  dime (10¢)  quarter (25¢)")
-    print("=" * 50)
+# Static screens, rendered once and written with a single write() each
+_BANNER = (
+    "=" * 50 + "\n"
+    "       GUMBALL VENDING MACHINE\n"
+    + "=" * 50 + "\n"
+    "  Gumballs:  RED = 5¢  |  YELLOW = 10¢\n"
+    "  Coins:     nickel (5¢)  dime (10¢)  quarter (25¢)\n"
+    + "=" * 50 + "\n"
+)
 
+_MENU_OPTIONS = (
+    "  ─────────────────────────────────\n"
+    "  [1] Insert coin\n"
+    "  [2] Dispense RED gumball   (5¢)\n"
+    "  [3] Dispense YELLOW gumball (10¢)\n"
+    "  [4] Return My Change\n"
+    "  [5] Quit\n"
+    "\n"
+)
 
-def _print_menu(balance: int):
+_COIN_TYPES = (
+    "\n"
+    "  Acceptable denominations:\n"
+    "  + Nickel (5¢)\n"
+    "  + Dime (10¢)\n"
+    "  + Quarter (25¢)\n"
+    "\n"
+)
+
+
+@lru_cache(maxsize=1024)
+def _render_menu(balance: int) -> str:
     """
-    Print the menu for user to choose
+    Menu screen for a balance, followed by the choice prompt
     :param balance: integer
+    :return: string
     """
-    print()
-    print(f"  Balance: {_format_cents(balance)}")
-    print("  ─────────────────────────────────")
-    print("  [1] Insert coin")
-    print("  [2] Dispense RED gumball   (5¢)")
-    print("  [3] Dispense YELLOW gumball (10¢)")
-    print("  [4] Return My Change")
-    print("  [5] Quit")
-    print()
-
-def _print_coin_type():
-    """Print the coin options for user"""
-    print()
-    print("  Acceptable denominations:")
-    print("  + Nickel (5¢)")
-    print("  + Dime (10¢)")
-    print("  + Quarter (25¢)")
-    print()
-
-
-def main():
+    return f"\n  Balance: {_format_cents(balance)}\n{_MENU_OPTIONS}  Choose [1-5]: "
+
+
+@lru_cache(maxsize=1024)
+def _coin_list(counts: tuple, names: tuple) -> str:
+    """ "1 quarter(s), 1 dime(s)" for counts in the order of names, skipping zeros."""
+    return ", ".join(f"{count} {name}(s)" for count, name in zip(counts, names) if count)
+
+
+def _render_change(result, change_maker: ChangeMaker = CHANGE_MAKER) -> tuple:
+    """
+    Amount and coin list for a change result, shared by Return My Change and Quit
+    :param result: ChangeResult (or its dictionary)
+    :return: (amount string, coin list string)
+    """
+    breakdown = result["breakdown"]
+    counts = tuple(breakdown[key] for key in change_maker.keys)
+    return _format_cents(result["returned"]), _coin_list(counts, change_maker.names)
+
+
+def main(stdin=None, stdout=None):
+    """
+    Run the interactive menu on any pair of text streams (the terminal by default).
+    End of input quits, returning any balance.
+    :param stdin: text stream to read choices from
+    :param stdout: text stream to write screens to
+    """
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    write = stdout.write
     machine = GumballMachine() # Create a GumballMachine object
-    _print_banner()
+    write(_BANNER)
+
+    def ask(screen: str) -> str:
+        write(screen)
+        stdout.flush()
+        line = stdin.readline()
+        return line.strip() if line else None
 
     while True:
-        _print_menu(machine.balance)
-        choice = input("  Choose [1-5]: ").strip()
+        choice = ask(_render_menu(machine.balance))
 
         if choice == "1": # Insert coin
-            _print_coin_type()
-            coin_inserted = input("  >> Insert coin: ").strip().lower()
-            result = machine.insert_coin(coin_inserted)
+            coin_inserted = ask(_COIN_TYPES + "  >> Insert coin: ") or ""
+            result = machine.insert_coin(coin_inserted.lower())
             if result['accepted']:
-                print(f"  >> Inserted {result['coin']}. Balance: {_format_cents(result['balance'])}")
+                write(f"  >> Inserted {result['coin']}. Balance: {_format_cents(result['balance'])}\n")
             else:
-                print("  Invalid currency! Your coin is returned on the push of the dispenses lever.")
+                write("  Invalid currency! Your coin is returned on the push of the dispenses lever.\n")
 
         elif choice == "2": # Dispense RED gumball
             result = machine.dispense("red")
             if result["dispensed"]:
-                print(f"  >> *clunk* A RED gumball rolls out! Balance: {_format_cents(result['balance'])}")
+                write(f"  >> *clunk* A RED gumball rolls out! Balance: {_format_cents(result['balance'])}\n")
             else:
-                print(f"  >> {result['reason']}")
+                write(f"  >> {result['reason']}\n")
 
         elif choice == "3": # Dispense YELLOW gumball
             result = machine.dispense("yellow")
             if result["dispensed"]:
-                print(f"  >> *clunk* A YELLOW gumball rolls out! Balance: {_format_cents(result['balance'])}")
+                write(f"  >> *clunk* A YELLOW gumball rolls out! Balance: {_format_cents(result['balance'])}\n")
             else:
-                print(f"  >> {result['reason']}")
+                write(f"  >> {result['reason']}\n")
 
         elif choice == "4": # Dispense change
             result = machine.return_change()
             if result["returned"] == 0:
-                print("  >> No change to return.")
+                write("  >> No change to return.\n")
             else:
-                b = result["breakdown"]
-                parts = []
-                if b["quarters"]:
-                    parts.append(f"{b['quarters']} quarter(s)")
-                if b["dimes"]:
-                    parts.append(f"{b['dimes']} dime(s)")
-                if b["nickels"]:
-                    parts.append(f"{b['nickels']} nickel(s)")
-                print(f"  >> Returned {_format_cents(result['returned'])}: {', '.join(parts)}")
-
-        elif choice == "5": # Quit
+                amount, coins = _render_change(result, machine.change_maker)
+                write(f"  >> Returned {amount}: {coins}\n")
+
+        elif choice == "5" or choice is None: # Quit (or end of input)
             if machine.balance > 0:
-                result = machine.return_change()
-                b = result["breakdown"]
-                parts = []
-                if b["quarters"]:
-                    parts.append(f"{b['quarters']} quarter(s)")
-                if b["dimes"]:
-                    parts.append(f"{b['dimes']} dime(s)")
-                if b["nickels"]:
-                    parts.append(f"{b['nickels']} nickel(s)")
-                print(f"  >> Returning your change: {_format_cents(result['returned'])} ({', '.join(parts)})")
-            print("  >> Goodbye!")
+                amount, coins = _render_change(machine.return_change(), machine.change_maker)
+                write(f"  >> Returning your change: {amount} ({coins})\n")
+            write("  >> Goodbye!\n")
+            stdout.flush()
             break
-        
+
         else:
-            print("  >> Invalid choice. Please pick 1-5.")
+            write("  >> Invalid choice. Please pick 1-5.\n")
+
+
+def cli(argv=None):
+    """Interactive menu by default; --script runs a command file non-interactively."""
+    parser = argparse.ArgumentParser(description="Gumball vending machine simulator")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run protocol commands from FILE ('-' for stdin), one JSON result per line")
+    parser.add_argument("--output", metavar="FILE", help="write script results to FILE instead of stdout")
+    args = parser.parse_args(argv)
+    if args.script is None:
+        main()
+        return
+    machine = GumballMachine()
+    source = sys.stdin if args.script == "-" else open(args.script, encoding="utf-8")
+    out = sys.stdout if args.output is None else open(args.output, "w", encoding="utf-8")
+    try:
+        run_script(machine, source, out)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,271 @@
+"""
+Gumball Machine Metrics
+
+- Opt-in: plain machines pay nothing; attach() adds counters, InstrumentedGumballMachine
+  adds counters plus per-operation latency histograms
+- Counters: accepted coins by type, rejected coins, dispenses by color, failed dispenses
+  by reason, change returned (count and cents)
+- Each thread accumulates into its own shard, so recording never takes a lock; a
+  snapshot sums the shards
+- Exports in Prometheus text format to a file or over HTTP for collectors to scrape
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+from gumball_machine import (
+    COIN_NAMES,
+    COLOR_NAMES,
+    OUTCOME_ACCEPTED,
+    OUTCOME_DISPENSED,
+    OUTCOME_INSUFFICIENT,
+    OUTCOME_NAMES,
+    OUTCOME_NO_CHANGE,
+    OUTCOME_REJECTED,
+    OUTCOME_RETURNED,
+    OUTCOME_SOLD_OUT,
+    OUTCOME_UNKNOWN,
+    ORDER_ALL_OR_NOTHING,
+    GumballMachine,
+)
+
+OPERATIONS = ("insert_coin", "dispense", "return_change", "apply_events", "purchase")
+OP_INSERT, OP_DISPENSE, OP_CHANGE, OP_BATCH, OP_PURCHASE = range(len(OPERATIONS))
+
+FAILURES = (OUTCOME_UNKNOWN, OUTCOME_SOLD_OUT, OUTCOME_INSUFFICIENT, OUTCOME_NO_CHANGE)
+
+# Latency histogram upper bounds in seconds (1µs .. 1s, 1-2-5 steps); last bucket is +Inf.
+# Parsed from decimal text so the le labels read 5e-06, not 4.9999999999999996e-06
+LATENCY_BOUNDS = tuple(
+    float(f"{mantissa}e{exponent}") for exponent in range(-6, 0) for mantissa in (1, 2, 5)
+) + (1.0,)
+
+
+class _Shard:
+    """One thread's counters. Only its own thread writes to it."""
+    __slots__ = ("outcomes", "coins", "colors", "returned", "latency", "latency_sum", "timing")
+
+    def __init__(self):
+        self.outcomes = [0] * len(OUTCOME_NAMES)
+        self.coins = [0] * len(COIN_NAMES) # Accepted coins by coin code
+        self.colors = [0] * len(COLOR_NAMES) # Dispenses by color code
+        self.returned = 0 # cents
+        self.latency = [[0] * (len(LATENCY_BOUNDS) + 1) for _ in OPERATIONS]
+        self.latency_sum = [0.0] * len(OPERATIONS)
+        self.timing = False # Inside a timed call; nested calls are not timed again
+
+
+class MachineMetrics:
+
+    def __init__(self):
+        """Start with no shards; each recording thread registers one on first use."""
+        self._local = threading.local()
+        self._shards = []
+        self._register_lock = threading.Lock()
+
+    def shard(self) -> _Shard:
+        """The calling thread's shard."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._register_lock:
+                self._shards.append(shard)
+            return shard
+
+    def attach(self, machine):
+        """
+        Count every operation of a machine (no latency; see InstrumentedGumballMachine).
+        :param machine: GumballMachine (or any variant)
+        """
+        machine.add_observer(self.observe)
+
+    def observe(self, machine, outcome: int, code: int, amount: int):
+        """Machine observer (see GumballMachine.add_observer)."""
+        shard = self.shard()
+        shard.outcomes[outcome] += 1
+        if outcome == OUTCOME_ACCEPTED:
+            shard.coins[code] += 1
+        elif outcome == OUTCOME_DISPENSED:
+            shard.colors[code] += 1
+        elif outcome == OUTCOME_RETURNED:
+            shard.returned += amount
+
+    def record_latency(self, operation: int, seconds: float):
+        """
+        Add one timing to an operation's histogram.
+        :param operation: OP_* index into OPERATIONS
+        :param seconds: float
+        """
+        shard = self.shard()
+        shard.latency[operation][bisect_left(LATENCY_BOUNDS, seconds)] += 1
+        shard.latency_sum[operation] += seconds
+
+    def snapshot(self) -> dict:
+        """
+        Totals over every thread's shard.
+        :return: dictionary
+        """
+        with self._register_lock:
+            shards = list(self._shards)
+        outcomes = [0] * len(OUTCOME_NAMES)
+        coins = [0] * len(COIN_NAMES)
+        colors = [0] * len(COLOR_NAMES)
+        latency = [[0] * (len(LATENCY_BOUNDS) + 1) for _ in OPERATIONS]
+        latency_sum = [0.0] * len(OPERATIONS)
+        returned = 0
+        for shard in shards:
+            for index, count in enumerate(shard.outcomes):
+                outcomes[index] += count
+            for index, count in enumerate(shard.coins):
+                coins[index] += count
+            for index, count in enumerate(shard.colors):
+                colors[index] += count
+            for operation in range(len(OPERATIONS)):
+                for bucket, count in enumerate(shard.latency[operation]):
+                    latency[operation][bucket] += count
+                latency_sum[operation] += shard.latency_sum[operation]
+            returned += shard.returned
+        return {
+            "coins_accepted": dict(zip(COIN_NAMES, coins)),
+            "coins_rejected": outcomes[OUTCOME_REJECTED],
+            "dispensed": dict(zip(COLOR_NAMES, colors)),
+            "dispense_failures": {OUTCOME_NAMES[outcome]: outcomes[outcome] for outcome in FAILURES},
+            "change_returns": outcomes[OUTCOME_RETURNED],
+            "change_returned_cents": returned,
+            "latency": {
+                name: {"buckets": latency[operation], "sum": latency_sum[operation]}
+                for operation, name in enumerate(OPERATIONS)
+            },
+        }
+
+    def prometheus(self) -> str:
+        """
+        Snapshot in Prometheus text exposition format.
+        :return: string
+        """
+        data = self.snapshot()
+        lines = [
+            "# HELP gumball_coins_accepted_total Coins accepted, by coin type.",
+            "# TYPE gumball_coins_accepted_total counter",
+        ]
+        lines += [f'gumball_coins_accepted_total{{coin="{coin}"}} {count}'
+                  for coin, count in data["coins_accepted"].items()]
+        lines += [
+            "# HELP gumball_coins_rejected_total Coins rejected.",
+            "# TYPE gumball_coins_rejected_total counter",
+            f"gumball_coins_rejected_total {data['coins_rejected']}",
+            "# HELP gumball_dispensed_total Gumballs dispensed, by color.",
+            "# TYPE gumball_dispensed_total counter",
+        ]
+        lines += [f'gumball_dispensed_total{{color="{color}"}} {count}'
+                  for color, count in data["dispensed"].items()]
+        lines += [
+            "# HELP gumball_dispense_failures_total Lever pulls that dispensed nothing, by reason.",
+            "# TYPE gumball_dispense_failures_total counter",
+        ]
+        lines += [f'gumball_dispense_failures_total{{reason="{reason}"}} {count}'
+                  for reason, count in data["dispense_failures"].items()]
+        lines += [
+            "# HELP gumball_change_returns_total Change lever pulls.",
+            "# TYPE gumball_change_returns_total counter",
+            f"gumball_change_returns_total {data['change_returns']}",
+            "# HELP gumball_change_returned_cents_total Change paid out, in cents.",
+            "# TYPE gumball_change_returned_cents_total counter",
+            f"gumball_change_returned_cents_total {data['change_returned_cents']}",
+            "# HELP gumball_operation_seconds Operation latency.",
+            "# TYPE gumball_operation_seconds histogram",
+        ]
+        for name, histogram in data["latency"].items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BOUNDS + (float("inf"),), histogram["buckets"]):
+                cumulative += count
+                label = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'gumball_operation_seconds_bucket{{op="{name}",le="{label}"}} {cumulative}')
+            lines.append(f'gumball_operation_seconds_sum{{op="{name}"}} {histogram["sum"]}')
+            lines.append(f'gumball_operation_seconds_count{{op="{name}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """
+        Write the Prometheus text atomically (e.g. for node_exporter's textfile collector).
+        :param path: string
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(self.prometheus())
+        os.replace(temporary, path)
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+        """
+        Serve GET /metrics from a daemon thread.
+        :param host: string
+        :param port: integer, 0 picks a free port
+        :return: the running server; call shutdown() to stop it
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass # Scrapes are too frequent to log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class InstrumentedGumballMachine(GumballMachine):
+    """GumballMachine that records counters and per-operation latency into MachineMetrics."""
+
+    def __init__(self, metrics: MachineMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+        metrics.attach(self)
+
+    def _timed(self, operation: int, method, *args):
+        """Call method, timing it unless an outer call is already being timed."""
+        shard = self.metrics.shard()
+        if shard.timing:
+            return method(*args)
+        shard.timing = True
+        start = perf_counter()
+        try:
+            return method(*args)
+        finally:
+            shard.timing = False
+            self.metrics.record_latency(operation, perf_counter() - start)
+
+    def insert_coin(self, coin: str):
+        return self._timed(OP_INSERT, super().insert_coin, coin)
+
+    def insert_coin_code(self, code: int):
+        return self._timed(OP_INSERT, super().insert_coin_code, code)
+
+    def dispense(self, color: str):
+        return self._timed(OP_DISPENSE, super().dispense, color)
+
+    def dispense_code(self, code: int):
+        return self._timed(OP_DISPENSE, super().dispense_code, code)
+
+    def purchase(self, order: dict, policy: int = ORDER_ALL_OR_NOTHING):
+        return self._timed(OP_PURCHASE, super().purchase, order, policy)
+
+    def return_change(self):
+        return self._timed(OP_CHANGE, super().return_change)
+
+    def apply_events(self, events, collect: bool = False):
+        return self._timed(OP_BATCH, super().apply_events, events, collect)
@@ -0,0 +1,159 @@
+"""
+Gumball Session Server
+
+- asyncio server speaking the gumball_machine command protocol, one command per line
+- Every connection is one customer session with its own machine
+- Each command is answered with one JSON line: the result fields plus "op"
+- "quit" returns the remaining change and closes the session
+- Serves on a local TCP port or a Unix socket
+- Ships a load generator that reports p50/p99 latency per operation
+
+Usage:
+    python gumball_server.py serve [--host H] [--port P | --unix PATH]
+    python gumball_server.py load [--host H] [--port P | --unix PATH] [--sessions N] [--rounds N]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from gumball_machine import CompactGumballMachine, run_command
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7777
+
+# One customer visit replayed by each load-generator session
+LOAD_SCRIPT = ("coin quarter", "red", "coin dime", "yellow", "coin penny", "red", "change")
+
+
+async def handle_session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    Serve one customer until "quit" or disconnect.
+    :param reader: asyncio.StreamReader
+    :param writer: asyncio.StreamWriter
+    """
+    machine = CompactGumballMachine()
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError: # Longer than the reader's limit; readline() dropped it
+                writer.write(json.dumps({"op": "error", "error": "Line too long"}).encode() + b"\n")
+                await writer.drain()
+                continue
+            if not line:
+                break
+            response = run_command(machine, line.decode("utf-8", "replace"))
+            writer.write(json.dumps(response).encode() + b"\n")
+            if response["op"] == "quit":
+                break
+            await writer.drain()
+        await writer.drain()
+    except ConnectionError:
+        pass # Customer walked away mid-session
+    finally:
+        writer.close()
+
+
+async def start(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: str = None):
+    """
+    Start the session server without blocking.
+    :param host: string
+    :param port: integer, 0 picks a free port
+    :param unix: string, Unix socket path; overrides host and port
+    :return: asyncio.Server
+    """
+    if unix:
+        return await asyncio.start_unix_server(handle_session, path=unix, backlog=4096)
+    return await asyncio.start_server(handle_session, host, port, backlog=4096)
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: str = None):
+    """Run the session server until cancelled."""
+    server = await start(host, port, unix)
+    address = unix or "{}:{}".format(*server.sockets[0].getsockname()[:2])
+    print(f"  Gumball server listening on {address}")
+    async with server:
+        await server.serve_forever()
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list (None if it is empty)."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def _load_session(host: str, port: int, unix: str, rounds: int, latencies: dict):
+    """Open one session, replay LOAD_SCRIPT rounds times, then quit."""
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    clock = time.perf_counter
+    try:
+        for _ in range(rounds):
+            for command in LOAD_SCRIPT:
+                start_time = clock()
+                writer.write(command.encode() + b"\n")
+                op = json.loads(await reader.readline())["op"]
+                latencies[op].append(clock() - start_time)
+        writer.write(b"quit\n")
+        await reader.readline()
+    finally:
+        writer.close()
+
+
+async def run_load(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: str = None,
+                   sessions: int = 1000, rounds: int = 10) -> dict:
+    """
+    Drive many concurrent sessions against a running server.
+    :param sessions: integer, concurrent connections
+    :param rounds: integer, LOAD_SCRIPT replays per session
+    :return: dictionary of op -> {"count", "p50_ms", "p99_ms"}; latencies are None for ops
+        with no samples
+    """
+    latencies = {"coin": [], "red": [], "yellow": [], "change": []}
+    await asyncio.gather(*(
+        _load_session(host, port, unix, rounds, latencies) for _ in range(sessions)
+    ))
+    report = {}
+    for op, values in latencies.items():
+        values.sort()
+        p50, p99 = _percentile(values, 0.50), _percentile(values, 0.99)
+        report[op] = {
+            "count": len(values),
+            "p50_ms": None if p50 is None else p50 * 1000,
+            "p99_ms": None if p99 is None else p99 * 1000,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gumball session server and load generator")
+    parser.add_argument("mode", choices=("serve", "load"))
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="Unix socket path instead of TCP")
+    parser.add_argument("--sessions", type=int, default=1000, help="load: concurrent sessions")
+    parser.add_argument("--rounds", type=int, default=10, help="load: script replays per session")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    report = asyncio.run(run_load(args.host, args.port, args.unix, args.sessions, args.rounds))
+    print(f"  {'op':<8}{'count':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for op, stats in report.items():
+        p50, p99 = (("-" if ms is None else f"{ms:.3f}") for ms in (stats["p50_ms"], stats["p99_ms"]))
+        print(f"  {op:<8}{stats['count']:>10}{p50:>10}{p99:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Idle Session Timeouts
+
+- IdleSessions watches many machine sessions and hands back abandoned balances after a
+  configurable inactivity period (return_change by default, or an Escrow)
+- Activity is seen through the machine observer hook: a clock read and a dict write
+  per operation, no rescheduling
+- Deadlines live on a hierarchical timer wheel: O(1) schedule and cancel, and each tick
+  only touches the one slot that is due, never the whole session table
+- A session is re-checked when its slot comes due; if it was active since, it is simply
+  scheduled again for its new deadline
+
+Not thread-safe: run it on the session host's event loop (call expire() from a periodic task).
+"""
+
+import time
+
+WHEEL_BITS = (8, 6, 6, 6) # Slots per level as powers of two: 256 ticks, then 64x coarser each
+
+
+class TimerWheel:
+    """Hierarchical timing wheel of keys by expiry tick."""
+    __slots__ = ("tick", "_bits", "_shifts", "_levels", "_where", "_now")
+
+    def __init__(self, tick: float = 1.0, bits: tuple = WHEEL_BITS, now: float = 0.0):
+        """
+        Empty wheel.
+        :param tick: float seconds per slot of the finest level
+        :param bits: tuple, log2 of the slot count of each level
+        :param now: float seconds, current time
+        """
+        self.tick = tick
+        self._bits = bits
+        self._shifts = []
+        shift = 0
+        for level_bits in bits:
+            self._shifts.append(shift)
+            shift += level_bits
+        self._levels = [[{} for _ in range(1 << level_bits)] for level_bits in bits]
+        self._where = {} # key -> slot dict holding it
+        self._now = int(now / tick)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key) -> bool:
+        return key in self._where
+
+    def schedule(self, key, deadline: float):
+        """
+        Fire key at deadline (replaces any earlier schedule for it).
+        :param key: hashable
+        :param deadline: float seconds
+        """
+        self.cancel(key)
+        # Round up so keys never fire early; overdue keys fire on the next tick
+        self._insert(key, int(-(-deadline // self.tick)), self._now + 1)
+
+    def _insert(self, key, expiry: int, earliest: int):
+        """Put key in the finest level whose span reaches its expiry tick."""
+        place = max(expiry, earliest)
+        delta = place - self._now
+        last = len(self._bits) - 1
+        for level, shift in enumerate(self._shifts):
+            span = 1 << (shift + self._bits[level])
+            if delta < span or level == last:
+                break
+        if delta >= span: # Beyond the wheel: park in the farthest slot, re-placed on cascade
+            place = self._now + span - 1
+        slot = self._levels[level][(place >> shift) & ((1 << self._bits[level]) - 1)]
+        slot[key] = expiry
+        self._where[key] = slot
+
+    def cancel(self, key):
+        """Forget key if it is scheduled."""
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def advance(self, now: float) -> list:
+        """
+        Move the wheel to now.
+        :param now: float seconds
+        :return: list of keys whose deadline has passed, in expiry order
+        """
+        target = int(now / self.tick)
+        fired = []
+        while self._now < target:
+            if not self._where: # Nothing scheduled: jump straight there
+                self._now = target
+                break
+            self._now += 1
+            self._cascade(1)
+            slot = self._levels[0][self._now & ((1 << self._bits[0]) - 1)]
+            if slot:
+                due = [key for key, expiry in slot.items() if expiry <= self._now]
+                for key in due:
+                    del slot[key]
+                    del self._where[key]
+                fired += due
+        return fired
+
+    def _cascade(self, level: int):
+        """When a finer level wraps, spread the next slot of this level into finer slots."""
+        if level >= len(self._bits):
+            return
+        if self._now & ((1 << self._shifts[level]) - 1):
+            return # Finer level has not wrapped
+        self._cascade(level + 1)
+        index = (self._now >> self._shifts[level]) & ((1 << self._bits[level]) - 1)
+        slot = self._levels[level][index]
+        if slot:
+            entries = list(slot.items())
+            slot.clear()
+            for key, expiry in entries:
+                self._insert(key, expiry, self._now) # Due this tick: lands in the slot about to fire
+
+
+def return_balance(key, machine):
+    """Default expiry action: pull the machine's 'Return My Change' lever."""
+    return machine.return_change()
+
+
+class Escrow:
+    """Expiry action that moves abandoned balances into escrow instead of paying them out."""
+
+    def __init__(self):
+        self.held = {} # key -> cents
+
+    def __call__(self, key, machine) -> int:
+        amount = machine.escrow_balance() # Under the machine's lock, seen by its observers
+        self.held[key] = self.held.get(key, 0) + amount
+        return amount
+
+    def claim(self, key) -> int:
+        """
+        Release a session's escrowed cents.
+        :return: integer, cents (0 if none)
+        """
+        return self.held.pop(key, 0)
+
+
+class IdleSessions:
+
+    def __init__(self, timeout: float = 120.0, on_expire=return_balance, clock=time.monotonic,
+                 tick: float = 1.0):
+        """
+        Watch sessions for inactivity.
+        :param timeout: float seconds without an operation before a balance is handed back
+        :param on_expire: callable(key, machine) run for idle sessions holding a balance
+        :param clock: callable returning seconds
+        :param tick: float seconds, expiry granularity
+        """
+        self.timeout = timeout
+        self.on_expire = on_expire
+        self._clock = clock
+        self._wheel = TimerWheel(tick, now=clock())
+        self._machines = {} # key -> machine
+        self._keys = {} # machine -> key
+        self._last_active = {} # key -> clock time of the last operation
+
+    def __len__(self) -> int:
+        return len(self._machines)
+
+    def open(self, key, machine):
+        """
+        Start watching a machine session.
+        :param key: hashable session id
+        :param machine: GumballMachine (or any variant)
+        :return: machine
+        """
+        now = self._clock()
+        self._machines[key] = machine
+        self._keys[machine] = key
+        self._last_active[key] = now
+        machine.add_observer(self._activity)
+        self._wheel.schedule(key, now + self.timeout)
+        return machine
+
+    def close(self, key):
+        """Stop watching a session (e.g. the customer disconnected)."""
+        machine = self._machines.pop(key)
+        del self._keys[machine]
+        del self._last_active[key]
+        machine.remove_observer(self._activity)
+        self._wheel.cancel(key)
+
+    def touch(self, key):
+        """Count activity that did not reach the machine (e.g. a status query)."""
+        self._last_active[key] = now = self._clock()
+        if key not in self._wheel:
+            self._wheel.schedule(key, now + self.timeout)
+
+    def _activity(self, machine, outcome: int, code: int, amount: int):
+        """Machine observer: note the time; re-arm sessions that had gone quiet."""
+        self.touch(self._keys[machine])
+
+    def expire(self, now: float = None) -> list:
+        """
+        Hand back the balances of sessions idle for the timeout.
+        :param now: float seconds (default: the clock)
+        :return: list of (key, on_expire result) for every balance handed back
+        """
+        now = self._clock() if now is None else now
+        expired = []
+        for key in self._wheel.advance(now):
+            deadline = self._last_active[key] + self.timeout
+            if deadline > now: # Active since this deadline was set
+                self._wheel.schedule(key, deadline)
+                continue
+            machine = self._machines[key]
+            if machine.balance:
+                expired.append((key, self.on_expire(key, machine)))
+                self._wheel.cancel(key) # Handing back the balance is not customer activity
+        return expired
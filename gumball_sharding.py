@@ -0,0 +1,169 @@
+"""
+Sharded Multiprocess Fleet Simulation
+
+- Splits a fleet of machines into shards, one ProcessPoolExecutor task per shard
+- Each event travels as one byte (kind << 4 | code), so a shard's whole event stream
+  is a single bytes object; nothing per event is pickled
+- Every machine in a shard gets an equal-length slice of the shard's stream
+- Shard results come back as packed balances plus outcome counts and are merged in order
+"""
+
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from gumball_machine import (
+    COIN_NAMES,
+    COLOR_NAMES,
+    EVENT_CHANGE,
+    EVENT_COIN,
+    EVENT_DISPENSE,
+    OUTCOME_NAMES,
+    REJECTED_COIN,
+    UNKNOWN_COLOR,
+    CompactGumballMachine,
+)
+
+# Byte -> pre-built (kind, name) event; "" is never a valid coin or color
+_DECODE = [(255, None)] * 256 # Undefined bytes raise "Unknown event kind"
+for _code in range(REJECTED_COIN + 1):
+    _DECODE[EVENT_COIN << 4 | _code] = (EVENT_COIN, COIN_NAMES[_code] if _code < REJECTED_COIN else "")
+for _code in range(UNKNOWN_COLOR + 1):
+    _DECODE[EVENT_DISPENSE << 4 | _code] = (EVENT_DISPENSE, COLOR_NAMES[_code] if _code < UNKNOWN_COLOR else "")
+_DECODE[EVENT_CHANGE << 4] = (EVENT_CHANGE, None)
+_DECODE = tuple(_DECODE)
+
+# Byte values that are not an event (line noise, framing errors)
+INVALID_BYTES = bytes(value for value in range(256) if _DECODE[value][0] == 255)
+
+# Random byte -> event byte, weighted towards coins and lever pulls like real traffic
+_MIX = (
+    [EVENT_COIN << 4 | code for code in range(REJECTED_COIN) for _ in range(3)]
+    + [EVENT_COIN << 4 | REJECTED_COIN]
+    + [EVENT_DISPENSE << 4 | code for code in range(UNKNOWN_COLOR) for _ in range(4)]
+    + [EVENT_DISPENSE << 4 | UNKNOWN_COLOR]
+    + [EVENT_CHANGE << 4] * 2
+)
+_RANDOM_TABLE = bytes(_MIX[value % len(_MIX)] for value in range(256))
+
+
+def encode_event(kind: int, name: str = None) -> int:
+    """
+    Encode one (kind, name) event as its byte value.
+    :param kind: EVENT_COIN, EVENT_DISPENSE or EVENT_CHANGE
+    :param name: coin or color name (normalized); unknown names encode as rejected/unknown
+    :return: integer 0-255
+    """
+    if kind == EVENT_COIN:
+        return EVENT_COIN << 4 | (COIN_NAMES.index(name) if name in COIN_NAMES else REJECTED_COIN)
+    if kind == EVENT_DISPENSE:
+        return EVENT_DISPENSE << 4 | (COLOR_NAMES.index(name) if name in COLOR_NAMES else UNKNOWN_COLOR)
+    if kind == EVENT_CHANGE:
+        return EVENT_CHANGE << 4
+    raise ValueError(f"Unknown event kind: {kind}")
+
+
+def encode_events(events) -> bytes:
+    """
+    Encode (kind, name) events as a compact byte stream.
+    :param events: iterable of (kind, name) tuples
+    :return: bytes
+    """
+    return bytes(encode_event(kind, name) for kind, name in events)
+
+
+def decode_events(payload):
+    """
+    Decode a byte stream into (kind, name) events, lazily and without allocating per event.
+    :param payload: bytes-like object of valid event bytes (see INVALID_BYTES)
+    :return: iterator of (kind, name) tuples for apply_events()
+    """
+    return map(_DECODE.__getitem__, payload)
+
+
+def random_stream(count: int, rng: random.Random) -> bytes:
+    """
+    Random event stream of count events.
+    :param count: integer
+    :param rng: random.Random
+    :return: bytes
+    """
+    return rng.randbytes(count).translate(_RANDOM_TABLE)
+
+
+def run_shard(payload: bytes, machines: int) -> tuple:
+    """
+    Worker: replay a shard's stream, split evenly over its machines.
+    :param payload: bytes, machines * events_per_machine encoded events
+    :param machines: integer
+    :return: (balances array("q"), counts list by outcome code, returned cents)
+    """
+    per_machine = len(payload) // machines
+    stream = memoryview(payload)
+    balances = array("q")
+    counts = [0] * len(OUTCOME_NAMES)
+    returned = 0
+    for index in range(machines):
+        machine = CompactGumballMachine()
+        events = stream[index * per_machine:(index + 1) * per_machine]
+        result = machine.apply_events(decode_events(events))
+        balances.append(result["balance"])
+        returned += result["returned"]
+        for outcome, name in enumerate(OUTCOME_NAMES):
+            counts[outcome] += result["counts"][name]
+    return balances, counts, returned
+
+
+def merge(shard_results) -> dict:
+    """
+    Merge shard results in shard order.
+    :param shard_results: iterable of run_shard() return values
+    :return: dictionary
+    """
+    balances = array("q")
+    counts = [0] * len(OUTCOME_NAMES)
+    returned = 0
+    for shard_balances, shard_counts, shard_returned in shard_results:
+        balances.extend(shard_balances)
+        for outcome, count in enumerate(shard_counts):
+            counts[outcome] += count
+        returned += shard_returned
+    return {
+        "machines": len(balances),
+        "balances": balances,
+        "balance": sum(balances),
+        "returned": returned,
+        "counts": dict(zip(OUTCOME_NAMES, counts)),
+    }
+
+
+def shard_sizes(machines: int, shards: int) -> list:
+    """Split machines into shards whose sizes differ by at most one."""
+    base, extra = divmod(machines, shards)
+    return [base + (index < extra) for index in range(shards) if base + (index < extra)]
+
+
+def simulate(machines: int, events_per_machine: int, workers: int = None, seed: int = 0) -> dict:
+    """
+    Simulate a fleet on random traffic, one shard per worker process.
+    :param machines: integer, fleet size
+    :param events_per_machine: integer
+    :param workers: integer, processes (default: one per CPU)
+    :param seed: integer, makes the traffic reproducible
+    :return: dictionary (see merge)
+    """
+    workers = workers or os.cpu_count()
+    sizes = shard_sizes(machines, workers)
+    # Same traffic per machine whatever the worker count, so runs are comparable
+    stream = random_stream(machines * events_per_machine, random.Random(seed))
+    payloads = []
+    start = 0
+    for size in sizes:
+        end = start + size * events_per_machine
+        payloads.append(stream[start:end])
+        start = end
+    if workers == 1:
+        return merge(map(run_shard, payloads, sizes))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge(pool.map(run_shard, payloads, sizes))
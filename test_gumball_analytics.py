@@ -0,0 +1,137 @@
+"""Unit tests for gumball sales analytics."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from gumball_analytics import (
+    SalesAggregate,
+    aggregate_file,
+    aggregate_files,
+    aggregate_journal,
+    aggregate_results,
+    chunked,
+)
+from gumball_journal import JournalWriter
+from gumball_machine import GumballMachine
+
+
+def _session(machine) -> list:
+    """Quarter → red → penny → yellow → return, as result objects."""
+    return [
+        machine.insert_coin("quarter"),
+        machine.dispense("red"),
+        machine.insert_coin("penny"),
+        machine.dispense("yellow"),
+        machine.return_change(),
+    ]
+
+
+class Test01SalesAggregate(unittest.TestCase):
+    def test_aggregate_results(self):
+        """Test revenue, rejected-coin rate and average change from result objects"""
+        machine = GumballMachine()
+        results = _session(machine) + _session(machine)
+        report = aggregate_results(results).report()
+        self.assertEqual(report["revenue"], {"red": 10, "yellow": 20})
+        self.assertEqual(report["sales"], {"red": 2, "yellow": 2})
+        self.assertEqual(report["rejected_coin_rate"], 0.5)
+        self.assertEqual(report["average_change_returned"], 10)
+
+    def test_aggregate_plain_dicts(self):
+        """Test plain result dictionaries aggregate like result objects"""
+        results = [result.to_dict() for result in _session(GumballMachine())]
+        self.assertEqual(aggregate_results(results).report(), aggregate_results(_session(GumballMachine())).report())
+
+    def test_aggregate_purchases(self):
+        """Test cart purchases count like the dispenses observers see, as objects or dicts"""
+        machine = GumballMachine()
+        observed = SalesAggregate()
+        machine.add_observer(observed.observe)
+        machine.insert_coin("quarter")
+        machine.insert_coin("dime")
+        result = machine.purchase({"red": 3, "yellow": 2})
+        for results in ([result], [result.to_dict()]):
+            report = aggregate_results(results).report()
+            self.assertEqual(report["sales"], {"red": 3, "yellow": 2})
+            self.assertEqual(report["revenue"], observed.report()["revenue"])
+        repriced = GumballMachine(prices={"red": 10})
+        repriced.insert_coin("quarter")
+        repriced.insert_coin("quarter")
+        report = aggregate_results([repriced.purchase({"red": 1, "yellow": 2})]).report()
+        self.assertEqual(sum(report["revenue"].values()), 30) # Split at list prices, total exact
+
+    def test_sliding_window_sales_rate(self):
+        """Test sales rate only counts sales inside the window"""
+        aggregate = SalesAggregate(window_seconds=10)
+        machine = GumballMachine()
+        machine.insert_coin("quarter")
+        for second in (100, 101, 105):
+            aggregate.add_result(machine.dispense("red"), timestamp=second)
+        self.assertEqual(aggregate.sales_rate(now=106), 0.3)
+        for second in (120, 121):
+            aggregate.add_result(machine.dispense("red"), timestamp=second)
+        self.assertEqual(aggregate.sales_rate(now=121), 0.2)
+
+    def test_merge_partial_aggregates(self):
+        """Test merging two partial aggregates equals aggregating everything at once"""
+        results = _session(GumballMachine()) * 3
+        first, second = aggregate_results(results[:7]), aggregate_results(results[7:])
+        self.assertEqual(first.merge(second).report(), aggregate_results(results).report())
+
+    def test_chunked(self):
+        """Test chunking yields bounded lists covering the whole stream"""
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+class Test02AnalyticsFiles(unittest.TestCase):
+    def setUp(self):
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+
+    def _temp(self, suffix: str) -> str:
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.paths.append(path)
+        return path
+
+    def _results_file(self, sessions: int) -> str:
+        path = self._temp(".jsonl")
+        machine = GumballMachine()
+        with open(path, "w", encoding="utf-8") as file:
+            for _ in range(sessions):
+                for result in _session(machine):
+                    file.write(json.dumps(result.to_dict()) + "\n")
+        return path
+
+    def test_aggregate_file(self):
+        """Test JSON-lines results file aggregates like the results themselves"""
+        report = aggregate_file(self._results_file(4)).report()
+        self.assertEqual(report["sales"], {"red": 4, "yellow": 4})
+
+    def test_aggregate_files_in_workers(self):
+        """Test worker processes' partial aggregates merge into one report"""
+        paths = [self._results_file(2), self._results_file(3)]
+        report = aggregate_files(paths, workers=2).report()
+        self.assertEqual(report["revenue"], {"red": 25, "yellow": 50})
+
+    def test_aggregate_journal(self):
+        """Test journal records aggregate like the results they came from"""
+        path = self._temp(".journal")
+        os.remove(path)
+        machine = GumballMachine()
+        with JournalWriter(path) as journal:
+            journal.attach(machine)
+            _session(machine)
+            _session(machine)
+        report = aggregate_journal(path).report()
+        self.assertEqual(report["revenue"], {"red": 10, "yellow": 20})
+        self.assertEqual(report["average_change_returned"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,84 @@
+"""Unit tests for GumballFleet."""
+
+import random
+import unittest
+
+try:
+    import numpy as np
+except ImportError:  # The fleet engine needs NumPy
+    np = None
+
+from gumball_machine import (
+    COIN_NAMES,
+    COLOR_NAMES,
+    REJECTED_COIN,
+    UNKNOWN_COLOR,
+    GumballMachine,
+    coin_code,
+    color_code,
+)
+
+if np is not None:
+    from gumball_fleet import NO_EVENT, GumballFleet
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class Test01FleetTick(unittest.TestCase):
+    def setUp(self):
+        self.fleet = GumballFleet(3)
+
+    def test_tick_insert_and_dispense(self):
+        """Test one tick: quarter + red, penny + red, no coin + blue"""
+        tick = self.fleet.tick(
+            coins=[coin_code("quarter"), coin_code("penny"), NO_EVENT],
+            levers=[color_code("red"), color_code("red"), color_code("blue")],
+        )
+        self.assertEqual(self.fleet.balance.tolist(), [20, 0, 0])
+        self.assertEqual(tick["accepted"].tolist(), [1, 0, 0])
+        self.assertEqual(tick["rejected"].tolist(), [0, 1, 0])
+        self.assertEqual(tick["dispensed"].tolist(), [1, 0, 0])
+        self.assertEqual(tick["insufficient"].tolist(), [0, 1, 0])
+        self.assertEqual(tick["unknown"].tolist(), [0, 0, 1])
+
+    def test_tick_return_change(self):
+        """Test change lever returns each machine's balance and resets it"""
+        self.fleet.tick(coins=[coin_code("dime"), coin_code("nickel"), NO_EVENT])
+        tick = self.fleet.tick(change=[True, False, True])
+        self.assertEqual(tick["returned"].tolist(), [10, 0, 0])
+        self.assertEqual(self.fleet.balance.tolist(), [0, 5, 0])
+
+    def test_tick_wrong_shape(self):
+        """Test tick rejects event arrays of the wrong length"""
+        with self.assertRaises(ValueError):
+            self.fleet.tick(coins=[NO_EVENT])
+
+    def test_fleet_matches_independent_machines(self):
+        """Test fleet matches independent GumballMachine objects event for event"""
+        rng = random.Random(7)
+        size = 50
+        fleet = GumballFleet(size)
+        machines = [GumballMachine() for _ in range(size)]
+        coin_choices = [NO_EVENT, REJECTED_COIN, *range(len(COIN_NAMES))]
+        lever_choices = [NO_EVENT, UNKNOWN_COLOR, *range(len(COLOR_NAMES))]
+        totals = {"accepted": [0] * size, "dispensed": [0] * size, "returned": [0] * size}
+        for _ in range(200):
+            coins = [rng.choice(coin_choices) for _ in range(size)]
+            levers = [rng.choice(lever_choices) for _ in range(size)]
+            change = [rng.random() < 0.05 for _ in range(size)]
+            fleet.tick(coins=coins, levers=levers, change=change)
+            for i, machine in enumerate(machines):
+                if coins[i] != NO_EVENT:
+                    name = COIN_NAMES[coins[i]] if coins[i] < len(COIN_NAMES) else "penny"
+                    totals["accepted"][i] += machine.insert_coin(name)["accepted"]
+                if levers[i] != NO_EVENT:
+                    name = COLOR_NAMES[levers[i]] if levers[i] < len(COLOR_NAMES) else "blue"
+                    totals["dispensed"][i] += machine.dispense(name)["dispensed"]
+                if change[i]:
+                    totals["returned"][i] += machine.return_change()["returned"]
+            self.assertEqual(fleet.balance.tolist(), [m.balance for m in machines])
+        for name, expected in totals.items():
+            self.assertEqual(fleet.counters[name].tolist(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,81 @@
+"""Unit tests for the differential fuzzer."""
+
+import random
+import unittest
+
+from gumball_fuzz import (
+    IMPLEMENTATIONS,
+    STEP_PURCHASE,
+    first_mismatch,
+    fuzz,
+    generate,
+    register,
+    shrink,
+    unregister,
+)
+from gumball_machine import (
+    EVENT_COIN,
+    EVENT_DISPENSE,
+    ORDER_ALL_OR_NOTHING,
+    CompactGumballMachine,
+    GumballMachine,
+)
+
+
+class OffByOneChange(GumballMachine):
+    """Keeps a nickel back whenever the balance is over 25¢."""
+
+    def return_change(self):
+        if self.balance > 25:
+            self.balance -= 5
+        return super().return_change()
+
+
+class NoPurchase(GumballMachine):
+    """Refuses every multi-gumball order."""
+
+    def purchase(self, order: dict, policy: int = ORDER_ALL_OR_NOTHING):
+        return super().purchase({}, policy)
+
+
+class Test01Fuzz(unittest.TestCase):
+    def test_registered_implementations_match(self):
+        """Test the built-in fast implementations match the reference"""
+        self.assertEqual(fuzz(total_steps=20_000, length=500, seed=1), [])
+
+    def test_generate_is_reproducible(self):
+        """Test the same seed generates the same sequence"""
+        self.assertEqual(generate(100, random.Random(5)), generate(100, random.Random(5)))
+
+    def test_mismatch_found_and_shrunk(self):
+        """Test a buggy implementation is caught and shrunk to a short reproduction"""
+        register("off_by_one", OffByOneChange)
+        try:
+            failures = fuzz(total_steps=5_000, length=500, seed=1,
+                            implementations={"off_by_one": IMPLEMENTATIONS["off_by_one"]})
+        finally:
+            unregister("off_by_one")
+        self.assertNotIn("off_by_one", IMPLEMENTATIONS)
+        self.assertEqual(len(failures), 1)
+        failure = failures[0]
+        # Shortest failure: one quarter plus one more coin, then return change
+        self.assertEqual(len(failure.steps), 3)
+        self.assertEqual(failure.index, 2)
+        self.assertIsNotNone(first_mismatch(failure.steps, OffByOneChange, failure.config))
+
+    def test_purchase_mismatch_does_not_affect_others(self):
+        """Test a broken purchase() is caught while the next implementation still passes"""
+        failures = fuzz(total_steps=5_000, length=500, seed=3,
+                        implementations={"no_purchase": NoPurchase, "compact": CompactGumballMachine})
+        self.assertEqual([failure.implementation for failure in failures], ["no_purchase"])
+        self.assertEqual(len(failures[0].steps), 1)
+        self.assertEqual(failures[0].steps[0][0], STEP_PURCHASE)
+
+    def test_shrink_removes_irrelevant_steps(self):
+        """Test shrinking keeps only the steps a failure depends on"""
+        steps = [(EVENT_DISPENSE, "red")] * 20 + [(EVENT_COIN, "dime")] + [(EVENT_DISPENSE, "red")] * 20
+        self.assertEqual(shrink(steps, lambda s: (EVENT_COIN, "dime") in s), [(EVENT_COIN, "dime")])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
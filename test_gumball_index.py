@@ -0,0 +1,100 @@
+"""Unit tests for the fleet index."""
+
+import random
+import unittest
+
+from gumball_index import FleetIndex
+from gumball_machine import CompactGumballMachine, GumballMachine
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Test01FleetIndex(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.index = FleetIndex(clock=self.clock)
+        self.machines = {key: self.index.add(key, GumballMachine()) for key in "abcd"}
+
+    def test_balance_range_and_top(self):
+        """Test balance range and top-k queries follow every operation"""
+        self.machines["a"].insert_coin("quarter")
+        for _ in range(5):
+            self.machines["b"].insert_coin("quarter")
+        self.machines["c"].insert_coin("dime")
+        self.machines["c"].dispense("red")
+        self.assertEqual(self.index.balance_range(101), ["b"])
+        self.assertEqual(sorted(self.index.balance_range(1, 25)), ["a", "c"])
+        self.assertEqual(self.index.top_balances(2), [("b", 125), ("a", 25)])
+        self.machines["b"].return_change()
+        self.assertEqual(self.index.balance_range(101), [])
+        self.assertEqual(self.index.top_balances(1), [("a", 25)])
+
+    def test_no_sales_since(self):
+        """Test machines without a recent sale are listed, longest without first"""
+        self.clock.now = 100
+        self.machines["b"].insert_coin("dime")
+        self.machines["b"].dispense("red")
+        self.clock.now = 200
+        self.machines["a"].insert_coin("dime")
+        self.machines["a"].dispense("yellow")
+        self.machines["c"].insert_coin("nickel") # Activity, but no sale
+        self.assertEqual(self.index.no_sales_since(150), ["c", "d", "b"])
+        self.assertEqual(self.index.idle_since(150), ["d", "b"])
+        self.assertEqual(self.index.stalest(2), [("c", 0.0), ("d", 0.0)])
+
+    def test_remove_and_refresh(self):
+        """Test removed machines leave every index; refresh picks up direct changes"""
+        self.machines["a"].insert_coin("quarter")
+        self.index.remove("a")
+        self.machines["a"].insert_coin("quarter")
+        self.assertNotIn("a", self.index)
+        self.assertEqual(self.index.balance_range(1), [])
+        self.assertNotIn("a", self.index.no_sales_since(1))
+        self.index.add("e", CompactGumballMachine()) # Reuses the freed slot
+        self.machines["b"].restore(self.machines["a"].snapshot())
+        self.index.refresh("b")
+        self.assertEqual(self.index.top_balances(1), [("b", 50)])
+        with self.assertRaises(ValueError):
+            self.index.add("b", GumballMachine())
+
+    def test_machine_indexed_once(self):
+        """Test a machine already indexed cannot be added again under another key"""
+        with self.assertRaises(ValueError):
+            self.index.add("e", self.machines["a"])
+        self.assertNotIn("e", self.index)
+        self.machines["a"].insert_coin("dime")
+        self.assertEqual(self.index.balance_range(1), ["a"])
+        self.index.remove("a")
+        self.index.add("e", self.machines["a"]) # Free again once removed
+        self.assertEqual(self.index.balance_range(1), ["e"])
+
+    def test_matches_full_scan(self):
+        """Test indexed answers match scanning a randomly driven fleet"""
+        rng = random.Random(7)
+        fleet = {key: self.index.add(key, CompactGumballMachine()) for key in range(200)}
+        fleet.update(self.machines)
+        for step in range(5000):
+            self.clock.now = step
+            machine = fleet[rng.choice(list(fleet))]
+            action = rng.random()
+            if action < 0.5:
+                machine.insert_coin(rng.choice(("nickel", "dime", "quarter")))
+            elif action < 0.9:
+                machine.dispense(rng.choice(("red", "yellow")))
+            else:
+                machine.return_change()
+        expected = sorted(key for key, machine in fleet.items() if machine.balance > 100)
+        self.assertEqual(sorted(self.index.balance_range(101), key=str), sorted(expected, key=str))
+        top = self.index.top_balances(5)
+        self.assertEqual([balance for _, balance in top],
+                         sorted((m.balance for m in fleet.values()), reverse=True)[:5])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,105 @@
+"""Unit tests for the coin-acceptor ingest pipeline."""
+
+import os
+import random
+import threading
+import time
+import unittest
+
+from gumball_ingest import IngestPipeline
+from gumball_machine import EVENT_CHANGE, EVENT_COIN, EVENT_DISPENSE, GumballMachine
+from gumball_sharding import decode_events, encode_events, random_stream
+
+
+def feed(data: bytes, chunk: int = 1000):
+    """Pipe whose writer thread sends data in chunks, then closes."""
+    read_fd, write_fd = os.pipe()
+
+    def write():
+        with os.fdopen(write_fd, "wb", buffering=0) as pipe:
+            for start in range(0, len(data), chunk):
+                pipe.write(data[start:start + chunk])
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    return read_fd, writer
+
+
+class SlowMachine(GumballMachine):
+    def apply_events(self, events, collect=False):
+        time.sleep(0.005)
+        return super().apply_events(events, collect)
+
+
+class FaultyMachine(GumballMachine):
+    """Fails its third batch before applying any of it."""
+    batches = 0
+
+    def apply_events(self, events, collect=False):
+        self.batches += 1
+        if self.batches == 3:
+            raise RuntimeError("acceptor fault")
+        return super().apply_events(events, collect)
+
+
+class Test01Ingest(unittest.TestCase):
+    def _ingest(self, data: bytes, machine, **kwargs) -> dict:
+        read_fd, writer = feed(data)
+        try:
+            return IngestPipeline(read_fd, machine, **kwargs).run()
+        finally:
+            writer.join()
+            os.close(read_fd)
+
+    def test_stream_matches_direct_replay(self):
+        """Test a piped event stream leaves the same machine as replaying the events"""
+        data = random_stream(200_000, random.Random(4))
+        stats = self._ingest(data, GumballMachine())
+        reference = GumballMachine().apply_events(decode_events(data))
+        self.assertEqual(stats["events"], 200_000)
+        self.assertEqual(stats["balance"], reference["balance"])
+        self.assertEqual(stats["counts"], reference["counts"])
+        self.assertEqual(stats["returned"], reference["returned"])
+
+    def test_line_noise_skipped(self):
+        """Test bytes that are not events are counted and skipped"""
+        events = encode_events([(EVENT_COIN, "quarter"), (EVENT_DISPENSE, "red"), (EVENT_CHANGE, None)])
+        stats = self._ingest(b"\xff" + events[:2] + b"\x0f\x7e" + events[2:], GumballMachine())
+        self.assertEqual((stats["junk"], stats["events"], stats["returned"]), (3, 3, 20))
+
+    def test_backpressure_keeps_every_coin(self):
+        """Test a burst into a slow machine with two tiny buffers credits every coin"""
+        data = encode_events([(EVENT_COIN, "nickel")] * 5000)
+        stats = self._ingest(data, SlowMachine(), buffer_size=64, buffers=2)
+        self.assertEqual(stats["balance"], 5 * 5000)
+        self.assertGreaterEqual(stats["batches"], 5000 // 64)
+
+    def test_dispatch_error_stops_reader(self):
+        """Test a failing machine stops the reader and every event read is applied or counted"""
+        data = encode_events([(EVENT_COIN, "nickel")] * 10_000) # Fits in the pipe buffer
+        read_fd, writer = feed(data)
+        try:
+            pipeline = IngestPipeline(read_fd, FaultyMachine(), buffer_size=64, buffers=4)
+            with self.assertRaises(RuntimeError):
+                pipeline.run()
+            writer.join()
+            for thread in threading.enumerate():
+                if thread.name == "gumball-ingest":
+                    thread.join(timeout=5)
+                    self.assertFalse(thread.is_alive())
+            unread = 0
+            while True:
+                chunk = os.read(read_fd, 65536)
+                if not chunk:
+                    break
+                unread += len(chunk)
+        finally:
+            os.close(read_fd)
+        stats = pipeline.stats()
+        self.assertEqual((stats["batches"], stats["events"], stats["balance"]), (2, 128, 5 * 128))
+        self.assertGreaterEqual(stats["unapplied"], 64)
+        self.assertEqual(stats["events"] + stats["unapplied"] + unread, 10_000)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,192 @@
+"""Unit tests for the gumball event journal."""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from gumball_journal import (
+    HEADER,
+    RECORD,
+    SNAPSHOT,
+    JournalReader,
+    JournalWriter,
+    rebuild,
+    recover,
+)
+from gumball_machine import (
+    OUTCOME_ACCEPTED,
+    OUTCOME_REJECTED,
+    GumballMachine,
+    PriceTable,
+    ThreadSafeGumballMachine,
+)
+
+
+class Test01Journal(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".journal")
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _play(self, machine, rounds: int):
+        """Quarter → red → penny → yellow → return, repeated."""
+        for _ in range(rounds):
+            machine.insert_coin("quarter")
+            machine.dispense("red")
+            machine.insert_coin("penny")
+            machine.dispense("yellow")
+            machine.return_change()
+
+    def test_records_are_fixed_width(self):
+        """Test every operation appends one 8-byte record after the header"""
+        machine = GumballMachine()
+        with JournalWriter(self.path) as journal:
+            journal.attach(machine)
+            machine.insert_coin("dime")
+            machine.insert_coin("penny")
+        self.assertEqual(os.path.getsize(self.path), len(HEADER) + 3 * RECORD.size)
+        with JournalReader(self.path) as reader:
+            self.assertEqual(list(reader.records()), [
+                (SNAPSHOT, 0, 0),
+                (OUTCOME_ACCEPTED, 1, 10),
+                (OUTCOME_REJECTED, 3, 0),
+            ])
+
+    def test_recover_from_last_snapshot(self):
+        """Test recovery starts at the last snapshot and matches the live balance"""
+        machine = GumballMachine()
+        with JournalWriter(self.path, sync_every=7, snapshot_every=10) as journal:
+            journal.attach(machine)
+            self._play(machine, 20)
+            machine.insert_coin("quarter")
+            machine.dispense("yellow")
+        with JournalReader(self.path) as reader:
+            index, _ = reader.last_snapshot()
+            self.assertGreater(index, len(reader) - 12)
+        self.assertEqual(recover(self.path), 15)
+
+    def test_recover_ignores_torn_record(self):
+        """Test a half-written record at the end is ignored and trimmed on reopen"""
+        machine = GumballMachine()
+        with JournalWriter(self.path) as journal:
+            journal.attach(machine)
+            machine.insert_coin("quarter")
+        with open(self.path, "ab") as file:
+            file.write(RECORD.pack(OUTCOME_ACCEPTED, 2, 25)[:5])
+        restored = GumballMachine()
+        self.assertEqual(recover(self.path, restored), 25)
+        self.assertEqual(restored.balance, 25)
+        JournalWriter(self.path).close()
+        self.assertEqual(os.path.getsize(self.path), len(HEADER) + 2 * RECORD.size)
+
+    def test_rebuild_replays_full_state(self):
+        """Test full replay rebuilds balance, coin inventory and stock"""
+        machine = GumballMachine(coin_inventory={"nickel": 5}, stock={"red": 30, "yellow": 30})
+        with JournalWriter(self.path, snapshot_every=4) as journal:
+            journal.attach(machine)
+            self._play(machine, 5)
+            machine.insert_coin("dime")
+        rebuilt = rebuild(self.path, GumballMachine(coin_inventory={"nickel": 5}, stock={"red": 30, "yellow": 30}))
+        self.assertEqual(rebuilt.balance, machine.balance)
+        self.assertEqual(rebuilt.coin_inventory(), machine.coin_inventory())
+        self.assertEqual(rebuilt.stock, machine.stock)
+
+    def test_restore_is_journaled(self):
+        """Test recovery and replay follow a machine restored to an earlier snapshot"""
+        machine = GumballMachine()
+        with JournalWriter(self.path) as journal:
+            journal.attach(machine)
+            machine.insert_coin("dime")
+            saved = machine.snapshot()
+            machine.insert_coin("quarter")
+            machine.dispense("red")
+            machine.restore(saved)
+            machine.insert_coin("nickel")
+        self.assertEqual(recover(self.path), 15)
+        self.assertEqual(rebuild(self.path, GumballMachine()).balance, 15)
+        with self.assertRaises(ValueError):
+            rebuild(self.path, GumballMachine(stock={"red": 30}))
+
+    def test_purchase_recovers(self):
+        """Test a multi-gumball purchase journals the balance after each gumball"""
+        machine = GumballMachine(stock={"red": 10, "yellow": 10})
+        with JournalWriter(self.path, snapshot_every=4) as journal:
+            journal.attach(machine)
+            machine.insert_coin("quarter")
+            machine.insert_coin("quarter")
+            machine.purchase({"red": 3, "yellow": 2})
+        self.assertEqual(machine.balance, 15)
+        self.assertEqual(recover(self.path), 15)
+        rebuilt = rebuild(self.path, GumballMachine(stock={"red": 10, "yellow": 10}))
+        self.assertEqual(rebuilt.balance, 15)
+        self.assertEqual(rebuilt.stock, machine.stock)
+
+    def test_rebuild_purchase_with_inventory(self):
+        """Test a purchase that only balances at the end of the order rebuilds as journaled"""
+        machine = GumballMachine(coin_inventory={})
+        with JournalWriter(self.path) as journal:
+            journal.attach(machine)
+            machine.insert_coin("quarter")
+            self.assertEqual(machine.purchase({"red": 1, "yellow": 2})["total"], 25)
+        self.assertEqual(recover(self.path), 0)
+        rebuilt = rebuild(self.path, GumballMachine(coin_inventory={}))
+        self.assertEqual(rebuilt.balance, 0)
+        self.assertEqual(rebuilt.coin_inventory(), machine.coin_inventory())
+
+    def test_rebuild_across_price_change(self):
+        """Test a journal spanning a price update rebuilds at the prices actually charged"""
+        prices = PriceTable()
+        machine = GumballMachine(prices=prices)
+        with JournalWriter(self.path, snapshot_every=3) as journal:
+            journal.attach(machine)
+            machine.insert_coin("quarter")
+            machine.dispense("red") # 5¢
+            prices.update({"red": 10, "yellow": 15})
+            machine.dispense("red") # 10¢
+            machine.insert_coin("dime")
+            machine.dispense("yellow") # 15¢
+            machine.dispense("yellow") # Refused: 5¢ left
+        self.assertEqual(machine.balance, 5)
+        self.assertEqual(recover(self.path), 5)
+        for current in (PriceTable(), prices): # Old or new prices: the journal decides
+            self.assertEqual(rebuild(self.path, GumballMachine(prices=current)).balance, 5)
+
+    def test_thread_safe_machine_journals_every_record(self):
+        """Test concurrent accepted and refused operations never interleave journal records"""
+        machine = ThreadSafeGumballMachine()
+
+        def customer():
+            for _ in range(5000):
+                machine.insert_coin("penny")
+                machine.insert_coin("dime")
+                machine.dispense("blue")
+
+        with JournalWriter(self.path, sync_every=64, snapshot_every=1000) as journal:
+            journal.attach(machine)
+            threads = [threading.Thread(target=customer) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(machine.balance, 4 * 5000 * 10)
+        self.assertEqual(recover(self.path), machine.balance)
+        with JournalReader(self.path) as reader:
+            self.assertEqual(len(reader), 1 + 4 * 5000 * 3 + (4 * 5000 * 3) // 1000)
+
+    def test_not_a_journal(self):
+        """Test opening a file without the journal header raises ValueError"""
+        with open(self.path, "wb") as file:
+            file.write(b"not a journal at all")
+        with self.assertRaises(ValueError):
+            JournalReader(self.path)
+        with self.assertRaises(ValueError):
+            JournalWriter(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
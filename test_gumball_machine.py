@@ -1,7 +1,47 @@
 """Unit tests for GumballMachine."""
 
+import io
+import json
+import threading
 import unittest
-from gumball_machine import GumballMachine
+from gumball_machine import (
+    COIN_NAMES,
+    COLOR_NAMES,
+    EVENT_CHANGE,
+    EVENT_COIN,
+    EVENT_DISPENSE,
+    ORDER_ALL_OR_NOTHING,
+    ORDER_BEST_EFFORT,
+    OUTCOME_ACCEPTED,
+    OUTCOME_DISPENSED,
+    OUTCOME_ESCROWED,
+    OUTCOME_INSUFFICIENT,
+    OUTCOME_NO_CHANGE,
+    OUTCOME_REJECTED,
+    OUTCOME_SOLD_OUT,
+    OUTCOME_RETURNED,
+    OUTCOME_UNKNOWN,
+    REJECTED_COIN,
+    SNAPSHOT_SIZE,
+    UNKNOWN_COLOR,
+    ChangeMaker,
+    ChangeResult,
+    CompactGumballMachine,
+    DispenseResult,
+    GumballMachine,
+    InsertResult,
+    PriceTable,
+    PurchaseResult,
+    ThreadSafeGumballMachine,
+    _format_cents,
+    _render_change,
+    coin_code,
+    color_code,
+    main,
+    run_command,
+    run_script,
+    stock_snapshot,
+)
 
 
 class Test01InsertCoin(unittest.TestCase):
@@ -311,6 +351,768 @@ class Test03ReturnChange(unittest.TestCase):
 #         change = self.machine.return_change()
 #         self.assertEqual(change["returned"], 0)
 
+
+class Test04ApplyEvents(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+
+    def test_apply_events_final_balance(self):
+        """Test batch of quarter + 2 reds leaves 15 cents"""
+        result = self.machine.apply_events([
+            (EVENT_COIN, "quarter"),
+            (EVENT_DISPENSE, "red"),
+            (EVENT_DISPENSE, "red"),
+        ])
+        self.assertEqual(result["balance"], 15)
+        self.assertEqual(self.machine.balance, 15)
+        self.assertEqual(result["counts"]["accepted"], 1)
+        self.assertEqual(result["counts"]["dispensed"], 2)
+
+    def test_apply_events_counts_per_outcome(self):
+        """Test batch counts rejected, unknown, insufficient and returned events"""
+        result = self.machine.apply_events([
+            (EVENT_COIN, "penny"),
+            (EVENT_DISPENSE, "red"),
+            (EVENT_COIN, "dime"),
+            (EVENT_DISPENSE, "blue"),
+            (EVENT_CHANGE, None),
+        ])
+        self.assertEqual(result["counts"], {
+            "accepted": 1,
+            "rejected": 1,
+            "dispensed": 0,
+            "insufficient": 1,
+            "unknown": 1,
+            "returned": 1,
+            "no_change": 0,
+            "sold_out": 0,
+            "escrowed": 0,
+            "restored": 0,
+        })
+        self.assertEqual(result["returned"], 10)
+        self.assertEqual(result["balance"], 0)
+
+    def test_apply_events_collect_packed_results(self):
+        """Test collect=True returns one packed outcome and balance per event"""
+        result = self.machine.apply_events([
+            (EVENT_COIN, "nickel"),
+            (EVENT_COIN, "peso"),
+            (EVENT_DISPENSE, "yellow"),
+            (EVENT_DISPENSE, "red"),
+            (EVENT_DISPENSE, "green"),
+            (EVENT_CHANGE, None),
+        ], collect=True)
+        self.assertEqual(list(result["outcomes"]), [
+            OUTCOME_ACCEPTED,
+            OUTCOME_REJECTED,
+            OUTCOME_INSUFFICIENT,
+            OUTCOME_DISPENSED,
+            OUTCOME_UNKNOWN,
+            OUTCOME_RETURNED,
+        ])
+        self.assertEqual(list(result["balances"]), [5, 5, 5, 0, 0, 0])
+
+    def test_apply_events_matches_single_calls(self):
+        """Test batch balance matches the same events applied one call at a time"""
+        events = [
+            (EVENT_COIN, "quarter"), (EVENT_DISPENSE, "yellow"), (EVENT_COIN, "dime"),
+            (EVENT_DISPENSE, "red"), (EVENT_DISPENSE, "yellow"), (EVENT_DISPENSE, "yellow"),
+            (EVENT_COIN, "nickel"), (EVENT_CHANGE, None), (EVENT_COIN, "dime"),
+        ]
+        reference = GumballMachine()
+        for kind, name in events:
+            if kind == EVENT_COIN:
+                reference.insert_coin(name)
+            elif kind == EVENT_DISPENSE:
+                reference.dispense(name)
+            else:
+                reference.return_change()
+        result = self.machine.apply_events(events)
+        self.assertEqual(result["balance"], reference.balance)
+
+    def test_apply_events_invalid_kind(self):
+        """Test unknown event kind raises and keeps earlier events applied"""
+        with self.assertRaises(ValueError):
+            self.machine.apply_events([(EVENT_COIN, "dime"), (99, None)])
+        self.assertEqual(self.machine.balance, 10)
+
+
+class Test05TokenCodes(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+
+    def test_coin_code_normalizes_raw_strings(self):
+        """Test raw coin strings map to interned codes"""
+        self.assertEqual(COIN_NAMES[coin_code(" Quarter ")], "quarter")
+        self.assertEqual(coin_code("penny"), REJECTED_COIN)
+
+    def test_color_code_normalizes_raw_strings(self):
+        """Test raw color strings map to interned codes"""
+        self.assertEqual(COLOR_NAMES[color_code("RED")], "red")
+        self.assertEqual(color_code("blue"), UNKNOWN_COLOR)
+
+    def test_insert_coin_code(self):
+        """Test inserting a dime by code matches insert_coin("dime")"""
+        result = self.machine.insert_coin_code(coin_code("dime"))
+        self.assertEqual(result, GumballMachine().insert_coin("dime"))
+
+    def test_insert_coin_code_rejected(self):
+        """Test out-of-table coin codes are rejected"""
+        for code in (REJECTED_COIN, -1):
+            result = self.machine.insert_coin_code(code)
+            self.assertFalse(result["accepted"])
+        self.assertEqual(self.machine.balance, 0)
+
+    def test_dispense_code(self):
+        """Test dispensing yellow by code matches dispense("yellow")"""
+        self.machine.insert_coin("quarter")
+        result = self.machine.dispense_code(color_code("yellow"))
+        self.assertTrue(result["dispensed"])
+        self.assertEqual(result["color"], "yellow")
+        self.assertEqual(result["balance"], 15)
+
+    def test_dispense_code_unknown(self):
+        """Test out-of-table color codes are rejected with balance unchanged"""
+        self.machine.insert_coin("quarter")
+        result = self.machine.dispense_code(UNKNOWN_COLOR)
+        self.assertFalse(result["dispensed"])
+        self.assertIn("Unknown", result["reason"])
+        self.assertEqual(result["balance"], 25)
+
+
+class Test06CompactResults(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+
+    def test_insert_result_type(self):
+        """Test insert_coin returns an InsertResult with dict-style access"""
+        result = self.machine.insert_coin("dime")
+        self.assertIsInstance(result, InsertResult)
+        self.assertEqual(result.balance, result["balance"])
+        self.assertEqual(result.to_dict(), {"accepted": True, "coin": "dime", "value": 10, "balance": 10})
+
+    def test_rejected_result_has_no_value(self):
+        """Test rejected coin result has no "value" key, like the original dictionary"""
+        result = self.machine.insert_coin("penny")
+        self.assertNotIn("value", result)
+        self.assertIsNone(result.get("value"))
+        with self.assertRaises(KeyError):
+            result["value"]
+
+    def test_dispense_result_keys(self):
+        """Test dispense results only expose the keys of the original dictionaries"""
+        failed = self.machine.dispense("red")
+        self.assertIsInstance(failed, DispenseResult)
+        self.assertEqual(failed.keys(), ["dispensed", "reason", "balance"])
+        self.machine.insert_coin("nickel")
+        self.assertEqual(self.machine.dispense("red").keys(), ["dispensed", "color", "price", "balance"])
+
+    def test_change_result_to_dict(self):
+        """Test change result converts to the original nested dictionary"""
+        self.machine.insert_coin("quarter")
+        result = self.machine.return_change()
+        self.assertIsInstance(result, ChangeResult)
+        self.assertEqual(result.to_dict(), {
+            "returned": 25,
+            "breakdown": {"quarters": 1, "dimes": 0, "nickels": 0},
+            "balance": 0,
+        })
+
+    def test_compact_machine_has_no_dict(self):
+        """Test CompactGumballMachine has no per-instance __dict__"""
+        machine = CompactGumballMachine()
+        self.assertFalse(hasattr(machine, "__dict__"))
+        with self.assertRaises(AttributeError):
+            machine.serial = "A1"
+
+    def test_compact_machine_matches_reference(self):
+        """Test CompactGumballMachine returns the same results as GumballMachine"""
+        compact = CompactGumballMachine()
+        for coin in ("quarter", "penny", "dime"):
+            self.assertEqual(compact.insert_coin(coin), self.machine.insert_coin(coin))
+        for color in ("yellow", "blue", "red", "yellow", "yellow"):
+            self.assertEqual(compact.dispense(color), self.machine.dispense(color))
+        self.assertEqual(compact.return_change(), self.machine.return_change())
+
+
+class Test07ThreadSafe(unittest.TestCase):
+    def setUp(self):
+        self.machine = ThreadSafeGumballMachine()
+
+    def test_thread_safe_single_thread(self):
+        """Test thread-safe machine behaves like GumballMachine on one thread"""
+        self.machine.insert_coin("quarter")
+        self.machine.dispense("red")
+        result = self.machine.return_change()
+        self.assertEqual(result["returned"], 20)
+        self.assertEqual(result["balance"], 0)
+
+    def test_thread_safe_no_lost_cents(self):
+        """Test concurrent inserts, pulls and returns never lose or duplicate a cent"""
+        tallies = []
+
+        def customer():
+            inserted = spent = returned = 0
+            for _ in range(2000):
+                inserted += self.machine.insert_coin("dime")["value"]
+                result = self.machine.dispense("yellow")
+                if result["dispensed"]:
+                    spent += result["price"]
+                result = self.machine.dispense("red")
+                if result["dispensed"]:
+                    spent += result["price"]
+                returned += self.machine.return_change()["returned"]
+            tallies.append((inserted, spent, returned))
+
+        threads = [threading.Thread(target=customer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        inserted = sum(t[0] for t in tallies)
+        spent = sum(t[1] for t in tallies)
+        returned = sum(t[2] for t in tallies)
+        self.assertEqual(inserted, spent + returned + self.machine.balance)
+
+    def test_thread_safe_callbacks_reenter(self):
+        """Test stock watchers and observers may call back into the machine from any thread"""
+        machine = ThreadSafeGumballMachine(stock={"red": 1})
+        machine.watch_stock(lambda m, color, remaining: m.restock(color, 1), 0)
+        snapshots = []
+        machine.add_observer(lambda m, outcome, code, amount: snapshots.append(m.snapshot()))
+
+        def customer():
+            for _ in range(500):
+                machine.insert_coin("nickel")
+                machine.dispense("red")
+
+        threads = [threading.Thread(target=customer, daemon=True) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive(), "callback deadlocked on the machine lock")
+        self.assertEqual(machine.stock_level(0), 1)
+        self.assertEqual(len(snapshots), 4000)
+        self.assertEqual(machine.balance, 0)
+
+
+class Test08Commands(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+
+    def test_command_words_and_menu_numbers(self):
+        """Test protocol accepts both command words and menu numbers"""
+        self.assertTrue(run_command(self.machine, "coin quarter")["accepted"])
+        self.assertTrue(run_command(self.machine, "1 dime")["accepted"])
+        self.assertEqual(run_command(self.machine, "RED")["balance"], 30)
+        self.assertEqual(run_command(self.machine, "3")["balance"], 20)
+        result = run_command(self.machine, "4")
+        self.assertEqual(result["op"], "change")
+        self.assertEqual(result["returned"], 20)
+
+    def test_command_errors(self):
+        """Test unknown commands and missing coin names are reported, balance unchanged"""
+        self.assertEqual(run_command(self.machine, "blue")["op"], "error")
+        self.assertEqual(run_command(self.machine, "coin")["op"], "error")
+        self.assertEqual(run_command(self.machine, "")["op"], "error")
+        self.assertEqual(self.machine.balance, 0)
+
+
+class Test09ChangeMaker(unittest.TestCase):
+    def test_change_maker_matches_greedy_for_us_coins(self):
+        """Test table breakdowns match the greedy quarter/dime/nickel split"""
+        maker = ChangeMaker(max_amount=500)
+        for amount in range(0, 501, 5):
+            quarters, remainder = divmod(amount, 25)
+            dimes, remainder = divmod(remainder, 10)
+            expected = {"quarters": quarters, "dimes": dimes, "nickels": remainder // 5}
+            self.assertEqual(maker.breakdown(amount), expected)
+
+    def test_change_maker_non_canonical_coins(self):
+        """Test 6 with coins 1/3/4 pays 3 + 3, where greedy would pay 4 + 1 + 1"""
+        maker = ChangeMaker({"penny": 1, "trey": 3, "quad": 4}, max_amount=20)
+        self.assertEqual(maker.breakdown(6), {"quads": 0, "treys": 2, "pennies": 0})
+
+    def test_change_maker_beyond_table(self):
+        """Test amounts past max_amount fall back to DP with the same answer"""
+        small = ChangeMaker({"trey": 3, "quad": 4}, max_amount=10)
+        large = ChangeMaker({"trey": 3, "quad": 4}, max_amount=200)
+        for amount in (11, 17, 101, 150):
+            self.assertEqual(small.counts(amount), large.counts(amount))
+
+    def test_change_maker_large_amounts(self):
+        """Test amounts far past the table are paid mostly in the largest coin, without a DP"""
+        maker = ChangeMaker(max_amount=100)
+        self.assertEqual(maker.counts(1_000_000), (40_000, 0, 0))
+        self.assertEqual(maker.breakdown(1_000_085), {"quarters": 40_003, "dimes": 1, "nickels": 0})
+        with self.assertRaises(ValueError):
+            maker.counts(1_000_003)
+        odd = ChangeMaker({"penny": 1, "trey": 3, "quad": 4}, max_amount=30)
+        reference = ChangeMaker({"penny": 1, "trey": 3, "quad": 4}, max_amount=400)
+        for amount in range(31, 401):
+            self.assertEqual(odd.counts(amount), reference.counts(amount))
+
+    def test_change_maker_unpayable_amount(self):
+        """Test amounts that no coin combination makes raise ValueError"""
+        maker = ChangeMaker(max_amount=100)
+        with self.assertRaises(ValueError):
+            maker.counts(7)
+        with self.assertRaises(ValueError):
+            maker.counts(-5)
+
+
+class Test10CoinInventory(unittest.TestCase):
+    def test_unlimited_change_by_default(self):
+        """Test machines without an inventory assume unlimited change"""
+        machine = GumballMachine()
+        self.assertIsNone(machine.coin_inventory())
+        self.assertTrue(machine.can_make_change(35))
+
+    def test_inserted_coins_join_inventory(self):
+        """Test accepted coins are added to the inventory, rejected ones are not"""
+        machine = GumballMachine(coin_inventory={"dime": 2})
+        machine.insert_coin("quarter")
+        machine.insert_coin("penny")
+        self.assertEqual(machine.coin_inventory(), {"nickel": 0, "dime": 2, "quarter": 1})
+
+    def test_return_change_from_coins_on_hand(self):
+        """Test quarter → red with no dimes on hand returns 20 cents as 4 nickels"""
+        machine = GumballMachine(coin_inventory={"nickel": 10})
+        machine.insert_coin("quarter")
+        machine.dispense("red")
+        result = machine.return_change()
+        self.assertEqual(result["returned"], 20)
+        self.assertEqual(result["breakdown"], {"quarters": 0, "dimes": 0, "nickels": 4})
+        self.assertEqual(machine.coin_inventory(), {"nickel": 6, "dime": 0, "quarter": 1})
+
+    def test_dispense_rejected_when_change_impossible(self):
+        """Test dispense is refused if the remaining balance could not be paid back"""
+        machine = GumballMachine(coin_inventory={})
+        machine.insert_coin("quarter")
+        result = machine.dispense("red")
+        self.assertFalse(result["dispensed"])
+        self.assertIn("Cannot make change", result["reason"])
+        self.assertEqual(result["balance"], 25)
+        self.assertEqual(machine.return_change()["breakdown"]["quarters"], 1)
+
+    def test_can_make_change_large_inventory(self):
+        """Test feasibility check with thousands of coins on hand"""
+        machine = GumballMachine(coin_inventory={"nickel": 5000, "dime": 5000, "quarter": 0})
+        self.assertTrue(machine.can_make_change(995))
+        machine = GumballMachine(coin_inventory={"nickel": 0, "dime": 5000, "quarter": 5000})
+        self.assertFalse(machine.can_make_change(5))
+        self.assertTrue(machine.can_make_change(45))
+
+    def test_apply_events_respects_inventory(self):
+        """Test batch replay reports no_change and pays change from the inventory"""
+        machine = GumballMachine(coin_inventory={"dime": 2})
+        result = machine.apply_events([
+            (EVENT_COIN, "quarter"),
+            (EVENT_DISPENSE, "yellow"),
+            (EVENT_DISPENSE, "red"),
+            (EVENT_CHANGE, None),
+        ], collect=True)
+        self.assertEqual(result["outcomes"][1], OUTCOME_NO_CHANGE)
+        self.assertEqual(result["counts"]["dispensed"], 1)
+        self.assertEqual(result["returned"], 20)
+        self.assertEqual(machine.coin_inventory(), {"nickel": 0, "dime": 0, "quarter": 1})
+
+    def test_regional_change_maker_inventory(self):
+        """Test an inventory pays out in the change maker's coins, refusing coins it cannot hold"""
+        class NoDimes(GumballMachine):
+            change_maker = ChangeMaker({"quarter": 25, "nickel": 5})
+
+        class Euro(GumballMachine):
+            change_maker = ChangeMaker({"cent50": 50, "cent20": 20, "cent10": 10, "cent5": 5})
+
+        machine = NoDimes(coin_inventory={"nickel": 4, "dime": 3})
+        machine.insert_coin("quarter")
+        machine.dispense("yellow")
+        self.assertEqual(machine.return_change()["breakdown"], {"quarters": 0, "nickels": 3})
+        self.assertEqual(machine.coin_inventory(), {"nickel": 1, "dime": 3, "quarter": 1})
+        with self.assertRaises(ValueError):
+            Euro(coin_inventory={"nickel": 4})
+        with self.assertRaises(ValueError):
+            Euro().load_coins({"nickel": 4})
+        self.assertEqual(Euro().insert_coin("quarter")["balance"], 25) # Unlimited change still works
+
+
+class Test11GumballStock(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine(stock={"red": 1, "yellow": 0})
+
+    def test_unlimited_stock_by_default(self):
+        """Test machines without stock counts never sell out"""
+        self.assertEqual(GumballMachine().stock_level(color_code("red")), -1)
+
+    def test_dispense_takes_from_stock(self):
+        """Test a successful dispense removes one gumball"""
+        self.machine.insert_coin("nickel")
+        self.assertTrue(self.machine.dispense("red")["dispensed"])
+        self.assertEqual(self.machine.stock_level(color_code("red")), 0)
+
+    def test_sold_out_before_balance_check(self):
+        """Test sold-out color is rejected with its own reason, even with no balance"""
+        result = self.machine.dispense("yellow")
+        self.assertFalse(result["dispensed"])
+        self.assertEqual(result["reason"], "Sold out: yellow")
+        self.machine.insert_coin("dime")
+        self.assertEqual(self.machine.dispense("yellow")["balance"], 10)
+
+    def test_restock(self):
+        """Test restocking a sold-out color makes it available again"""
+        self.machine.restock("Yellow", 3)
+        self.machine.insert_coin("dime")
+        self.assertTrue(self.machine.dispense("yellow")["dispensed"])
+        self.assertEqual(self.machine.stock_level(color_code("yellow")), 2)
+        with self.assertRaises(ValueError):
+            self.machine.restock("blue", 1)
+
+    def test_low_stock_notification(self):
+        """Test watchers are called once when stock drops to their threshold"""
+        alerts = []
+        machine = GumballMachine(stock={"red": 3})
+        machine.watch_stock(lambda m, color, left: alerts.append((color, left)), threshold=1)
+        machine.insert_coin("quarter")
+        for _ in range(3):
+            machine.dispense("red")
+        self.assertEqual(alerts, [("red", 1)])
+
+    def test_apply_events_sold_out(self):
+        """Test batch replay reports sold-out pulls and leaves the balance alone"""
+        result = self.machine.apply_events([
+            (EVENT_COIN, "quarter"),
+            (EVENT_DISPENSE, "red"),
+            (EVENT_DISPENSE, "red"),
+        ], collect=True)
+        self.assertEqual(result["outcomes"][2], OUTCOME_SOLD_OUT)
+        self.assertEqual(result["balance"], 20)
+
+    def test_stock_snapshot(self):
+        """Test bulk snapshot packs every machine's stock and reuses its array"""
+        machines = [self.machine, GumballMachine(stock={"yellow": 4}), GumballMachine()]
+        snapshot = stock_snapshot(machines)
+        self.assertEqual(list(snapshot), [1, 0, 0, 4, -1, -1])
+        machines[1].restock("red", 2)
+        self.assertIs(stock_snapshot(machines, out=snapshot), snapshot)
+        self.assertEqual(list(snapshot), [1, 0, 2, 4, -1, -1])
+
+
+class Test12Observers(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+        self.seen = []
+        self.machine.add_observer(self.observe)
+
+    def observe(self, machine, outcome, code, amount):
+        self.seen.append((outcome, code, amount, machine.balance))
+
+    def test_observer_sees_every_operation(self):
+        """Test observers get outcome, code, cents moved and the updated balance"""
+        self.machine.insert_coin("quarter")
+        self.machine.insert_coin("penny")
+        self.machine.dispense("red")
+        self.machine.dispense("blue")
+        self.machine.return_change()
+        self.assertEqual(self.seen, [
+            (OUTCOME_ACCEPTED, coin_code("quarter"), 25, 25),
+            (OUTCOME_REJECTED, REJECTED_COIN, 0, 25),
+            (OUTCOME_DISPENSED, color_code("red"), 5, 20),
+            (OUTCOME_UNKNOWN, UNKNOWN_COLOR, 0, 20),
+            (OUTCOME_RETURNED, -1, 20, 0),
+        ])
+
+    def test_observer_sees_batch_events(self):
+        """Test apply_events reports each event like the single calls do"""
+        self.machine.apply_events([(EVENT_COIN, "dime"), (EVENT_DISPENSE, "yellow"), (EVENT_CHANGE, None)])
+        self.assertEqual(self.seen, [
+            (OUTCOME_ACCEPTED, coin_code("dime"), 10, 10),
+            (OUTCOME_DISPENSED, color_code("yellow"), 10, 0),
+            (OUTCOME_RETURNED, -1, 0, 0),
+        ])
+
+    def test_observer_sees_escrow(self):
+        """Test moving the balance into escrow is reported like a payout, but pays no coins"""
+        machine = ThreadSafeGumballMachine(coin_inventory={"nickel": 2})
+        machine.add_observer(self.observe)
+        machine.insert_coin("quarter")
+        self.assertEqual(machine.escrow_balance(), 25)
+        self.assertEqual(self.seen[-1], (OUTCOME_ESCROWED, -1, 25, 0))
+        self.assertEqual(machine.coin_inventory(), {"nickel": 2, "dime": 0, "quarter": 1})
+
+    def test_remove_observer(self):
+        """Test removed observers are no longer called"""
+        self.machine.remove_observer(self.observe)
+        self.machine.insert_coin("dime")
+        self.assertEqual(self.seen, [])
+
+
+class Test13PriceTable(unittest.TestCase):
+    def setUp(self):
+        self.now = 9 * 3600 # 09:00 UTC on day 0
+        self.table = PriceTable(clock=lambda: self.now, utc_offset=0)
+
+    def test_per_machine_prices(self):
+        """Test a machine built with its own prices charges them"""
+        machine = GumballMachine(prices={"red": 15})
+        machine.insert_coin("quarter")
+        result = machine.dispense("red")
+        self.assertEqual(result["price"], 15)
+        self.assertEqual(result["balance"], 10)
+        self.assertEqual(GumballMachine(prices={"red": 15}).prices.price("yellow"), 10)
+
+    def test_hot_swap_shared_table(self):
+        """Test updating a shared table reprices every machine using it"""
+        machines = [GumballMachine(prices=self.table) for _ in range(2)]
+        version = self.table.version
+        self.table.update({"yellow": 20})
+        self.assertGreater(self.table.version, version)
+        for machine in machines:
+            machine.insert_coin("quarter")
+            self.assertEqual(machine.dispense("yellow")["price"], 20)
+
+    def test_promotion_window(self):
+        """Test a promotion applies only between its start and end times"""
+        self.table.add_promotion("yellow", 5, "10:00", "11:00")
+        self.assertEqual(self.table.price("yellow"), 10)
+        self.now = 10 * 3600 + 30
+        self.assertEqual(self.table.price("yellow"), 5)
+        self.now = 11 * 3600
+        self.assertEqual(self.table.price("yellow"), 10)
+
+    def test_promotion_wraps_midnight(self):
+        """Test a 23:00-01:00 promotion is active just after midnight"""
+        self.table.add_promotion("yellow", 5, "23:00", "01:00")
+        self.now = 86400 + 1800
+        self.assertEqual(self.table.price("yellow"), 5)
+
+    def test_compiled_snapshot_is_cached(self):
+        """Test prices are not recompiled until an update or promotion boundary"""
+        self.table.add_promotion("yellow", 5, "12:00", "13:00")
+        first = self.table.current()
+        self.now += 60
+        self.assertIs(self.table.current(), first)
+        self.table.update({"red": 15})
+        self.assertIsNot(self.table.current(), first)
+
+    def test_apply_events_uses_price_table(self):
+        """Test batch replay charges the machine's prices"""
+        machine = GumballMachine(prices={"yellow": 25})
+        result = machine.apply_events([(EVENT_COIN, "quarter"), (EVENT_DISPENSE, "yellow")])
+        self.assertEqual(result["balance"], 0)
+
+    def test_unknown_color_price(self):
+        """Test pricing a color with no lever raises ValueError"""
+        with self.assertRaises(ValueError):
+            self.table.update({"blue": 5})
+
+    def test_unpayable_price(self):
+        """Test prices the coins cannot pay are refused, so every balance stays returnable"""
+        for cents in (7, -5):
+            with self.assertRaises(ValueError):
+                self.table.update({"red": cents})
+            with self.assertRaises(ValueError):
+                self.table.add_promotion("red", cents, "10:00", "11:00")
+        with self.assertRaises(ValueError):
+            GumballMachine(prices={"yellow": 12})
+        with self.assertRaises(ValueError):
+            self.table.update({"red": 10, "yellow": 12})
+        self.assertEqual(self.table.price("red"), 5)
+        self.table.add_promotion("red", 0, "09:00", "10:00") # Free is payable
+        self.assertEqual(self.table.price("red"), 0)
+
+class Test14ScriptMode(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+        self.out = io.StringIO()
+
+    def _results(self):
+        return [json.loads(line) for line in self.out.getvalue().splitlines()]
+
+    def test_script_writes_json_lines(self):
+        """Test each command writes one JSON result; blank lines and comments are skipped"""
+        script = ["coin quarter\n", "# comment\n", "\n", "red\n", "3\n", "change\n"]
+        self.assertEqual(run_script(self.machine, script, self.out), 4)
+        results = self._results()
+        self.assertEqual([r["op"] for r in results], ["coin", "red", "yellow", "change"])
+        self.assertEqual(results[-1]["breakdown"], {"quarters": 0, "dimes": 1, "nickels": 0})
+
+    def test_script_stops_at_quit(self):
+        """Test quit returns the balance and ends the script"""
+        run_script(self.machine, ["coin dime", "quit", "coin quarter"], self.out)
+        results = self._results()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[-1]["returned"], 10)
+        self.assertEqual(self.machine.balance, 0)
+
+    def test_script_buffered_writes_match(self):
+        """Test small write buffers produce the same output as one large write"""
+        script = ["coin quarter", "red", "blue", "4"] * 50
+        run_script(self.machine, script, self.out, buffer_lines=3)
+        other = io.StringIO()
+        run_script(GumballMachine(), script, other)
+        self.assertEqual(self.out.getvalue(), other.getvalue())
+        self.assertEqual(len(self._results()), 200)
+
+
+class Test15TerminalUI(unittest.TestCase):
+    def _run(self, keys: str) -> str:
+        out = io.StringIO()
+        main(io.StringIO(keys), out)
+        return out.getvalue()
+
+    def test_ui_on_text_streams(self):
+        """Test the menu runs headless on text streams"""
+        screen = self._run("1\nquarter\n2\n4\n5\n")
+        self.assertIn("GUMBALL VENDING MACHINE", screen)
+        self.assertIn(">> Inserted quarter. Balance: $0.25", screen)
+        self.assertIn(">> Returned $0.20: 2 dime(s)", screen)
+        self.assertTrue(screen.endswith(">> Goodbye!\n"))
+
+    def test_end_of_input_quits_with_change(self):
+        """Test end of input quits and returns the balance like Quit"""
+        screen = self._run("1\nquarter\n1\ndime\n")
+        self.assertIn(">> Returning your change: $0.35 (1 quarter(s), 1 dime(s))", screen)
+
+    def test_change_renderer(self):
+        """Test one renderer formats change for both Return My Change and Quit"""
+        machine = GumballMachine()
+        machine.balance = 40
+        self.assertEqual(_render_change(machine.return_change()),
+                         ("$0.40", "1 quarter(s), 1 dime(s), 1 nickel(s)"))
+        self.assertIs(_format_cents(40), _format_cents(40))
+
+
+class Test16Snapshots(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine(coin_inventory={"dime": 2}, stock={"red": 3, "yellow": 1})
+        self.machine.insert_coin("quarter")
+
+    def test_snapshot_restore_round_trip(self):
+        """Test restore brings back balance, coin inventory and stock"""
+        data = self.machine.snapshot()
+        self.assertEqual(len(data), SNAPSHOT_SIZE)
+        self.machine.dispense("red")
+        self.machine.return_change()
+        self.machine.restore(data)
+        self.assertEqual(self.machine.balance, 25)
+        self.assertEqual(self.machine.coin_inventory(), {"nickel": 0, "dime": 2, "quarter": 1})
+        self.assertEqual(self.machine.stock_level(color_code("red")), 3)
+
+    def test_snapshot_unlimited_machine(self):
+        """Test unlimited change and stock survive a round trip into another machine class"""
+        machine = GumballMachine()
+        machine.insert_coin("dime")
+        other = CompactGumballMachine(coin_inventory={"nickel": 1}, stock={"red": 1})
+        other.restore(machine.snapshot())
+        self.assertEqual(other.balance, 10)
+        self.assertIsNone(other.coin_inventory())
+        self.assertEqual(other.stock_level(color_code("red")), -1)
+
+    def test_restore_from_packed_buffer(self):
+        """Test snapshots packed back to back restore by offset; bad data is refused"""
+        buffer = bytearray()
+        for _ in range(3):
+            buffer += self.machine.snapshot()
+            self.machine.insert_coin("nickel")
+        self.machine.restore(memoryview(buffer), SNAPSHOT_SIZE * 2)
+        self.assertEqual(self.machine.balance, 35)
+        with self.assertRaises(ValueError):
+            self.machine.restore(buffer[:SNAPSHOT_SIZE - 1])
+        with self.assertRaises(ValueError):
+            self.machine.restore(b"\xff" + bytes(buffer[1:SNAPSHOT_SIZE]))
+
+    def test_fork_is_independent(self):
+        """Test a fork diverges without touching the original or its observers"""
+        seen = []
+        self.machine.add_observer(lambda *args: seen.append(args))
+        branch = self.machine.fork()
+        branch.dispense("red")
+        branch.restock("yellow", 5)
+        self.assertEqual((self.machine.balance, branch.balance), (25, 20))
+        self.assertEqual(self.machine.stock_level(color_code("red")), 3)
+        self.assertEqual(self.machine.stock_level(color_code("yellow")), 1)
+        self.assertEqual(seen, [])
+        self.assertIs(branch.prices, self.machine.prices)
+
+    def test_thread_safe_fork_gets_own_lock(self):
+        """Test forks of a thread-safe machine do not share its lock"""
+        machine = ThreadSafeGumballMachine()
+        branch = machine.fork()
+        self.assertIsInstance(branch, ThreadSafeGumballMachine)
+        self.assertIsNot(branch._lock, machine._lock)
+
+
+class Test17Purchase(unittest.TestCase):
+    def setUp(self):
+        self.machine = GumballMachine()
+        self.machine.insert_coin("quarter")
+        self.machine.insert_coin("dime")
+
+    def test_purchase_whole_order(self):
+        """Test 3 red + 2 yellow are charged once and dispensed together"""
+        result = self.machine.purchase({"red": 3, "yellow": 2})
+        self.assertIsInstance(result, PurchaseResult)
+        self.assertEqual(result["filled"], {"red": 3, "yellow": 2})
+        self.assertEqual(result["total"], 35)
+        self.assertEqual(result["balance"], 0)
+        self.assertNotIn("reason", result)
+
+    def test_purchase_matches_single_dispenses(self):
+        """Test an order leaves the same balance and stock as one dispense per gumball"""
+        machine = GumballMachine(stock={"red": 5, "yellow": 5})
+        reference = GumballMachine(stock={"red": 5, "yellow": 5})
+        for m in (machine, reference):
+            m.insert_coin("quarter")
+            m.insert_coin("quarter")
+        machine.purchase({"red": 2, "yellow": 3})
+        for color in ("red", "red", "yellow", "yellow", "yellow"):
+            reference.dispense(color)
+        self.assertEqual(machine.snapshot(), reference.snapshot())
+
+    def test_all_or_nothing_refuses_short_order(self):
+        """Test an unaffordable order dispenses nothing and keeps the balance"""
+        result = self.machine.purchase({"red": 3, "yellow": 3}, ORDER_ALL_OR_NOTHING)
+        self.assertEqual(result["filled"], {})
+        self.assertEqual(result["unfilled"], {"red": 3, "yellow": 3})
+        self.assertEqual(result["reason"], "Insufficient balance. Need 45¢, have 35¢.")
+        self.assertEqual(self.machine.balance, 35)
+
+    def test_best_effort_fills_in_order(self):
+        """Test best effort fills colors in order and reports what is missing"""
+        result = self.machine.purchase({"yellow": 3, "blue": 1, "red": 2}, ORDER_BEST_EFFORT)
+        self.assertEqual(result["filled"], {"red": 1, "yellow": 3})
+        self.assertEqual(result["unfilled"], {"blue": 1, "red": 1})
+        self.assertEqual(result["reason"], "Unknown gumball type: blue")
+        self.assertEqual(result["balance"], 0)
+
+    def test_purchase_limits(self):
+        """Test stock, coin inventory and bad orders are enforced"""
+        stocked = GumballMachine(stock={"red": 2})
+        stocked.insert_coin("quarter")
+        self.assertEqual(stocked.purchase({"red": 3})["reason"], "Sold out: red (2 left)")
+        self.assertEqual(stocked.purchase({"red": 3}, ORDER_BEST_EFFORT)["filled"], {"red": 2})
+        no_change = GumballMachine(coin_inventory={})
+        no_change.insert_coin("quarter")
+        self.assertEqual(no_change.purchase({"red": 1})["unfilled"], {"red": 1})
+        self.assertEqual(no_change.purchase({"red": 1, "yellow": 2})["filled"], {"red": 1, "yellow": 2})
+        with self.assertRaises(ValueError):
+            self.machine.purchase({"red": -1})
+        with self.assertRaises(ValueError):
+            self.machine.purchase({"red": 1}, policy=7)
+
+    def test_purchase_observers(self):
+        """Test observers see one dispense per gumball, each with the balance left after it"""
+        seen = []
+        self.machine.add_observer(
+            lambda machine, outcome, code, amount: seen.append((outcome, code, amount, machine.balance)))
+        start = self.machine.balance
+        self.machine.purchase({"red": 2, "blue": 1}, ORDER_BEST_EFFORT)
+        self.assertEqual(seen, [(OUTCOME_DISPENSED, 0, 5, start - 5), (OUTCOME_DISPENSED, 0, 5, start - 10),
+                                (OUTCOME_UNKNOWN, UNKNOWN_COLOR, 0, start - 10)])
+
+
 class NumberedTextTestResult(unittest.TextTestResult):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -362,6 +1164,104 @@ def suite():
     suite.addTest(Test03ReturnChange('test_return_change_large_amount'))
     suite.addTest(Test03ReturnChange('test_return_change_breakdown_40_cents'))
 
+    # 4. Batch Event Tests
+    suite.addTest(Test04ApplyEvents('test_apply_events_final_balance'))
+    suite.addTest(Test04ApplyEvents('test_apply_events_counts_per_outcome'))
+    suite.addTest(Test04ApplyEvents('test_apply_events_collect_packed_results'))
+    suite.addTest(Test04ApplyEvents('test_apply_events_matches_single_calls'))
+    suite.addTest(Test04ApplyEvents('test_apply_events_invalid_kind'))
+
+    # 5. Token Code Tests
+    suite.addTest(Test05TokenCodes('test_coin_code_normalizes_raw_strings'))
+    suite.addTest(Test05TokenCodes('test_color_code_normalizes_raw_strings'))
+    suite.addTest(Test05TokenCodes('test_insert_coin_code'))
+    suite.addTest(Test05TokenCodes('test_insert_coin_code_rejected'))
+    suite.addTest(Test05TokenCodes('test_dispense_code'))
+    suite.addTest(Test05TokenCodes('test_dispense_code_unknown'))
+
+    # 6. Compact Result Tests
+    suite.addTest(Test06CompactResults('test_insert_result_type'))
+    suite.addTest(Test06CompactResults('test_rejected_result_has_no_value'))
+    suite.addTest(Test06CompactResults('test_dispense_result_keys'))
+    suite.addTest(Test06CompactResults('test_change_result_to_dict'))
+    suite.addTest(Test06CompactResults('test_compact_machine_has_no_dict'))
+    suite.addTest(Test06CompactResults('test_compact_machine_matches_reference'))
+
+    # 7. Thread Safety Tests
+    suite.addTest(Test07ThreadSafe('test_thread_safe_single_thread'))
+    suite.addTest(Test07ThreadSafe('test_thread_safe_no_lost_cents'))
+    suite.addTest(Test07ThreadSafe('test_thread_safe_callbacks_reenter'))
+
+    # 8. Command Protocol Tests
+    suite.addTest(Test08Commands('test_command_words_and_menu_numbers'))
+    suite.addTest(Test08Commands('test_command_errors'))
+
+    # 9. Change Maker Tests
+    suite.addTest(Test09ChangeMaker('test_change_maker_matches_greedy_for_us_coins'))
+    suite.addTest(Test09ChangeMaker('test_change_maker_non_canonical_coins'))
+    suite.addTest(Test09ChangeMaker('test_change_maker_beyond_table'))
+    suite.addTest(Test09ChangeMaker('test_change_maker_large_amounts'))
+    suite.addTest(Test09ChangeMaker('test_change_maker_unpayable_amount'))
+
+    # 10. Coin Inventory Tests
+    suite.addTest(Test10CoinInventory('test_unlimited_change_by_default'))
+    suite.addTest(Test10CoinInventory('test_inserted_coins_join_inventory'))
+    suite.addTest(Test10CoinInventory('test_return_change_from_coins_on_hand'))
+    suite.addTest(Test10CoinInventory('test_dispense_rejected_when_change_impossible'))
+    suite.addTest(Test10CoinInventory('test_can_make_change_large_inventory'))
+    suite.addTest(Test10CoinInventory('test_apply_events_respects_inventory'))
+    suite.addTest(Test10CoinInventory('test_regional_change_maker_inventory'))
+
+    # 11. Gumball Stock Tests
+    suite.addTest(Test11GumballStock('test_unlimited_stock_by_default'))
+    suite.addTest(Test11GumballStock('test_dispense_takes_from_stock'))
+    suite.addTest(Test11GumballStock('test_sold_out_before_balance_check'))
+    suite.addTest(Test11GumballStock('test_restock'))
+    suite.addTest(Test11GumballStock('test_low_stock_notification'))
+    suite.addTest(Test11GumballStock('test_apply_events_sold_out'))
+    suite.addTest(Test11GumballStock('test_stock_snapshot'))
+
+    # 12. Observer Tests
+    suite.addTest(Test12Observers('test_observer_sees_every_operation'))
+    suite.addTest(Test12Observers('test_observer_sees_batch_events'))
+    suite.addTest(Test12Observers('test_observer_sees_escrow'))
+    suite.addTest(Test12Observers('test_remove_observer'))
+
+    # 13. Price Table Tests
+    suite.addTest(Test13PriceTable('test_per_machine_prices'))
+    suite.addTest(Test13PriceTable('test_hot_swap_shared_table'))
+    suite.addTest(Test13PriceTable('test_promotion_window'))
+    suite.addTest(Test13PriceTable('test_promotion_wraps_midnight'))
+    suite.addTest(Test13PriceTable('test_compiled_snapshot_is_cached'))
+    suite.addTest(Test13PriceTable('test_apply_events_uses_price_table'))
+    suite.addTest(Test13PriceTable('test_unknown_color_price'))
+    suite.addTest(Test13PriceTable('test_unpayable_price'))
+
+    # 14. Script Mode Tests
+    suite.addTest(Test14ScriptMode('test_script_writes_json_lines'))
+    suite.addTest(Test14ScriptMode('test_script_stops_at_quit'))
+    suite.addTest(Test14ScriptMode('test_script_buffered_writes_match'))
+
+    # 15. Terminal UI Tests
+    suite.addTest(Test15TerminalUI('test_ui_on_text_streams'))
+    suite.addTest(Test15TerminalUI('test_end_of_input_quits_with_change'))
+    suite.addTest(Test15TerminalUI('test_change_renderer'))
+
+    # 16. Snapshot Tests
+    suite.addTest(Test16Snapshots('test_snapshot_restore_round_trip'))
+    suite.addTest(Test16Snapshots('test_snapshot_unlimited_machine'))
+    suite.addTest(Test16Snapshots('test_restore_from_packed_buffer'))
+    suite.addTest(Test16Snapshots('test_fork_is_independent'))
+    suite.addTest(Test16Snapshots('test_thread_safe_fork_gets_own_lock'))
+
+    # 17. Purchase Tests
+    suite.addTest(Test17Purchase('test_purchase_whole_order'))
+    suite.addTest(Test17Purchase('test_purchase_matches_single_dispenses'))
+    suite.addTest(Test17Purchase('test_all_or_nothing_refuses_short_order'))
+    suite.addTest(Test17Purchase('test_best_effort_fills_in_order'))
+    suite.addTest(Test17Purchase('test_purchase_limits'))
+    suite.addTest(Test17Purchase('test_purchase_observers'))
+
     return suite
 
 if __name__ == "__main__":
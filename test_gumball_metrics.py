@@ -0,0 +1,110 @@
+"""Unit tests for gumball machine metrics."""
+
+import os
+import re
+import tempfile
+import threading
+import unittest
+import urllib.request
+
+from gumball_machine import GumballMachine
+from gumball_metrics import InstrumentedGumballMachine, MachineMetrics
+
+
+class Test01Metrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MachineMetrics()
+
+    def _play(self, machine):
+        """Quarter + nickel → penny → red → blue → yellow x3 → return."""
+        machine.insert_coin("quarter")
+        machine.insert_coin("nickel")
+        machine.insert_coin("penny")
+        machine.dispense("red")
+        machine.dispense("blue")
+        machine.dispense("yellow")
+        machine.dispense("yellow")
+        machine.dispense("yellow")
+        machine.return_change()
+
+    def test_counters(self):
+        """Test counters by coin type, color, failure reason and change returned"""
+        machine = GumballMachine()
+        self.metrics.attach(machine)
+        self._play(machine)
+        data = self.metrics.snapshot()
+        self.assertEqual(data["coins_accepted"]["quarter"], 1)
+        self.assertEqual(data["coins_rejected"], 1)
+        self.assertEqual(data["dispensed"], {"red": 1, "yellow": 2})
+        self.assertEqual(data["dispense_failures"]["unknown"], 1)
+        self.assertEqual(data["dispense_failures"]["insufficient"], 1)
+        self.assertEqual(data["change_returned_cents"], 5)
+        self.assertEqual(data["coins_accepted"]["nickel"], 1)
+
+    def test_latency_counted_once_per_call(self):
+        """Test each call lands in its histogram once, even when it calls a code fast path"""
+        machine = InstrumentedGumballMachine(self.metrics)
+        self._play(machine)
+        latency = self.metrics.snapshot()["latency"]
+        self.assertEqual(sum(latency["insert_coin"]["buckets"]), 3)
+        self.assertEqual(sum(latency["dispense"]["buckets"]), 5)
+        self.assertEqual(sum(latency["return_change"]["buckets"]), 1)
+        machine.insert_coin("quarter")
+        machine.purchase({"red": 1, "yellow": 2})
+        latency = self.metrics.snapshot()["latency"]
+        self.assertEqual(sum(latency["purchase"]["buckets"]), 1)
+        self.assertEqual(sum(latency["dispense"]["buckets"]), 5)
+        self.assertEqual(self.metrics.snapshot()["dispensed"], {"red": 2, "yellow": 4})
+
+    def test_threads_accumulate_into_own_shards(self):
+        """Test counts from many threads add up in the snapshot"""
+        machine = GumballMachine()
+        self.metrics.attach(machine)
+
+        def insert():
+            for _ in range(1000):
+                machine.insert_coin("nickel")
+
+        threads = [threading.Thread(target=insert) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.metrics.snapshot()["coins_accepted"]["nickel"], 4000)
+
+    def test_prometheus_textfile(self):
+        """Test Prometheus text export to a file"""
+        machine = InstrumentedGumballMachine(self.metrics)
+        self._play(machine)
+        handle, path = tempfile.mkstemp(suffix=".prom")
+        os.close(handle)
+        try:
+            self.metrics.write_textfile(path)
+            with open(path, encoding="utf-8") as file:
+                text = file.read()
+        finally:
+            os.remove(path)
+        self.assertIn('gumball_dispensed_total{color="red"} 1', text)
+        self.assertIn('gumball_dispense_failures_total{reason="insufficient"} 1', text)
+        self.assertIn('gumball_operation_seconds_count{op="dispense"} 5', text)
+        self.assertIn('gumball_operation_seconds_bucket{op="insert_coin",le="+Inf"} 3', text)
+        labels = re.findall(r'le="([^"]+)"', text)
+        self.assertIn("5e-06", labels)
+        self.assertIn("0.0002", labels)
+        self.assertLessEqual(max(map(len, labels)), 6) # No float noise in the labels
+
+    def test_http_scrape(self):
+        """Test collectors can scrape /metrics over HTTP"""
+        self.metrics.attach(GumballMachine())
+        server = self.metrics.serve(port=0)
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+            with urllib.request.urlopen(url) as response:
+                self.assertIn("gumball_coins_rejected_total 0", response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,73 @@
+"""Unit tests for the gumball session server."""
+
+import asyncio
+import json
+import unittest
+
+from gumball_server import run_load, start
+
+
+async def _session(port: int, commands: list) -> list:
+    """Send commands over one connection and collect the JSON replies."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    replies = []
+    for command in commands:
+        writer.write(command.encode() + b"\n")
+        replies.append(json.loads(await reader.readline()))
+    writer.close()
+    return replies
+
+
+class Test01Server(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await start(port=0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_session_spec_scenario(self):
+        """Test quarter → 2 reds → quit returns 15 cents over the socket"""
+        replies = await _session(self.port, ["coin quarter", "red", "2", "quit"])
+        self.assertTrue(replies[0]["accepted"])
+        self.assertEqual(replies[2]["balance"], 15)
+        self.assertEqual(replies[3]["op"], "quit")
+        self.assertEqual(replies[3]["returned"], 15)
+
+    async def test_session_unknown_command(self):
+        """Test unknown commands get an error reply and keep the session open"""
+        replies = await _session(self.port, ["blue", "coin dime", "change"])
+        self.assertEqual(replies[0]["op"], "error")
+        self.assertEqual(replies[2]["returned"], 10)
+
+    async def test_sessions_are_independent(self):
+        """Test each connection has its own machine state"""
+        first, second = await asyncio.gather(
+            _session(self.port, ["coin quarter", "change"]),
+            _session(self.port, ["coin nickel", "change"]),
+        )
+        self.assertEqual(first[1]["returned"], 25)
+        self.assertEqual(second[1]["returned"], 5)
+
+    async def test_load_generator_reports_latency(self):
+        """Test load generator reports p50/p99 latency per operation"""
+        report = await run_load(port=self.port, sessions=20, rounds=2)
+        self.assertEqual(report["coin"]["count"], 20 * 2 * 3)
+        self.assertEqual(report["change"]["count"], 20 * 2)
+        self.assertLessEqual(report["red"]["p50_ms"], report["red"]["p99_ms"])
+
+    async def test_load_generator_without_rounds(self):
+        """Test ops with no samples report no latency instead of failing"""
+        report = await run_load(port=self.port, sessions=2, rounds=0)
+        self.assertEqual(report["coin"], {"count": 0, "p50_ms": None, "p99_ms": None})
+
+    async def test_line_too_long(self):
+        """Test a line over the reader limit gets an error reply and keeps the session open"""
+        replies = await _session(self.port, ["coin " + "x" * 70_000, "coin dime", "change"])
+        self.assertEqual(replies[0], {"op": "error", "error": "Line too long"})
+        self.assertEqual(replies[-1]["returned"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
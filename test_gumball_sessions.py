@@ -0,0 +1,133 @@
+"""Unit tests for idle session timeouts."""
+
+import os
+import random
+import tempfile
+import unittest
+
+from gumball_journal import JournalWriter, rebuild, recover
+from gumball_machine import CompactGumballMachine, GumballMachine, ThreadSafeGumballMachine
+from gumball_sessions import Escrow, IdleSessions, TimerWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Test01TimerWheel(unittest.TestCase):
+    def test_keys_fire_in_deadline_order(self):
+        """Test keys fire once their deadline passes, in order"""
+        wheel = TimerWheel()
+        wheel.schedule("b", 20)
+        wheel.schedule("a", 10)
+        self.assertEqual(wheel.advance(9), [])
+        self.assertEqual(wheel.advance(30), ["a", "b"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_never_early_across_levels(self):
+        """Test deadlines spread over every level (and past the wheel) never fire early or late"""
+        rng = random.Random(3)
+        wheel = TimerWheel(bits=(3, 2, 2)) # Spans 128 ticks, so long deadlines are parked
+        deadlines = {key: rng.randrange(0, 600) for key in range(1000)}
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+        now = 0
+        while wheel:
+            now += 1
+            for key in wheel.advance(now):
+                self.assertEqual(max(deadlines[key], 1), now)
+
+    def test_cancel_and_reschedule(self):
+        """Test cancelled keys never fire and rescheduling moves a key"""
+        wheel = TimerWheel()
+        wheel.schedule("a", 5)
+        wheel.schedule("b", 5)
+        wheel.cancel("a")
+        wheel.schedule("b", 5000)
+        self.assertEqual(wheel.advance(100), [])
+        self.assertEqual(wheel.advance(5000), ["b"])
+
+
+class Test02IdleSessions(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sessions = IdleSessions(timeout=60, clock=self.clock)
+        self.machine = self.sessions.open("s1", GumballMachine())
+
+    def test_idle_balance_returned(self):
+        """Test an abandoned balance is returned after the timeout"""
+        self.machine.insert_coin("quarter")
+        self.clock.now += 59
+        self.assertEqual(self.sessions.expire(), [])
+        self.clock.now += 2
+        [(key, result)] = self.sessions.expire()
+        self.assertEqual((key, result["returned"]), ("s1", 25))
+        self.assertEqual(self.machine.balance, 0)
+
+    def test_activity_postpones_expiry(self):
+        """Test every operation restarts the idle period"""
+        self.machine.insert_coin("dime")
+        self.clock.now += 50
+        self.machine.insert_coin("dime")
+        self.clock.now += 50
+        self.assertEqual(self.sessions.expire(), [])
+        self.clock.now += 11
+        self.assertEqual(len(self.sessions.expire()), 1)
+
+    def test_quiet_session_rearmed_by_activity(self):
+        """Test a session idle with no balance is left alone, then watched again once used"""
+        self.clock.now += 61
+        self.assertEqual(self.sessions.expire(), [])
+        self.machine.insert_coin("nickel")
+        self.clock.now += 61
+        self.assertEqual(self.sessions.expire()[0][1]["returned"], 5)
+
+    def test_close_and_escrow(self):
+        """Test closed sessions are forgotten and escrow holds balances instead of paying out"""
+        self.sessions.close("s1")
+        self.machine.insert_coin("quarter")
+        escrow = Escrow()
+        sessions = IdleSessions(timeout=60, on_expire=escrow, clock=self.clock)
+        other = sessions.open("s2", GumballMachine())
+        other.insert_coin("dime")
+        self.clock.now += 61
+        self.assertEqual(self.sessions.expire(), [])
+        self.assertEqual(sessions.expire(), [("s2", 10)])
+        self.assertEqual((other.balance, escrow.claim("s2"), escrow.claim("s2")), (0, 10, 0))
+
+    def test_escrow_is_journaled(self):
+        """Test escrowed balances go through the machine, so a journal recovers 0¢, not the credit"""
+        handle, path = tempfile.mkstemp(suffix=".journal")
+        os.close(handle)
+        os.remove(path)
+        try:
+            sessions = IdleSessions(timeout=60, on_expire=Escrow(), clock=self.clock)
+            machine = sessions.open("s2", ThreadSafeGumballMachine())
+            with JournalWriter(path) as journal:
+                journal.attach(machine)
+                machine.insert_coin("quarter")
+                self.clock.now += 61
+                self.assertEqual(sessions.expire(), [("s2", 25)])
+            self.assertEqual(recover(path), 0)
+            self.assertEqual(rebuild(path, GumballMachine()).balance, 0)
+        finally:
+            os.remove(path)
+        self.clock.now += 61
+        self.assertEqual(sessions.expire(), []) # Escrow is not activity
+
+    def test_many_sessions(self):
+        """Test 50,000 sessions expire in one pass with only the idle ones returned"""
+        machines = [self.sessions.open(key, CompactGumballMachine()) for key in range(50_000)]
+        for machine in machines[::2]:
+            machine.insert_coin("nickel")
+        self.clock.now += 61
+        self.assertEqual(len(self.sessions.expire()), 25_000)
+        self.assertEqual(len(self.sessions), 50_001)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,53 @@
+"""Unit tests for the sharded fleet simulation."""
+
+import random
+import unittest
+
+from gumball_machine import EVENT_CHANGE, EVENT_COIN, EVENT_DISPENSE, GumballMachine
+from gumball_sharding import (
+    _DECODE,
+    encode_events,
+    random_stream,
+    run_shard,
+    shard_sizes,
+    simulate,
+)
+
+
+class Test01Sharding(unittest.TestCase):
+    def test_encode_decode_round_trip(self):
+        """Test events survive the one-byte encoding, junk names become rejections"""
+        events = [(EVENT_COIN, "dime"), (EVENT_COIN, "penny"), (EVENT_DISPENSE, "red"),
+                  (EVENT_DISPENSE, "blue"), (EVENT_CHANGE, None)]
+        decoded = [_DECODE[byte] for byte in encode_events(events)]
+        self.assertEqual(decoded[0], (EVENT_COIN, "dime"))
+        self.assertEqual(decoded[2], (EVENT_DISPENSE, "red"))
+        self.assertEqual(decoded[4], (EVENT_CHANGE, None))
+        self.assertEqual(GumballMachine().apply_events(decoded), GumballMachine().apply_events(events))
+
+    def test_shard_sizes(self):
+        """Test machines split into near-equal shards without empty ones"""
+        self.assertEqual(shard_sizes(10, 3), [4, 3, 3])
+        self.assertEqual(shard_sizes(2, 4), [1, 1])
+
+    def test_run_shard_matches_machines(self):
+        """Test a shard's balances match machines replaying the same slices"""
+        stream = random_stream(3 * 200, random.Random(1))
+        balances, counts, returned = run_shard(stream, 3)
+        for index in range(3):
+            machine = GumballMachine()
+            machine.apply_events(_DECODE[byte] for byte in stream[index * 200:(index + 1) * 200])
+            self.assertEqual(balances[index], machine.balance)
+        self.assertEqual(sum(counts), 600)
+
+    def test_simulate_same_result_for_any_worker_count(self):
+        """Test shards merged from 2 processes equal the same traffic run in 1 process"""
+        single = simulate(machines=8, events_per_machine=500, workers=1, seed=3)
+        self.assertEqual(single["machines"], 8)
+        self.assertEqual(sum(single["counts"].values()), 8 * 500)
+        multi = simulate(machines=8, events_per_machine=500, workers=2, seed=3)
+        self.assertEqual(multi, single)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)